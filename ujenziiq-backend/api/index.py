@@ -6,6 +6,12 @@ import sys
 project_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.insert(0, project_dir)
 
+# No run_jobs worker runs beside a serverless function, so jobs run in the
+# function once the request's transaction commits
+os.environ.setdefault('JOBS_EAGER', 'True')
+
+from ujenziiq import bootstrap
+
 def application(environ, start_response):
     """
     WSGI application with Django integration and proper CORS
@@ -36,7 +42,9 @@ def application(environ, start_response):
                 "status": "ok", 
                 "message": "UjenziIQ Backend is running",
                 "version": "1.0.0",
-                "cors": "enabled"
+                "cors": "enabled",
+                "django_ready": bootstrap.is_ready(),
+                "cold_start": bootstrap.cold_start_stats()
             }
             
         # Simple API info - no Django needed  
@@ -57,25 +65,16 @@ def application(environ, start_response):
         # For Django endpoints, try to load Django
         elif path.startswith('/api/'):
             try:
-                # Try to load Django for API endpoints
-                os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ujenziiq.settings')
-                import django
-                django.setup()
-                
-                # Run migrations to set up database
-                from django.core.management import execute_from_command_line
-                try:
-                    execute_from_command_line(['manage.py', 'migrate', '--run-syncdb'])
-                except:
-                    pass  # Ignore migration errors for now
-                
-                from django.core.wsgi import get_wsgi_application
-                django_app = get_wsgi_application()
+                # Django is loaded and migrated once per process, then reused
+                django_app = bootstrap.get_application()
+                cold_start = bootstrap.consume_cold_start()
                 
                 # Create a custom environ that includes our CORS handling
                 def cors_start_response(status, headers):
                     # Add CORS headers to Django's response
                     headers.extend(cors_headers)
+                    if cold_start:
+                        headers.append(('Server-Timing', 'cold-start;dur=%s' % cold_start['total_ms']))
                     return start_response(status, headers)
                 
                 # Delegate to Django with CORS headers
@@ -0,0 +1,83 @@
+"""
+Cold vs warm request latency through the serverless entry point.
+
+Each cold sample runs in a fresh interpreter so that it pays for the full
+Django bootstrap; warm samples reuse the already initialized application.
+
+    python benchmarks/cold_start.py --cold-runs 5 --warm-runs 200
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from wsgiref.util import setup_testing_defaults
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+def call(app, path):
+    environ = {'PATH_INFO': path, 'REQUEST_METHOD': 'GET'}
+    setup_testing_defaults(environ)
+    result = {}
+
+    def start_response(status, headers):
+        result['status'] = status
+
+    started = time.perf_counter()
+    body = b''.join(app(environ, start_response))
+    elapsed = (time.perf_counter() - started) * 1000
+    return elapsed, result['status'], body
+
+
+def sample(path, warm_runs):
+    """Run inside a fresh process: one cold request followed by warm ones."""
+    from api.index import application
+
+    cold_ms, status, _ = call(application, path)
+    warm = [call(application, path)[0] for _ in range(warm_runs)]
+    print(json.dumps({'cold_ms': cold_ms, 'warm_ms': warm, 'status': status}))
+
+
+def summarize(label, values):
+    values = sorted(values)
+    p95 = values[min(len(values) - 1, int(len(values) * 0.95))]
+    print(f"{label:<6} n={len(values):<5} mean={statistics.mean(values):9.2f} ms  "
+          f"median={statistics.median(values):9.2f} ms  p95={p95:9.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--path', default='/api/projects/')
+    parser.add_argument('--cold-runs', type=int, default=5)
+    parser.add_argument('--warm-runs', type=int, default=200)
+    parser.add_argument('--sample', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.sample:
+        sample(args.path, args.warm_runs)
+        return
+
+    cold, warm = [], []
+    for _ in range(args.cold_runs):
+        output = subprocess.run(
+            [sys.executable, __file__, '--sample', '--path', args.path,
+             '--warm-runs', str(args.warm_runs)],
+            cwd=BACKEND_DIR, capture_output=True, text=True, check=True,
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        cold.append(result['cold_ms'])
+        warm.extend(result['warm_ms'])
+
+    print(f"GET {args.path} ({result['status']})")
+    summarize('cold', cold)
+    summarize('warm', warm)
+    print(f"speedup (mean cold / mean warm): {statistics.mean(cold) / statistics.mean(warm):.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,180 @@
+"""
+Concurrent Task and Notification writes from parallel gunicorn workers
+against a file-backed SQLite database.
+
+Compares Django's stock SQLite setup (rollback journal, a new connection per
+request) with the tuned configuration from ujenziiq/database.py (WAL,
+busy timeout, BEGIN IMMEDIATE, persistent connections).
+
+    python benchmarks/concurrent_writes.py --workers 4 --clients 16 --requests 2000
+"""
+
+import argparse
+import http.client
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+MODES = {
+    'stock': {'SQLITE_TUNING': 'false', 'DB_CONN_MAX_AGE': '0'},
+    'tuned': {'SQLITE_TUNING': 'true', 'DB_CONN_MAX_AGE': '600'},
+}
+
+_django_ready = threading.Lock()
+_models = {}
+
+
+def _setup_django():
+    with _django_ready:
+        if not _models:
+            os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ujenziiq.settings')
+            import django
+            django.setup()
+            from communication.models import Notification
+            from projects.models import Task
+            _models.update(Task=Task, Notification=Notification)
+    return _models
+
+
+def application(environ, start_response):
+    """WSGI app run by each gunicorn worker: one Task plus one Notification per request."""
+    import datetime
+
+    from django.db import close_old_connections, transaction
+
+    models = _setup_django()
+    close_old_connections()
+    try:
+        today = datetime.date.today()
+        with transaction.atomic():
+            task = models['Task'].objects.create(
+                project_id=int(os.environ['BENCH_PROJECT_ID']),
+                name='Benchmark task', description='', start_date=today, due_date=today,
+            )
+            models['Notification'].objects.create(
+                user_id=int(os.environ['BENCH_USER_ID']), title='Task assigned',
+                message=task.name, notification_type='task_assigned',
+                project_id=task.project_id, task=task,
+            )
+        status = '201 Created'
+    except Exception:
+        status = '500 Internal Server Error'
+    finally:
+        close_old_connections()
+    start_response(status, [('Content-Length', '0')])
+    return [b'']
+
+
+def create_fixtures():
+    import datetime
+
+    _setup_django()
+    from django.contrib.auth import get_user_model
+    from projects.models import Project
+
+    user = get_user_model().objects.create(username='bench', email='bench@example.com')
+    project = Project.objects.create(
+        name='Benchmark project', description='', project_type='other', location='-',
+        start_date=datetime.date.today(), expected_end_date=datetime.date.today(),
+        budget=0, client=user, project_manager=user,
+    )
+    print(user.id, project.id)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError('gunicorn did not start')
+
+
+def run_mode(mode, args):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        env = dict(os.environ, DATABASE_URL=f'sqlite:///{tmp_dir}/bench.sqlite3', **MODES[mode])
+        subprocess.run([sys.executable, 'manage.py', 'migrate', '-v', '0'],
+                       cwd=BACKEND_DIR, env=env, check=True)
+        user_id, project_id = subprocess.run(
+            [sys.executable, __file__, '--fixtures'], cwd=BACKEND_DIR, env=env,
+            capture_output=True, text=True, check=True,
+        ).stdout.split()
+        env.update(BENCH_USER_ID=user_id, BENCH_PROJECT_ID=project_id)
+
+        port = free_port()
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', 'benchmarks.concurrent_writes:application',
+             '-w', str(args.workers), '-b', f'127.0.0.1:{port}', '--log-level', 'warning'],
+            cwd=BACKEND_DIR, env=env,
+        )
+        try:
+            wait_for_port(port)
+            latencies, errors = [], []
+            per_client = args.requests // args.clients
+
+            def client():
+                conn = http.client.HTTPConnection('127.0.0.1', port)
+                for _ in range(per_client):
+                    started = time.perf_counter()
+                    conn.request('POST', '/')
+                    response = conn.getresponse()
+                    response.read()
+                    latencies.append((time.perf_counter() - started) * 1000)
+                    if response.status != 201:
+                        errors.append(response.status)
+                conn.close()
+
+            started = time.perf_counter()
+            with ThreadPoolExecutor(args.clients) as pool:
+                for future in [pool.submit(client) for _ in range(args.clients)]:
+                    future.result()
+            elapsed = time.perf_counter() - started
+        finally:
+            server.terminate()
+            server.wait()
+
+    latencies.sort()
+    print(f"{mode:<6} {len(latencies) / elapsed:8.1f} req/s  "
+          f"median={statistics.median(latencies):7.2f} ms  "
+          f"p99={latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]:8.2f} ms  "
+          f"errors={len(errors)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--modes', nargs='+', default=list(MODES), choices=list(MODES))
+    parser.add_argument('--fixtures', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.fixtures:
+        create_fixtures()
+        return
+
+    print(f"{args.workers} gunicorn workers, {args.clients} clients, {args.requests} requests "
+          "(each writes one Task and one Notification)")
+    for mode in args.modes:
+        run_mode(mode, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""
+Latency of the sync project dashboard vs the async one (full and summary).
+
+Uses a throw-away file-backed SQLite database so that the async sections can
+run on their own connections. ``--db-latency-ms`` adds a sleep to every
+query to approximate a networked database such as PostgreSQL.
+
+    python benchmarks/dashboard.py --tasks 200 --incidents 50 --db-latency-ms 2
+"""
+
+import argparse
+import asyncio
+import datetime
+import os
+import statistics
+import sys
+import tempfile
+import time
+import warnings
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--tasks', type=int, default=200)
+    parser.add_argument('--incidents', type=int, default=50)
+    parser.add_argument('--allocations', type=int, default=50)
+    parser.add_argument('--db-latency-ms', type=float, default=0)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.TemporaryDirectory()
+    os.environ['DATABASE_URL'] = f'sqlite:///{tmp_dir.name}/dashboard.sqlite3'
+    os.environ['ALLOWED_HOSTS'] = 'testserver'
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ujenziiq.settings')
+
+    import django
+    django.setup()
+
+    from django.contrib.auth import get_user_model
+    from django.core.management import call_command
+    from django.db.backends.signals import connection_created
+    from django.test import AsyncClient, Client
+    from django.utils import timezone
+    from rest_framework_simplejwt.tokens import AccessToken
+
+    from projects.models import Material, Project, ResourceAllocation, Safety, Task
+
+    call_command('migrate', verbosity=0)
+    User = get_user_model()
+    user = User.objects.create(username='bench', email='bench@example.com')
+    today = datetime.date.today()
+    project = Project.objects.create(
+        name='Benchmark', description='-', project_type='other', location='-', status='in_progress',
+        start_date=today, expected_end_date=today, budget=0, client=user, project_manager=user,
+    )
+    Task.objects.bulk_create(
+        Task(project=project, name=f'Task {i}', description='-', start_date=today, due_date=today,
+             status=('pending', 'completed', 'in_progress')[i % 3])
+        for i in range(args.tasks)
+    )
+    for task in project.tasks.all():
+        task.assignees.add(user)
+    Safety.objects.bulk_create(
+        Safety(project=project, title=f'Incident {i}', description='-', date_occurred=timezone.now(),
+               location_in_site='-', severity='low', reported_by=user, assigned_to=user)
+        for i in range(args.incidents)
+    )
+    material = Material.objects.create(name='Cement', unit='bag', unit_price=10, supplier=user)
+    ResourceAllocation.objects.bulk_create(
+        ResourceAllocation(project=project, material=material, quantity=1, allocated_date=today)
+        for _ in range(args.allocations)
+    )
+
+    warnings.filterwarnings('ignore', message='No directory at')
+    if args.db_latency_ms:
+        def delay(execute, sql, params, many, context):
+            time.sleep(args.db_latency_ms / 1000)
+            return execute(sql, params, many, context)
+
+        def add_delay(sender, connection, **kwargs):
+            connection.execute_wrappers.append(delay)
+
+        connection_created.connect(add_delay)
+        from django.db import connection
+        connection.execute_wrappers.append(delay)
+
+    headers = {'Authorization': f'JWT {AccessToken.for_user(user)}'}
+    sync_client, async_client = Client(), AsyncClient()
+    sync_url = f'/api/projects/{project.pk}/dashboard/'
+    async_url = f'/api/projects/{project.pk}/dashboard/async/'
+
+    def measure_sync():
+        samples = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            assert sync_client.get(sync_url, headers=headers).status_code == 200
+            samples.append((time.perf_counter() - started) * 1000)
+        return samples
+
+    async def measure_async(params):
+        samples = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            response = await async_client.get(async_url, params, headers=headers)
+            assert response.status_code == 200, response.content[:500]
+            samples.append((time.perf_counter() - started) * 1000)
+        return samples
+
+    results = {
+        'sync': measure_sync(),
+        'async': asyncio.run(measure_async({})),
+        'async summary': asyncio.run(measure_async({'summary': 'true'})),
+    }
+    print(f"{args.tasks} tasks, {args.incidents} incidents, {args.allocations} allocations, "
+          f"{args.db_latency_ms} ms per query")
+    for label, samples in results.items():
+        print(f"{label:<14} median={statistics.median(samples):8.2f} ms  min={min(samples):8.2f} ms")
+    tmp_dir.cleanup()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""
+Dependency validation on a large task graph: cycle checks and PK resolution.
+
+A random task graph is written to a throw-away file-backed SQLite database.
+Random dependency edits are checked for cycles with the recursive CTE,
+walking the whole graph and pruned with the tasks' dependency levels, and
+a list of dependency IDs is resolved per ID and in bulk.
+
+    python benchmarks/dependency_validation.py --tasks 100000 --edges 500000
+"""
+
+import argparse
+import datetime
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from schedule import generate  # noqa: E402  (benchmarks/schedule.py)
+
+
+def measure(label, calls):
+    timings, results = [], []
+    for call in calls:
+        started = time.perf_counter()
+        results.append(call())
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    print(f"{label:<44} median {statistics.median(timings):8.2f} ms   "
+          f"p95 {timings[int(len(timings) * 0.95) - 1]:8.2f} ms")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--tasks', type=int, default=100000)
+    parser.add_argument('--edges', type=int, default=500000)
+    parser.add_argument('--checks', type=int, default=200)
+    parser.add_argument('--ids', type=int, default=50, help='dependency IDs per resolved list')
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.TemporaryDirectory()
+    os.environ['DATABASE_URL'] = f'sqlite:///{tmp_dir.name}/dependencies.sqlite3'
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ujenziiq.settings')
+
+    import django
+    django.setup()
+
+    from django.contrib.auth import get_user_model
+    from django.core.management import call_command
+    from rest_framework import serializers
+
+    from projects.dependency_graph import creates_cycle, depends_on, raise_levels, rebuild_dependency_levels
+    from projects.models import Project, Task
+    from ujenziiq.serializers import BulkPrimaryKeyRelatedField
+
+    call_command('migrate', verbosity=0)
+    starts, durations, edges = generate(args.tasks, args.edges)
+    print(f"{args.tasks} tasks, {len(edges)} dependency edges")
+
+    user = get_user_model().objects.create(username='bench', email='bench@example.com')
+    project = Project.objects.create(
+        name='Benchmark', description='-', project_type='other', location='-',
+        start_date=datetime.date(2026, 1, 1), expected_end_date=datetime.date(2027, 1, 1),
+        budget=0, client=user, project_manager=user,
+    )
+    fromordinal = datetime.date.fromordinal
+    tasks = Task.objects.bulk_create(
+        (Task(project=project, name=f'Task {i}', description='-', start_date=fromordinal(starts[i]),
+              due_date=fromordinal(starts[i] + durations[i])) for i in range(args.tasks)),
+        batch_size=5000,
+    )
+    Through = Task.dependencies.through
+    Through.objects.bulk_create(
+        (Through(from_task_id=tasks[task].pk, to_task_id=tasks[dependency].pk) for task, dependency in edges),
+        batch_size=20000,
+    )
+    # bulk_create() sends no signals
+    started = time.perf_counter()
+    rebuild_dependency_levels(project.pk)
+    print(f"{'rebuild dependency levels':<44} {(time.perf_counter() - started) * 1000:8.2f} ms")
+
+    rng = random.Random(0)
+    # Edges that follow the graph's direction (never a cycle) and edges
+    # that point back at a task's own dependents (always a cycle)
+    forward = []
+    for _ in range(args.checks):
+        position = rng.randrange(1000, args.tasks)
+        forward.append((tasks[position], [tasks[rng.randrange(position - 1000, position)].pk]))
+    backward = []
+    for task, dependency in rng.sample(edges, args.checks):
+        backward.append((tasks[dependency], [tasks[task].pk]))
+
+    results = measure('no cycle, whole graph', [lambda t=t, d=d: depends_on(d, t.pk) for t, d in forward])
+    assert not any(results)
+    results = measure('no cycle, pruned by level', [lambda t=t, d=d: creates_cycle(t, d) for t, d in forward])
+    assert not any(results)
+    results = measure('cycle, whole graph', [lambda t=t, d=d: depends_on(d, t.pk) for t, d in backward])
+    assert all(results)
+    results = measure('cycle, pruned by level', [lambda t=t, d=d: creates_cycle(t, d) for t, d in backward])
+    assert all(results)
+    # The levels an added dependency raises: the task's and its dependents'
+    Through.objects.bulk_create(
+        (Through(from_task_id=task.pk, to_task_id=dependency) for task, (dependency,) in forward),
+        ignore_conflicts=True,
+    )
+    measure('raise levels after adding a dependency', [lambda t=t: raise_levels([t.pk]) for t, _ in forward])
+
+    queryset = Task.objects.only('pk', 'project')
+    per_id = serializers.PrimaryKeyRelatedField(many=True, queryset=queryset)
+    bulk = BulkPrimaryKeyRelatedField(many=True, queryset=queryset)
+    lists = [[task.pk for task in rng.sample(tasks, args.ids)] for _ in range(20)]
+    measure(f'resolve {args.ids} IDs, one query per ID', [lambda ids=ids: per_id.to_internal_value(ids) for ids in lists])
+    measure(f'resolve {args.ids} IDs, one query', [lambda ids=ids: bulk.to_internal_value(ids) for ids in lists])
+    tmp_dir.cleanup()
+
+
+if __name__ == '__main__':
+    main()
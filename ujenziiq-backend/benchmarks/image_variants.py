@@ -0,0 +1,108 @@
+"""
+Image variant throughput on batches of 12MP phone photos.
+
+A batch of 4000x3000 JPEGs with an EXIF orientation and metadata, like
+those from site phones, is written to a temporary directory. They are
+then turned into the projects.images variants three ways: one at a time
+decoding the full photo and resizing each variant from it (what a view
+would do naively), one at a time with projects.images.render_variants,
+and with render_variants on a process pool the way the run_jobs worker
+runs process_project_image. Throughput scales with --processes up to the
+number of cores.
+
+    python benchmarks/image_variants.py --images 24 --processes 4
+"""
+
+import argparse
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent import futures
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from PIL import Image, ImageFilter, ImageOps  # noqa: E402
+
+from projects.images import VARIANTS, render_variants  # noqa: E402
+
+
+def phone_photo(seed):
+    """A 12MP JPEG with some detail, rotated by EXIF, about the size a phone writes."""
+    rng = random.Random(seed)
+    small = Image.frombytes('RGB', (400, 300), rng.randbytes(400 * 300 * 3)).filter(ImageFilter.GaussianBlur(2))
+    picture = small.resize((4000, 3000), Image.BICUBIC)
+    noise = Image.effect_noise((4000, 3000), 24).convert('RGB')
+    picture = Image.blend(picture, noise, 0.15)
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    exif[0x010F] = 'PhoneMaker'
+    exif[0x0110] = 'Model 12'
+    buffer = io.BytesIO()
+    picture.save(buffer, 'JPEG', quality=92, exif=exif)
+    return buffer.getvalue()
+
+
+def naive(path):
+    with Image.open(path) as picture:
+        picture = ImageOps.exif_transpose(picture).convert('RGB')
+    for _, longest, quality in VARIANTS:
+        variant = picture.copy()
+        variant.thumbnail((longest, longest), Image.LANCZOS)
+        variant.save(io.BytesIO(), 'JPEG', quality=quality, optimize=True, progressive=True)
+
+
+def pipeline(path):
+    with open(path, 'rb') as file:
+        _, variants = render_variants(file)
+    return sum(len(data) for data in variants.values())
+
+
+def report(label, count, seconds):
+    print(f"{label:<32} {seconds:7.2f} s   {count / seconds:6.2f} images/s   "
+          f"{seconds / count * 1000:7.0f} ms per image")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--images', type=int, default=24)
+    parser.add_argument('--processes', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.TemporaryDirectory()
+    paths = []
+    # Two distinct photos are enough; the files are what is read back
+    photos = [phone_photo(seed) for seed in range(2)]
+    for i in range(args.images):
+        path = os.path.join(tmp_dir.name, f'photo-{i}.jpg')
+        with open(path, 'wb') as file:
+            file.write(photos[i % 2])
+        paths.append(path)
+    print(f"{args.images} photos of 4000x3000, {len(photos[0]) / 1e6:.1f} MB each, "
+          f"{os.cpu_count()} cores")
+
+    sample = paths[:max(1, args.images // 4)]
+    started = time.perf_counter()
+    for path in sample:
+        naive(path)
+    report('full decode, one at a time', len(sample), time.perf_counter() - started)
+
+    started = time.perf_counter()
+    written = sum(pipeline(path) for path in paths)
+    report('render_variants, one at a time', len(paths), time.perf_counter() - started)
+    print(f"{'':<32} {written / len(paths) / 1e3:.0f} KB of variants per image")
+
+    with futures.ProcessPoolExecutor(args.processes) as pool:
+        # Start the processes before timing, as the worker's pool is
+        list(pool.map(pipeline, paths[:args.processes]))
+        started = time.perf_counter()
+        list(pool.map(pipeline, paths))
+        report(f'render_variants, {args.processes} processes', len(paths), time.perf_counter() - started)
+    tmp_dir.cleanup()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""
+Incremental schedule updates versus full recomputation.
+
+A random task graph is written to a throw-away file-backed SQLite database
+and its schedule is stored once. Random tasks then have their due date
+moved (or gain a dependency) and the stored schedule is brought up to date
+with ``reschedule_task``, which is timed against ``refresh_project_schedule``
+for the same change.
+
+    python benchmarks/incremental_schedule.py --tasks 50000 --edges 500000 --changes 20
+"""
+
+import argparse
+import datetime
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from schedule import generate  # noqa: E402  (benchmarks/schedule.py)
+
+
+def elapsed_ms(function):
+    started = time.perf_counter()
+    result = function()
+    return (time.perf_counter() - started) * 1000, result
+
+
+def report(label, incremental, full, written):
+    print(f"{label}")
+    print(f"  incremental  median {statistics.median(incremental):9.1f} ms   max {max(incremental):9.1f} ms")
+    print(f"  full         median {statistics.median(full):9.1f} ms   max {max(full):9.1f} ms")
+    rewritten = [count for count in written if count is not None]
+    print(f"  rows written median {statistics.median(rewritten) if rewritten else 0:9.0f}"
+          f"   full recomputes {len(written) - len(rewritten)}/{len(written)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--tasks', type=int, default=50000)
+    parser.add_argument('--edges', type=int, default=500000)
+    parser.add_argument('--changes', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.TemporaryDirectory()
+    os.environ['DATABASE_URL'] = f'sqlite:///{tmp_dir.name}/schedule.sqlite3'
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ujenziiq.settings')
+
+    import django
+    django.setup()
+
+    from django.contrib.auth import get_user_model
+    from django.core.management import call_command
+
+    from projects.models import Project, Task, TaskSchedule
+    from projects.scheduling import refresh_project_schedule, reschedule_task
+
+    call_command('migrate', verbosity=0)
+    starts, durations, edges = generate(args.tasks, args.edges)
+    print(f"{args.tasks} tasks, {len(edges)} dependency edges")
+
+    user = get_user_model().objects.create(username='bench', email='bench@example.com')
+    project = Project.objects.create(
+        name='Benchmark', description='-', project_type='other', location='-',
+        start_date=datetime.date(2026, 1, 1), expected_end_date=datetime.date(2027, 1, 1),
+        budget=0, client=user, project_manager=user,
+    )
+    fromordinal = datetime.date.fromordinal
+    tasks = Task.objects.bulk_create(
+        (Task(project=project, name=f'Task {i}', description='-', start_date=fromordinal(starts[i]),
+              due_date=fromordinal(starts[i] + durations[i])) for i in range(args.tasks)),
+        batch_size=5000,
+    )
+    Through = Task.dependencies.through
+    Through.objects.bulk_create(
+        (Through(from_task_id=tasks[task].pk, to_task_id=tasks[dependency].pk) for task, dependency in edges),
+        batch_size=20000,
+    )
+    ms, _ = elapsed_ms(lambda: refresh_project_schedule(project.pk))
+    print(f"initial full schedule + store      {ms:9.1f} ms")
+
+    def stored():
+        return sorted(TaskSchedule.objects.filter(project=project).values_list(
+            'task_id', 'early_start', 'early_finish', 'late_start', 'late_finish'))
+
+    rng = random.Random(args.seed)
+
+    def run(label, change):
+        incremental, full, written = [], [], []
+        for _ in range(args.changes):
+            task, changed = change()
+            ms, count = elapsed_ms(lambda: reschedule_task(task, changed))
+            incremental.append(ms)
+            written.append(count)
+            full.append(elapsed_ms(lambda: refresh_project_schedule(project.pk))[0])
+        report(label, incremental, full, written)
+
+    def move_due_date():
+        task = tasks[rng.randrange(args.tasks)]
+        task.due_date += datetime.timedelta(days=rng.choice((-1, 1)))
+        if task.due_date < task.start_date:
+            task.due_date = task.start_date
+        # Written without signals, so that reschedule_task is what gets timed
+        Task.objects.filter(pk=task.pk).update(due_date=task.due_date)
+        return task, ()
+
+    def add_dependency():
+        position = rng.randrange(1, args.tasks)
+        task, dependency = tasks[position], tasks[rng.randrange(max(0, position - 500), position)]
+        Task.dependencies.through.objects.get_or_create(from_task=task, to_task=dependency)
+        return task, (dependency.pk,)
+
+    run('move a due date by one day', move_due_date)
+    run('add a dependency', add_dependency)
+
+    # The incremental result must be exactly what a full recompute stores
+    task, changed = move_due_date()
+    reschedule_task(task, changed)
+    incremental = stored()
+    refresh_project_schedule(project.pk)
+    assert incremental == stored(), 'incremental schedule diverged from full recompute'
+    print('incremental result matches full recompute')
+    tmp_dir.cleanup()
+
+
+if __name__ == '__main__':
+    main()
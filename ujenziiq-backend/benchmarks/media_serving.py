@@ -0,0 +1,199 @@
+"""
+Media serving throughput and memory for large images and videos.
+
+A throw-away database and media root get a --image MB photo and a --video
+MB video, and the application is served by gunicorn (one gthread worker,
+as in the Procfile) under each configuration in turn:
+
+- ``static.serve``: the DEBUG-only ``/media/`` route from before, which
+  checks no access and answers every request, ranges included, with the
+  whole file.
+- ``serve_media`` with gunicorn's ``--no-sendfile``: the production view,
+  reading in 256 KiB blocks.
+- ``serve_media`` with sendfile: the kernel copies the file to the socket.
+
+--clients concurrent clients download the photo and the video whole and
+fetch --seeks 4 MB ranges of the video, as a player seeking does. The
+time for the same requests, the data sent and its rate, and the worker's
+peak resident memory are reported.
+Handing off to nginx (``MEDIA_SERVE_MODE = 'x-accel-redirect'``) takes the
+worker out of the transfer altogether and is not measured here.
+
+    python benchmarks/media_serving.py --image 25 --video 400 --clients 8
+"""
+
+import argparse
+import http.client
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import textwrap
+import threading
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+BLOCK = 1024 * 1024
+RANGE_SIZE = 4 * BLOCK
+
+
+def write_settings(directory, media_root):
+    with open(os.path.join(directory, 'bench_settings.py'), 'w') as file:
+        file.write(textwrap.dedent(f"""
+            from ujenziiq.settings import *
+
+            MEDIA_ROOT = {media_root!r}
+            ALLOWED_HOSTS = ['*']
+            ROOT_URLCONF = 'bench_urls'
+            MEDIA_SERVE_MODE = 'django'
+        """))
+    with open(os.path.join(directory, 'bench_urls.py'), 'w') as file:
+        file.write(textwrap.dedent(f"""
+            from django.urls import include, path
+            from django.views.static import serve
+
+            urlpatterns = [
+                path('debug-media/<path:path>', serve, {{'document_root': {media_root!r}}}),
+                path('', include('ujenziiq.urls')),
+            ]
+        """))
+
+
+def write_file(path, size):
+    """``size`` bytes of random data, so nothing downstream can compress it."""
+    block = os.urandom(BLOCK)
+    with open(path, 'wb') as file:
+        for _ in range(size // BLOCK):
+            file.write(block)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def peak_rss(master_pid):
+    """The largest peak resident memory, in MB, of the gunicorn master's children."""
+    peak = 0
+    for task in os.listdir(f'/proc/{master_pid}/task'):
+        with open(f'/proc/{master_pid}/task/{task}/children') as file:
+            for pid in file.read().split():
+                with open(f'/proc/{pid}/status') as status:
+                    for line in status:
+                        if line.startswith('VmHWM:'):
+                            peak = max(peak, int(line.split()[1]) / 1024)
+    return peak
+
+
+def download(port, path, headers=None):
+    connection = http.client.HTTPConnection('127.0.0.1', port)
+    connection.request('GET', path, headers=headers or {})
+    response = connection.getresponse()
+    assert response.status in (200, 206), (path, response.status)
+    received = 0
+    while chunk := response.read(BLOCK):
+        received += len(chunk)
+    connection.close()
+    return received
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--image', type=int, default=25, help='photo size in MB')
+    parser.add_argument('--video', type=int, default=400, help='video size in MB')
+    parser.add_argument('--clients', type=int, default=8, help='concurrent clients')
+    parser.add_argument('--seeks', type=int, default=10, help='video ranges each client fetches')
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.TemporaryDirectory()
+    media_root = os.path.join(tmp_dir.name, 'media')
+    write_settings(tmp_dir.name, media_root)
+    env = dict(os.environ, DATABASE_URL=f'sqlite:///{tmp_dir.name}/media.sqlite3',
+               DJANGO_SETTINGS_MODULE='bench_settings', PYTHONPATH=os.pathsep.join([tmp_dir.name, BACKEND_DIR]))
+    os.environ.update(env)
+    sys.path.insert(0, tmp_dir.name)
+
+    import django
+    django.setup()
+
+    from django.core.files import File
+    from django.core.management import call_command
+    from rest_framework_simplejwt.tokens import AccessToken
+
+    from projects.models import ProjectImage
+    from projects.tests import create_project, create_user
+
+    call_command('migrate', verbosity=0)
+    user = create_user('viewer')
+    project = create_project(user)
+    token = str(AccessToken.for_user(user))
+    names = {}
+    for title, filename, size in [('Photo', 'site.jpg', args.image), ('Walkthrough', 'walkthrough.mp4', args.video)]:
+        path = os.path.join(tmp_dir.name, filename)
+        write_file(path, size * BLOCK)
+        image = ProjectImage(project=project, title=title, uploaded_by=user)
+        with open(path, 'rb') as file:
+            image.image.save(filename, File(file))
+        os.remove(path)
+        names[title] = image.image.name
+
+    configurations = [
+        ('static.serve (before)', '/debug-media/', []),
+        ('serve_media, no sendfile', '/media/', ['--no-sendfile']),
+        ('serve_media, sendfile', '/media/', []),
+    ]
+    for label, prefix, options in configurations:
+        port = free_port()
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', 'ujenziiq.wsgi', '-b', f'127.0.0.1:{port}', '-w', '1',
+             '-k', 'gthread', '--threads', str(args.clients), '--log-level', 'warning', *options],
+            cwd=BACKEND_DIR, env=env,
+        )
+        while True:
+            try:
+                # The worker loads the application after the master binds the port
+                connection = http.client.HTTPConnection('127.0.0.1', port)
+                connection.request('GET', '/')
+                connection.getresponse().read()
+                connection.close()
+                break
+            except ConnectionError:
+                time.sleep(0.1)
+
+        query = f'?token={token}'
+        video_size = args.video * BLOCK
+        totals = []
+
+        def client(seed):
+            rng = random.Random(seed)
+            received = download(port, f"{prefix}{names['Photo']}{query}")
+            received += download(port, f"{prefix}{names['Walkthrough']}{query}")
+            for _ in range(args.seeks):
+                start = rng.randrange(0, video_size - RANGE_SIZE)
+                received += download(port, f"{prefix}{names['Walkthrough']}{query}",
+                                     {'Range': f'bytes={start}-{start + RANGE_SIZE - 1}'})
+            totals.append(received)
+
+        threads = [threading.Thread(target=client, args=(seed,)) for seed in range(args.clients)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        memory = peak_rss(server.pid)
+        server.terminate()
+        server.wait()
+        print(f"{label:26s} {sum(totals) / BLOCK:7.0f} MB to {args.clients} clients in {elapsed:6.2f} s: "
+              f"{sum(totals) / BLOCK / elapsed:6.0f} MB/s, worker peak RSS {memory:5.1f} MB")
+
+    tmp_dir.cleanup()
+
+
+if __name__ == '__main__':
+    main()
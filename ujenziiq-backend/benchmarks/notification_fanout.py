@@ -0,0 +1,105 @@
+"""
+Notification fan-out to a large project: batched versus one row at a time.
+
+A project with a large team is written to a throw-away file-backed SQLite
+database. Safety incidents are reported on it: the save and the queued
+job are timed on their own, then the fan-out job (recipients in one query,
+batched inserts and counter updates) as the worker runs it, next to
+notifying each recipient with its own ``Notification.objects.create``.
+
+    python benchmarks/notification_fanout.py --members 5000 --events 10
+"""
+
+import argparse
+import datetime
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--members', type=int, default=5000)
+    parser.add_argument('--events', type=int, default=10)
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.TemporaryDirectory()
+    os.environ['DATABASE_URL'] = f'sqlite:///{tmp_dir.name}/fanout.sqlite3'
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ujenziiq.settings')
+
+    import django
+    django.setup()
+
+    from django.contrib.auth import get_user_model
+    from django.core.management import call_command
+    from django.db import connection
+    from django.utils import timezone
+
+    from communication.fanout import project_recipients
+    from communication.models import Notification
+    from jobs.worker import Worker
+    from projects.models import Project, Safety
+
+    call_command('migrate', verbosity=0)
+    User = get_user_model()
+    users = User.objects.bulk_create(
+        (User(username=f'member-{i}', email=f'member-{i}@example.com') for i in range(args.members)),
+        batch_size=5000,
+    )
+    manager, client = users[0], users[1]
+    project = Project.objects.create(
+        name='Benchmark', description='-', project_type='other', location='-',
+        start_date=datetime.date(2026, 1, 1), expected_end_date=datetime.date(2027, 1, 1),
+        budget=0, client=client, project_manager=manager,
+    )
+    Through = Project.team_members.through
+    Through.objects.bulk_create((Through(project=project, user=user) for user in users), batch_size=5000)
+    print(f"{args.members} team members")
+
+    def report(label, runs):
+        timings = sorted(ms for ms, _ in runs)
+        queries = sorted({count for _, count in runs})
+        print(f"{label:<28} median {statistics.median(timings):9.1f} ms   max {timings[-1]:9.1f} ms   "
+              f"queries {'/'.join(map(str, queries))}")
+
+    def timed(function):
+        queries = []
+        with connection.execute_wrapper(lambda execute, *params: queries.append(1) or execute(*params)):
+            started = time.perf_counter()
+            function()
+            ms = (time.perf_counter() - started) * 1000
+        return ms, len(queries)
+
+    worker = Worker(threads=0)
+
+    def report_incident():
+        Safety.objects.create(
+            project=project, title='Incident', description='-', date_occurred=timezone.now(),
+            location_in_site='Gate', severity='high', reported_by=manager,
+        )
+
+    def notify_one_by_one():
+        for user_id in project_recipients(project.pk, exclude=[manager.pk]):
+            Notification.objects.create(user_id=user_id, title='-', message='-',
+                                        notification_type='safety_incident', project=project)
+
+    before = Notification.objects.count()
+    requests, jobs = [], []
+    for _ in range(args.events):
+        requests.append(timed(report_incident))
+        jobs.append(timed(worker.run_once))
+    report('save and enqueue', requests)
+    report('batched fan-out job', jobs)
+    per_event = (Notification.objects.count() - before) // args.events
+    print(f"{'':<28} {per_event} notifications per event")
+    report('one create per recipient', [timed(notify_one_by_one) for _ in range(max(1, args.events // 5))])
+    tmp_dir.cleanup()
+
+
+if __name__ == '__main__':
+    main()
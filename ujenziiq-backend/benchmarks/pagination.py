@@ -0,0 +1,106 @@
+"""
+List page latency with keyset pagination vs LIMIT/OFFSET at increasing
+depths, plus the cost of an exact COUNT(*) vs the capped estimate.
+
+Runs against a throw-away file-backed SQLite database filled with
+``--rows`` notifications for a single user (1M by default).
+
+    python benchmarks/pagination.py --rows 1000000
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from urllib.parse import parse_qs, urlsplit
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+def timed(function, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--page-size', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.TemporaryDirectory()
+    os.environ['DATABASE_URL'] = f'sqlite:///{tmp_dir.name}/pagination.sqlite3'
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ujenziiq.settings')
+
+    import django
+    django.setup()
+
+    from django.contrib.auth import get_user_model
+    from django.core.management import call_command
+    from rest_framework.pagination import LimitOffsetPagination
+    from rest_framework.test import APIRequestFactory, force_authenticate
+
+    from communication.models import Notification
+    from communication.views import NotificationViewSet
+    from ujenziiq.pagination import KeysetPagination
+
+    call_command('migrate', verbosity=0)
+    user = get_user_model().objects.create(username='bench', email='bench@example.com')
+
+    started = time.perf_counter()
+    batch_size = 20000
+    for offset in range(0, args.rows, batch_size):
+        Notification.objects.bulk_create(
+            Notification(user=user, title=f'Notification {i}', message='-', notification_type='other')
+            for i in range(offset, min(offset + batch_size, args.rows))
+        )
+    print(f"inserted {args.rows} notifications in {time.perf_counter() - started:.1f} s")
+
+    class OffsetNotificationViewSet(NotificationViewSet):
+        pagination_class = LimitOffsetPagination
+
+    factory = APIRequestFactory()
+    keyset_view = NotificationViewSet.as_view({'get': 'list'})
+    offset_view = OffsetNotificationViewSet.as_view({'get': 'list'})
+
+    def get(view, params):
+        request = factory.get('/api/notifications/', params, HTTP_HOST='localhost')
+        force_authenticate(request, user)
+        response = view(request)
+        assert response.status_code == 200, response.data
+        return response
+
+    # Build the keyset cursor that points at the same row as each offset
+    paginator = KeysetPagination()
+    paginator.base_url = 'http://localhost/api/notifications/'
+    paginator.ordering = ['-created_at']
+    paginator.fields = paginator.get_fields(Notification, paginator.ordering)
+    ordered = Notification.objects.filter(user=user).order_by('-created_at', '-pk')
+
+    print(f"\n{'depth':>9} {'offset ms':>10} {'keyset ms':>10}")
+    for fraction in (0, 0.01, 0.1, 0.5, 0.9, 0.99):
+        depth = int(args.rows * fraction)
+        keyset_params = {'page_size': args.page_size}
+        if depth:
+            cursor_url = paginator.encode_cursor(ordered[depth - 1], reverse=False)
+            keyset_params['cursor'] = parse_qs(urlsplit(cursor_url).query)['cursor'][0]
+        offset_ms = timed(lambda: get(offset_view, {'limit': args.page_size, 'offset': depth}), args.repeat)
+        keyset_ms = timed(lambda: get(keyset_view, keyset_params), args.repeat)
+        print(f"{depth:>9} {offset_ms:>10.2f} {keyset_ms:>10.2f}")
+
+    exact_ms = timed(lambda: Notification.objects.filter(user=user).count(), args.repeat)
+    estimate_ms = timed(lambda: get(keyset_view, {'page_size': args.page_size, 'count': 'true'}), args.repeat)
+    print(f"\nexact COUNT(*): {exact_ms:.2f} ms   first page with estimated count: {estimate_ms:.2f} ms")
+    tmp_dir.cleanup()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""
+Photo search by capture time and position, with and without the indexes.
+
+A throw-away database gets --photos ProjectImage rows spread over
+--projects projects, a year of capture times and a 10 km square of
+positions, as extract_photo_metadata would record them. The
+ProjectImageFilter queries behind /api/images/ (a week on one project, a
+1 km box, and both) are then timed with the Meta indexes in place and
+after dropping them, and the plan SQLite chose is shown for each.
+
+    python benchmarks/photo_search.py --photos 200000 --projects 20
+"""
+
+import argparse
+import datetime
+import os
+import random
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+REPEATS = 20
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--photos', type=int, default=200000)
+    parser.add_argument('--projects', type=int, default=20)
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.TemporaryDirectory()
+    os.environ['DATABASE_URL'] = f'sqlite:///{tmp_dir.name}/photos.sqlite3'
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ujenziiq.settings')
+
+    import django
+    django.setup()
+
+    from django.core.management import call_command
+    from django.db import connection
+    from django.utils import timezone
+
+    from projects.filters import ProjectImageFilter
+    from projects.models import ProjectImage
+    from projects.tests import create_project, create_user
+
+    call_command('migrate', verbosity=0)
+    user = create_user('surveyor')
+    projects = [create_project(user, name=f'Site {i}') for i in range(args.projects)]
+    rng = random.Random(0)
+    start = timezone.now() - datetime.timedelta(days=365)
+    # About 10 km square around central Nairobi
+    rows = [
+        ProjectImage(
+            project=rng.choice(projects), title='Photo', image='', uploaded_by=user,
+            taken_at=start + datetime.timedelta(seconds=rng.randrange(365 * 86400)),
+            latitude=-1.33 + rng.random() * 0.09, longitude=36.78 + rng.random() * 0.09, device='PhoneMaker Phone 12',
+        )
+        for _ in range(args.photos)
+    ]
+    ProjectImage.objects.bulk_create(rows, batch_size=5000)
+    print(f"{args.photos} photos over {args.projects} projects")
+
+    week_end = timezone.now() - datetime.timedelta(days=30)
+    window = {
+        'project': projects[0].pk,
+        'taken_after': (week_end - datetime.timedelta(days=7)).isoformat(),
+        'taken_before': week_end.isoformat(),
+    }
+    # About 1 km each way
+    box = {'bbox': '36.815,-1.295,36.824,-1.286'}
+    queries = [('a week on one project', window), ('a 1 km box', box), ('both', {**window, **box})]
+
+    def run(label):
+        print(label)
+        for name, params in queries:
+            queryset = ProjectImageFilter(params, queryset=ProjectImage.objects.all()).qs.values_list('pk', flat=True)
+            started = time.perf_counter()
+            for _ in range(REPEATS):
+                count = len(list(queryset.all()))
+            elapsed = (time.perf_counter() - started) / REPEATS
+            with connection.cursor() as cursor:
+                sql, sql_params = queryset.query.sql_with_params()
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}', sql_params)
+                plan = '; '.join(row[-1] for row in cursor.fetchall())
+            print(f"  {name:<24} {count:6d} photos {elapsed * 1000:8.2f} ms   {plan}")
+
+    run('With the indexes:')
+    with connection.schema_editor() as editor:
+        for index in ProjectImage._meta.indexes:
+            editor.remove_index(ProjectImage, index)
+    run('Without them:')
+    tmp_dir.cleanup()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,187 @@
+"""
+Idle event-stream connections on one node, and pushing to all of them.
+
+By default the ASGI application is driven in-process: ``--connections``
+users of one project each open ``/api/events/``, then a notification is
+fanned out to the whole project and the time until every connection has
+received it is measured, along with the memory held per idle connection.
+
+With ``--url`` the connections are real sockets to a running server, e.g.
+
+    SECRET_KEY=... DATABASE_URL=sqlite:///push.sqlite3 uvicorn ujenziiq.asgi:application
+    python benchmarks/push_connections.py --url http://127.0.0.1:8000 --token <access token> --hold 60
+
+held for ``--hold`` seconds while heartbeats are counted (the server's
+PUSH_HEARTBEAT should be below the hold time). Each connection is a file
+descriptor on both ends, so ``ulimit -n`` must allow them.
+
+    python benchmarks/push_connections.py --connections 10000
+"""
+
+import argparse
+import asyncio
+import datetime
+import os
+import resource
+import sys
+import tempfile
+import time
+from urllib.parse import urlsplit
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+def rss_mb():
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def raise_fd_limit(needed):
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < needed:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (min(needed, hard), hard))
+
+
+async def in_process(args):
+    from asgiref.sync import sync_to_async
+    from django.contrib.auth import get_user_model
+    from rest_framework_simplejwt.tokens import AccessToken
+
+    from communication.fanout import fan_out
+    from communication.push import get_broker
+    from projects.models import Project
+    from ujenziiq.asgi import application
+
+    def setup():
+        User = get_user_model()
+        users = User.objects.bulk_create(
+            (User(username=f'user-{i}', email=f'user-{i}@example.com') for i in range(args.connections)),
+            batch_size=5000,
+        )
+        project = Project.objects.create(
+            name='Benchmark', description='-', project_type='other', location='-',
+            start_date=datetime.date(2026, 1, 1), expected_end_date=datetime.date(2027, 1, 1),
+            budget=0, client=users[0], project_manager=users[0],
+        )
+        Through = Project.team_members.through
+        Through.objects.bulk_create((Through(project=project, user=user) for user in users), batch_size=5000)
+        return project, [str(AccessToken.for_user(user)) for user in users]
+
+    project, tokens = await sync_to_async(setup)()
+    closed = asyncio.Event()
+    received = asyncio.Queue()
+
+    async def receive():
+        await closed.wait()
+        return {'type': 'http.disconnect'}
+
+    def connection(token):
+        async def send(message):
+            if message.get('body', b'').startswith(b'event: notification'):
+                received.put_nowait(time.perf_counter())
+        scope = {'type': 'http', 'method': 'GET', 'path': '/api/events/', 'query_string': f'token={token}'.encode(), 'headers': []}
+        return application(scope, receive, send)
+
+    broker = get_broker()
+    before = rss_mb()
+    started = time.perf_counter()
+    tasks = [asyncio.ensure_future(connection(token)) for token in tokens]
+    while broker.connection_count() < len(tokens):
+        await asyncio.sleep(0.05)
+    print(f"{len(tokens)} connections open in {time.perf_counter() - started:.1f} s, "
+          f"{(rss_mb() - before) * 1024 / len(tokens):.1f} KiB each")
+
+    await asyncio.sleep(args.hold)
+    started = time.perf_counter()
+    # The fan-out runs on a worker thread like a request would
+    await sync_to_async(fan_out, thread_sensitive=False)(project.pk, 'other', 'Site closed', 'Storm warning')
+    published = time.perf_counter()
+    latest = started
+    for _ in range(len(tokens)):
+        latest = max(latest, await asyncio.wait_for(received.get(), 60))
+    print(f"fan-out and commit {(published - started) * 1000:.0f} ms, "
+          f"last connection received it after {(latest - started) * 1000:.0f} ms")
+
+    closed.set()
+    await asyncio.gather(*tasks)
+    print(f"all closed, {broker.connection_count()} left subscribed")
+
+
+async def over_sockets(args):
+    url = urlsplit(args.url)
+    request = (f'GET /api/events/?token={args.token} HTTP/1.1\r\nHost: {url.netloc}\r\n'
+               f'Accept: text/event-stream\r\n\r\n').encode()
+    heartbeats = streaming = 0
+
+    async def connection():
+        nonlocal heartbeats, streaming
+        reader, writer = await asyncio.open_connection(url.hostname, url.port or 80)
+        writer.write(request)
+        status = await reader.readline()
+        if b' 200 ' not in status:
+            raise RuntimeError(status.decode().strip())
+        streaming += 1
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    return
+                if line.startswith(b': ping'):
+                    heartbeats += 1
+        finally:
+            writer.close()
+
+    raise_fd_limit(args.connections + 100)
+    started = time.perf_counter()
+    tasks = []
+    for start in range(0, args.connections, 500):
+        tasks += [asyncio.ensure_future(connection()) for _ in range(min(500, args.connections - start))]
+        await asyncio.sleep(0.1)
+    while streaming + sum(task.done() for task in tasks) < len(tasks):
+        await asyncio.sleep(0.05)
+    print(f"{streaming} of {len(tasks)} streams open in {time.perf_counter() - started:.1f} s, holding {args.hold} s")
+    heartbeats = 0
+    await asyncio.sleep(args.hold)
+    failed = [task for task in tasks if task.done()]
+    print(f"{len(tasks) - len(failed)} still open, {heartbeats} heartbeats received")
+    if failed:
+        print(f"first failure: {failed[0].exception()!r}")
+    for task in tasks:
+        task.cancel()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--connections', type=int, default=10000)
+    parser.add_argument('--hold', type=float, default=1.0, help='seconds to keep the connections idle')
+    parser.add_argument('--url', help='server to connect to instead of driving the app in-process')
+    parser.add_argument('--token', help='access token for --url')
+    args = parser.parse_args()
+
+    if args.url:
+        asyncio.run(over_sockets(args))
+        return
+
+    tmp_dir = tempfile.TemporaryDirectory()
+    os.environ['DATABASE_URL'] = f'sqlite:///{tmp_dir.name}/push.sqlite3'
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ujenziiq.settings')
+
+    import django
+    django.setup()
+
+    from django.core.management import call_command
+
+    call_command('migrate', verbosity=0)
+    asyncio.run(in_process(args))
+    tmp_dir.cleanup()
+
+
+if __name__ == '__main__':
+    main()
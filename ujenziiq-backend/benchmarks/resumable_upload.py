@@ -0,0 +1,134 @@
+"""
+Resumable upload throughput and memory for large files.
+
+The application is served by wsgiref in a thread, with a throw-away
+database and media root, and a client uploads files of each --sizes (MB)
+to /api/images/uploads/ in --chunk MB PATCH requests, streaming the body
+from a generator, then finalizes each into a ProjectImage. The peak
+memory allocated by Python during each upload is reported, and should
+not grow with the file size.
+
+    python benchmarks/resumable_upload.py --sizes 100 500 --chunk 50
+"""
+
+import argparse
+import http.client
+import io
+import os
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+BLOCK = 1024 * 1024
+
+
+def photo_header():
+    from PIL import Image
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 48), (90, 90, 90)).save(buffer, 'JPEG')
+    return buffer.getvalue()
+
+
+def body(header, start, length):
+    """The file's bytes from ``start``: a small JPEG padded with zeros, generated a block at a time."""
+    end = start + length
+    position = start
+    while position < end:
+        block = bytearray(min(BLOCK, end - position))
+        if position < len(header):
+            part = header[position:position + len(block)]
+            block[:len(part)] = part
+        position += len(block)
+        yield bytes(block)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 500], help='file sizes in MB')
+    parser.add_argument('--chunk', type=int, default=50, help='PATCH size in MB')
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.TemporaryDirectory()
+    os.environ['DATABASE_URL'] = f'sqlite:///{tmp_dir.name}/uploads.sqlite3'
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ujenziiq.settings')
+
+    import django
+    django.setup()
+
+    from wsgiref.simple_server import WSGIRequestHandler, make_server
+
+    from django.core.management import call_command
+    from django.core.wsgi import get_wsgi_application
+    from django.test import override_settings
+    from rest_framework_simplejwt.tokens import AccessToken
+
+    from projects.models import ProjectImage
+    from projects.tests import create_project, create_user
+
+    call_command('migrate', verbosity=0)
+    override = override_settings(MEDIA_ROOT=os.path.join(tmp_dir.name, 'media'), ALLOWED_HOSTS=['*'],
+                                 RESUMABLE_UPLOAD_MAX_SIZE=max(args.sizes) * BLOCK)
+    override.enable()
+    user = create_user('uploader')
+    project = create_project(user)
+    token = str(AccessToken.for_user(user))
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_message(self, *args):
+            pass
+
+    server = make_server('127.0.0.1', 0, get_wsgi_application(), handler_class=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_address[1]
+    header = photo_header()
+
+    def request(method, path, body=None, headers=()):
+        connection = http.client.HTTPConnection('127.0.0.1', port)
+        connection.request(method, path, body=body, headers={
+            'Authorization': f'JWT {token}', 'Tus-Resumable': '1.0.0', **dict(headers),
+        })
+        response = connection.getresponse()
+        response.read()
+        connection.close()
+        return response
+
+    for size in args.sizes:
+        length = size * BLOCK
+        tracemalloc.start()
+        started = time.perf_counter()
+        response = request('POST', '/api/images/uploads/', headers={
+            'Upload-Length': str(length), 'Upload-Metadata': 'filename c2l0ZS5qcGc=',
+        })
+        path = response.getheader('Location').split(str(port), 1)[1]
+        offset = 0
+        while offset < length:
+            chunk = min(args.chunk * BLOCK, length - offset)
+            response = request('PATCH', path, body=body(header, offset, chunk), headers={
+                'Content-Type': 'application/offset+octet-stream', 'Content-Length': str(chunk),
+                'Upload-Offset': str(offset),
+            })
+            assert response.status == 204, response.status
+            offset = int(response.getheader('Upload-Offset'))
+        uploaded = time.perf_counter()
+        response = request('POST', f'{path}finalize/', body=f'project={project.pk}&title=Video',
+                           headers={'Content-Type': 'application/x-www-form-urlencoded'})
+        assert response.status == 201, response.status
+        finalized = time.perf_counter()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f"{size:5d} MB in {args.chunk} MB chunks: upload {size / (uploaded - started):6.0f} MB/s, "
+              f"finalize {(finalized - uploaded) * 1000:5.0f} ms, peak Python memory {peak / BLOCK:5.1f} MB")
+
+    print(f"{ProjectImage.objects.count()} images stored")
+    server.shutdown()
+    override.disable()
+    tmp_dir.cleanup()
+
+
+if __name__ == '__main__':
+    main()
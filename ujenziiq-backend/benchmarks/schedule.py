@@ -0,0 +1,108 @@
+"""
+Critical path computation on large generated task graphs.
+
+By default the graph is generated in memory and only the engine is timed.
+With ``--with-db`` it is also written to a throw-away file-backed SQLite
+database to time the single-query graph load and the full endpoint.
+
+    python benchmarks/schedule.py --tasks 50000 --edges 500000 [--with-db]
+"""
+
+import argparse
+import datetime
+import os
+import random
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+def generate(tasks, edges, seed=0):
+    """A random DAG: every edge points from a task to one created before it."""
+    rng = random.Random(seed)
+    base = datetime.date(2026, 1, 1).toordinal()
+    starts = [base + rng.randrange(0, 365) for _ in range(tasks)]
+    durations = [rng.randrange(0, 20) for _ in range(tasks)]
+    pairs = set()
+    while len(pairs) < edges:
+        task = rng.randrange(1, tasks)
+        dependency = rng.randrange(max(0, task - 500), task)
+        pairs.add((task, dependency))
+    return starts, durations, sorted(pairs)
+
+
+def timed(label, function):
+    started = time.perf_counter()
+    result = function()
+    print(f"{label:<32} {(time.perf_counter() - started) * 1000:10.1f} ms")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--tasks', type=int, default=50000)
+    parser.add_argument('--edges', type=int, default=500000)
+    parser.add_argument('--with-db', action='store_true')
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.TemporaryDirectory()
+    if args.with_db:
+        os.environ['DATABASE_URL'] = f'sqlite:///{tmp_dir.name}/schedule.sqlite3'
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ujenziiq.settings')
+
+    import django
+    django.setup()
+
+    from projects.scheduling import TaskGraph, compute_schedule
+
+    starts, durations, edges = generate(args.tasks, args.edges)
+    print(f"{args.tasks} tasks, {len(edges)} dependency edges")
+
+    graph = timed('build adjacency (in memory)', lambda: TaskGraph(range(args.tasks), starts, durations, edges))
+    schedule = timed('topological sort + CPM passes', lambda: compute_schedule(graph))
+    timed('serialize rows', lambda: schedule.as_rows())
+    print(f"critical path length: {len(schedule.critical_path())} tasks")
+
+    if not args.with_db:
+        tmp_dir.cleanup()
+        return
+
+    from django.contrib.auth import get_user_model
+    from django.core.management import call_command
+    from rest_framework.test import APIClient
+
+    from projects.models import Project, Task
+
+    call_command('migrate', verbosity=0)
+    user = get_user_model().objects.create(username='bench', email='bench@example.com')
+    project = Project.objects.create(
+        name='Benchmark', description='-', project_type='other', location='-',
+        start_date=datetime.date(2026, 1, 1), expected_end_date=datetime.date(2027, 1, 1),
+        budget=0, client=user, project_manager=user,
+    )
+    fromordinal = datetime.date.fromordinal
+    tasks = Task.objects.bulk_create(
+        (Task(project=project, name=f'Task {i}', description='-', start_date=fromordinal(starts[i]),
+              due_date=fromordinal(starts[i] + durations[i])) for i in range(args.tasks)),
+        batch_size=5000,
+    )
+    Through = Task.dependencies.through
+    Through.objects.bulk_create(
+        (Through(from_task_id=tasks[task].pk, to_task_id=tasks[dependency].pk) for task, dependency in edges),
+        batch_size=20000,
+    )
+
+    timed('load graph (two queries)', lambda: TaskGraph.for_project(project.pk))
+    client = APIClient()
+    client.force_authenticate(user)
+    response = timed('GET /api/projects/{id}/schedule/', lambda: client.get(
+        f'/api/projects/{project.pk}/schedule/', HTTP_HOST='localhost'))
+    assert response.status_code == 200, response.status_code
+    tmp_dir.cleanup()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""
+SMS dispatch throughput with the stub gateway.
+
+Pending SMSLog rows, each linked to a notification, are written to a
+throw-away file-backed SQLite database and sent by SMSDispatcher batches
+with the rate limit lifted, so the numbers show what the queue itself
+sustains. Queries are counted per batch.
+
+    python benchmarks/sms_dispatch.py --messages 20000 --batch-size 200
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--messages', type=int, default=20000)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--batch-size', type=int, default=200)
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.TemporaryDirectory()
+    os.environ['DATABASE_URL'] = f'sqlite:///{tmp_dir.name}/sms.sqlite3'
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ujenziiq.settings')
+
+    import django
+    django.setup()
+
+    from django.contrib.auth import get_user_model
+    from django.core.management import call_command
+    from django.db import connection
+
+    from communication.models import Notification, SMSLog
+    from communication.sms import SMSDispatcher, StubGateway
+
+    call_command('migrate', verbosity=0)
+    User = get_user_model()
+    users = User.objects.bulk_create(
+        (User(username=f'user-{i}', email=f'user-{i}@example.com', phone_number=f'+2547{i:08d}',
+              receive_sms_notifications=True) for i in range(args.users)),
+        batch_size=5000,
+    )
+    notifications = Notification.objects.bulk_create(
+        (Notification(user=users[i % args.users], title='-', message='-', notification_type='other')
+         for i in range(args.messages)),
+        batch_size=5000,
+    )
+    SMSLog.objects.bulk_create(
+        (SMSLog(user_id=notification.user_id, phone_number=users[i % args.users].phone_number,
+                message=f'Message {i}', notification=notification)
+         for i, notification in enumerate(notifications)),
+        batch_size=5000,
+    )
+    print(f"{args.messages} pending messages, batches of {args.batch_size}")
+
+    dispatcher = SMSDispatcher(gateway=StubGateway(), batch_size=args.batch_size, rate_limit=1e9)
+    queries, batches, sent = [], 0, 0
+    started = time.perf_counter()
+    with connection.execute_wrapper(lambda execute, *params: queries.append(1) or execute(*params)):
+        while True:
+            counts = dispatcher.run_once()
+            if not any(counts.values()):
+                break
+            batches += 1
+            sent += counts['sent']
+    elapsed = time.perf_counter() - started
+
+    assert sent == args.messages
+    assert not Notification.objects.filter(is_sms_sent=False).exists()
+    print(f"sent {sent} in {elapsed:.1f} s: {sent / elapsed * 60:,.0f} messages per minute")
+    print(f"{len(queries) / batches:.1f} queries per batch")
+    tmp_dir.cleanup()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""
+Startup time of the in-memory database: replaying migrations vs restoring
+a pre-built snapshot with the SQLite backup API.
+
+    python benchmarks/snapshot_startup.py --runs 5 [--seed]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+def sample(seed):
+    """Run inside a fresh process and report how the database was prepared."""
+    from io import StringIO
+
+    from ujenziiq import bootstrap
+
+    started = time.perf_counter()
+    bootstrap.get_application()
+    stats = bootstrap.cold_start_stats()
+    if seed and stats['database'] == 'migrate':
+        from django.core.management import call_command
+        call_command('create_sample_data', stdout=StringIO())
+    stats['startup_ms'] = (time.perf_counter() - started) * 1000
+    print(json.dumps(stats))
+
+
+def run(snapshot_path, seed):
+    env = dict(os.environ, DB_SNAPSHOT_PATH=snapshot_path)
+    command = [sys.executable, __file__, '--sample'] + (['--seed'] if seed else [])
+    output = subprocess.run(
+        command, cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--seed', action='store_true', help='Include the sample data')
+    parser.add_argument('--sample', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.sample:
+        sample(args.seed)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        snapshot_path = os.path.join(tmp_dir, 'snapshot.sqlite3')
+        subprocess.run(
+            [sys.executable, 'manage.py', 'build_db_snapshot', '--output', snapshot_path]
+            + (['--seed'] if args.seed else []),
+            cwd=BACKEND_DIR, capture_output=True, check=True,
+        )
+
+        results = {'migrate': [], 'snapshot': []}
+        for _ in range(args.runs):
+            for label, path in (('migrate', ''), ('snapshot', snapshot_path)):
+                stats = run(path, args.seed)
+                assert stats['database'] == label, stats
+                results[label].append(stats)
+
+    print(f"in-memory database startup ({'seeded' if args.seed else 'schema only'}, {args.runs} runs)")
+    for label, samples in results.items():
+        database_ms = statistics.median(s['database_ms'] for s in samples)
+        startup_ms = statistics.median(s['startup_ms'] for s in samples)
+        print(f"{label:<9} database median={database_ms:9.2f} ms  startup median={startup_ms:9.2f} ms")
+    speedup = (statistics.median(s['startup_ms'] for s in results['migrate'])
+               / statistics.median(s['startup_ms'] for s in results['snapshot']))
+    print(f"startup speedup: {speedup:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
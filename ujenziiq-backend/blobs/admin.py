@@ -0,0 +1,16 @@
+from django.contrib import admin
+from .models import Blob, Upload
+
+@admin.register(Blob)
+class BlobAdmin(admin.ModelAdmin):
+    list_display = ('name', 'size', 'refcount', 'uploads', 'links', 'touched_at')
+    list_filter = ('created_at',)
+    search_fields = ('name', 'sha256')
+    readonly_fields = ('name', 'sha256', 'size', 'refcount', 'uploads', 'links', 'created_at', 'touched_at')
+
+
+@admin.register(Upload)
+class UploadAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'filename', 'offset', 'length', 'created_at', 'expires_at')
+    search_fields = ('filename', 'user__username')
+    readonly_fields = ('offset', 'length')
@@ -0,0 +1,71 @@
+"""
+Garbage collection for content-addressed blobs.
+
+A blob is garbage once no row refers to it and it has not been stored or
+referenced for the grace period, which covers uploads whose row has not
+been saved yet. Files under ``blobs/`` with no ``Blob`` row (left by
+uploads whose transaction rolled back) and stale files in the incoming
+directory are removed after the same grace period.
+"""
+
+import datetime
+import os
+
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from .models import Blob
+from .storage import BLOB_DIR, INCOMING_DIR, blob_storage
+
+BATCH_SIZE = 500
+
+
+def collect_garbage(grace=datetime.timedelta(hours=24), dry_run=False, storage=blob_storage):
+    """Remove unreferenced blobs; returns ``(files removed, bytes freed)``."""
+    cutoff = timezone.now() - grace
+    removed = freed = 0
+    while not dry_run:
+        with transaction.atomic():
+            # Locked so that a concurrent upload of the same content waits
+            # for this batch and then writes the file again
+            garbage = list(Blob.objects.select_for_update(skip_locked=True).filter(
+                refcount__lte=0, touched_at__lt=cutoff,
+            ).order_by('id')[:BATCH_SIZE])
+            if not garbage:
+                break
+            for blob in garbage:
+                if os.path.exists(storage.path(blob.name)):
+                    os.remove(storage.path(blob.name))
+                    freed += blob.size
+                removed += 1
+            Blob.objects.filter(pk__in=[blob.pk for blob in garbage]).delete()
+
+    if dry_run:
+        garbage = Blob.objects.filter(refcount__lte=0, touched_at__lt=cutoff).aggregate(
+            count=Count('id'), size=Sum('size'),
+        )
+        removed, freed = garbage['count'], garbage['size'] or 0
+
+    known = None
+    root = storage.path(BLOB_DIR)
+    for directory, _, files in os.walk(root):
+        for filename in files:
+            path = os.path.join(directory, filename)
+            name = os.path.relpath(path, storage.location).replace(os.sep, '/')
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if datetime.datetime.fromtimestamp(stat.st_mtime, datetime.timezone.utc) >= cutoff:
+                continue
+            if not name.startswith(f'{INCOMING_DIR}/'):
+                if known is None:
+                    known = set(Blob.objects.values_list('name', flat=True))
+                if name in known:
+                    continue
+            if not dry_run:
+                os.remove(path)
+            removed += 1
+            freed += stat.st_size
+    return removed, freed
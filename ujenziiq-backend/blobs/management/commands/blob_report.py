@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from blobs.models import Blob
+
+
+def megabytes(value):
+    return f'{value / 1e6:,.1f} MB'
+
+
+class Command(BaseCommand):
+    help = 'Reports the storage and upload bandwidth saved by de-duplicating media'
+
+    def handle(self, *args, **options):
+        report = Blob.objects.report()
+        self.stdout.write(f"{report['blobs']} blobs, {report['references']} references")
+        self.stdout.write(f"Stored:            {megabytes(report['stored_bytes'])} "
+                          f"({megabytes(report['garbage_bytes'])} awaiting gc_blobs)")
+        self.stdout.write(f"Referenced:        {megabytes(report['referenced_bytes'])}")
+        self.stdout.write(f"Received:          {megabytes(report['received_bytes'])}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Storage saved:     {megabytes(report['storage_saved_bytes'])}\n"
+            f"Disk writes saved: {megabytes(report['writes_saved_bytes'])}\n"
+            f"Uploads saved:     {megabytes(report['upload_saved_bytes'])}"
+        ))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from blobs.uploads import expire_uploads
+
+
+class Command(BaseCommand):
+    help = 'Removes resumable uploads that have made no progress within RESUMABLE_UPLOAD_EXPIRY'
+
+    def handle(self, *args, **options):
+        removed = expire_uploads()
+        self.stdout.write(self.style.SUCCESS(f'Removed {removed} expired uploads'))
@@ -0,0 +1,26 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+
+from blobs.gc import collect_garbage
+
+
+class Command(BaseCommand):
+    help = 'Removes stored blobs that no longer have any references'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace',
+            type=float,
+            default=24.0,
+            help='Hours a blob must have been unreferenced before it is removed',
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Report what would be removed')
+
+    def handle(self, *args, **options):
+        removed, freed = collect_garbage(
+            grace=datetime.timedelta(hours=options['grace']),
+            dry_run=options['dry_run'],
+        )
+        verb = 'Would remove' if options['dry_run'] else 'Removed'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {removed} files, {freed / 1e6:.1f} MB'))
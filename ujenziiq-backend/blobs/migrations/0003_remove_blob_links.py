@@ -0,0 +1,17 @@
+# Generated by Django 4.2.4 on 2026-10-18 08:41
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blobs', '0002_uploads'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='blob',
+            name='links',
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.4 on 2026-10-18 09:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blobs', '0003_remove_blob_links'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blob',
+            name='links',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,96 @@
+import uuid
+
+from django.conf import settings
+from django.db import models
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+
+class BlobQuerySet(models.QuerySet):
+    def adjust(self, deltas):
+        """Apply ``{name: delta}`` to the reference counts, one UPDATE per distinct delta."""
+        by_delta = {}
+        for name, delta in deltas.items():
+            if name and delta:
+                by_delta.setdefault(delta, []).append(name)
+        now = timezone.now()
+        for delta, names in by_delta.items():
+            self.filter(name__in=names).update(refcount=F('refcount') + delta, touched_at=now)
+
+    def report(self):
+        """
+        Bytes on disk against what the same references and uploads would
+        cost without de-duplication.
+        """
+        totals = self.aggregate(
+            blobs=Count('id'),
+            references=Sum('refcount', filter=Q(refcount__gt=0), default=0),
+            stored_bytes=Sum('size', default=0),
+            garbage_bytes=Sum('size', filter=Q(refcount__lte=0), default=0),
+            referenced_bytes=Sum(F('size') * F('refcount'), filter=Q(refcount__gt=0), default=0),
+            received_bytes=Sum(F('size') * F('uploads'), default=0),
+            linked_bytes=Sum(F('size') * F('links'), default=0),
+        )
+        live_bytes = totals['stored_bytes'] - totals['garbage_bytes']
+        # Each blob is written once however many times it is uploaded
+        totals['storage_saved_bytes'] = totals['referenced_bytes'] - live_bytes
+        totals['writes_saved_bytes'] = totals['received_bytes'] - totals['stored_bytes']
+        # References made on proof of possession never uploaded the file
+        totals['upload_saved_bytes'] = totals['linked_bytes']
+        return totals
+
+
+class Blob(models.Model):
+    """
+    A stored file, named after the SHA-256 of its content, and the number of
+    file fields that refer to it. Unreferenced blobs are removed by gc_blobs.
+    """
+    name = models.CharField(max_length=255, unique=True)
+    sha256 = models.CharField(max_length=64, db_index=True)
+    size = models.BigIntegerField()
+    refcount = models.IntegerField(default=0)
+    # Times the content was received in an upload, and times a reference
+    # was made on proof of possession without receiving it (blobs.possession)
+    uploads = models.PositiveIntegerField(default=0)
+    links = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Last stored or referenced; garbage is only collected after a grace period
+    touched_at = models.DateTimeField(default=timezone.now)
+    
+    objects = BlobQuerySet.as_manager()
+    
+    def __str__(self):
+        return self.name
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['refcount', 'touched_at']),
+        ]
+
+
+class Upload(models.Model):
+    """
+    A resumable upload in progress (see ``blobs.tus``). The bytes received
+    so far are in a file of their own until the upload is finalized.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='uploads')
+    filename = models.CharField(max_length=255, blank=True, default='')
+    # Upload-Metadata sent when the upload was created
+    metadata = models.JSONField(default=dict, blank=True)
+    length = models.BigIntegerField()
+    offset = models.BigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+    
+    def __str__(self):
+        return f"{self.filename or self.pk} ({self.offset}/{self.length})"
+    
+    @property
+    def is_complete(self):
+        return self.offset == self.length
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['expires_at']),
+        ]
@@ -0,0 +1,83 @@
+"""
+Attaching a stored file without uploading it again, on proof that the
+client has it.
+
+A digest alone proves nothing: anyone who learns it could attach the file.
+So the client first asks for a challenge for the SHA-256 and size of its
+file (``PossessionChallengeMixin`` adds ``POST challenges/`` to a
+viewset's list URL). The server picks a random byte range and a nonce,
+and signs them into the challenge. The client answers with the SHA-256 of
+the nonce followed by those bytes of its file, which only the holder of
+the file can compute, and sends the challenge and the answer instead of
+the file. ``verify`` checks the answer against the stored blob.
+
+Every digest gets a challenge and every wrong answer the same error,
+whether or not the file is stored, so the endpoint does not reveal what
+is stored.
+"""
+
+import hashlib
+import hmac
+import secrets
+
+from django.core import signing
+from rest_framework import serializers, status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+from .models import Blob
+from .storage import blob_storage
+
+SALT = 'blobs.possession'
+# How long a challenge can be answered, in seconds
+CHALLENGE_MAX_AGE = 600
+# Bytes of the file the answer covers
+CHALLENGE_LENGTH = 64 * 1024
+
+
+class ChallengeRequestSerializer(serializers.Serializer):
+    sha256 = serializers.RegexField(r'^[0-9a-f]{64}$')
+    size = serializers.IntegerField(min_value=1)
+
+
+def issue_challenge(user, sha256, size):
+    length = min(size, CHALLENGE_LENGTH)
+    offset = secrets.randbelow(size - length + 1)
+    nonce = secrets.token_hex(16)
+    challenge = signing.dumps({
+        'user': user.pk, 'sha256': sha256, 'size': size, 'offset': offset, 'length': length, 'nonce': nonce,
+    }, salt=SALT)
+    return {'challenge': challenge, 'offset': offset, 'length': length, 'nonce': nonce,
+            'expires_in': CHALLENGE_MAX_AGE}
+
+
+def answer(nonce, data):
+    """What a client holding ``data``, the challenged range of the file, sends back."""
+    return hashlib.sha256(nonce.encode() + data).hexdigest()
+
+
+def verify(user, challenge, proof):
+    """The stored blob the answered ``challenge`` is for; raises ValidationError otherwise."""
+    try:
+        claim = signing.loads(challenge, salt=SALT, max_age=CHALLENGE_MAX_AGE)
+    except signing.BadSignature:
+        raise serializers.ValidationError({'challenge': 'Invalid or expired challenge'})
+    if claim['user'] != user.pk:
+        raise serializers.ValidationError({'challenge': 'Invalid or expired challenge'})
+    blob = Blob.objects.filter(sha256=claim['sha256'], size=claim['size'], refcount__gt=0).first()
+    expected = None
+    if blob is not None:
+        with blob_storage.open(blob.name, 'rb') as file:
+            file.seek(claim['offset'])
+            expected = answer(claim['nonce'], file.read(claim['length']))
+    if expected is None or not hmac.compare_digest(expected, proof):
+        raise serializers.ValidationError({'proof': 'Does not match; upload the file'})
+    return blob
+
+
+class PossessionChallengeMixin:
+    @action(detail=False, methods=['post'], url_path='challenges')
+    def create_challenge(self, request):
+        serializer = ChallengeRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response(issue_challenge(request.user, **serializer.validated_data), status=status.HTTP_201_CREATED)
@@ -0,0 +1,71 @@
+"""
+Reference counts for blobs, kept by the rows that point at them.
+
+Every model file field stored with ``ContentAddressedStorage`` is watched:
+saving a row adds a reference to each new blob name and drops one from the
+name it replaced, and deleting a row (including cascades) drops its
+references. The counts change in the saving transaction, so a rolled back
+save leaves them as they were. ``QuerySet.update()`` and
+``bulk_create()`` bypass the signals and must adjust the counts with
+``Blob.objects.adjust`` themselves.
+"""
+
+from collections import Counter
+
+from django.apps import apps
+from django.db import models
+from django.db.models.signals import post_delete, post_save, pre_save
+
+from .models import Blob
+from .storage import ContentAddressedStorage
+
+
+def blob_fields(model):
+    return [
+        field for field in model._meta.concrete_fields
+        if isinstance(field, models.FileField) and isinstance(field.storage, ContentAddressedStorage)
+    ]
+
+
+def _names(instance, fields):
+    return {field.attname: getattr(instance, field.attname).name or '' for field in fields}
+
+
+def remember_blob_names(sender, instance, raw=False, update_fields=None, **kwargs):
+    fields = [field for field in blob_fields(sender) if update_fields is None or field.name in update_fields]
+    instance._previous_blob_names = {}
+    if fields and instance.pk is not None and not raw:
+        instance._previous_blob_names = sender._base_manager.filter(pk=instance.pk).values(
+            *[field.attname for field in fields]
+        ).first() or {}
+    instance._saved_blob_fields = fields
+
+
+def count_saved_references(sender, instance, raw=False, **kwargs):
+    fields = getattr(instance, '_saved_blob_fields', ())
+    if raw or not fields:
+        return
+    deltas = Counter()
+    previous = instance._previous_blob_names
+    for attname, name in _names(instance, fields).items():
+        old = previous.get(attname) or ''
+        if name != old:
+            deltas[name] += 1
+            deltas[old] -= 1
+    Blob.objects.adjust(deltas)
+
+
+def count_deleted_references(sender, instance, **kwargs):
+    deltas = Counter()
+    for name in _names(instance, blob_fields(sender)).values():
+        deltas[name] -= 1
+    Blob.objects.adjust(deltas)
+
+
+def connect_blob_fields():
+    for model in apps.get_models():
+        if blob_fields(model):
+            pre_save.connect(remember_blob_names, sender=model, dispatch_uid=f'blobs.pre_save.{model._meta.label}')
+            post_save.connect(count_saved_references, sender=model, dispatch_uid=f'blobs.post_save.{model._meta.label}')
+            post_delete.connect(count_deleted_references, sender=model,
+                                dispatch_uid=f'blobs.post_delete.{model._meta.label}')
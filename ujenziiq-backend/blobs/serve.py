@@ -0,0 +1,174 @@
+"""
+Serving stored files over HTTP, for production.
+
+``serve_file`` answers ``GET`` and ``HEAD`` for a file in a storage with
+an ``ETag`` and ``Last-Modified``, ``304 Not Modified`` for matching
+``If-None-Match``/``If-Modified-Since``, and single byte ranges
+(``Range``, honouring ``If-Range``) as ``206 Partial Content``. Blobs never
+change, so their ETag is their digest and they may be cached for a year;
+files stored before the switch to blobs get a day.
+
+``MEDIA_SERVE_MODE`` chooses who sends the bytes:
+
+- ``'django'`` returns the open file. WSGI servers with a
+  ``wsgi.file_wrapper`` that uses ``sendfile`` (gunicorn) send it straight
+  from the page cache, ranges included; others read it in blocks.
+- ``'x-accel-redirect'`` hands the file to nginx, through an ``internal``
+  location at ``MEDIA_ACCEL_PREFIX`` aliased to the media root. nginx
+  answers ranges itself.
+- ``'x-sendfile'`` does the same for Apache's mod_xsendfile and lighttpd,
+  with the file's absolute path.
+
+Either way the caller has already checked that the user may see the file.
+"""
+
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+
+from .storage import is_blob
+
+BLOB_CACHE_CONTROL = 'private, max-age=31536000, immutable'
+FILE_CACHE_CONTROL = 'private, max-age=86400'
+RANGE_PATTERN = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class RangeNotSatisfiable(Exception):
+    """The requested range lies outside the file."""
+
+
+class FileRange:
+    """
+    ``length`` bytes of an open file from ``start``. Reads stop at the end of
+    the range, and ``fileno()`` lets a sendfile-capable server send it from
+    the file's current position.
+    """
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+class MediaFileResponse(FileResponse):
+    # When no sendfile is available, read in larger blocks than the default 4 KiB
+    block_size = 256 * 1024
+
+
+def parse_range(header, size):
+    """
+    The ``(start, end)`` byte positions, inclusive, of a single-range
+    ``Range`` header, or None when the header should be ignored (malformed,
+    or several ranges). Raises ``RangeNotSatisfiable``.
+    """
+    match = RANGE_PATTERN.match(header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first:
+        if not last:
+            return None
+        suffix = int(last)
+        if suffix == 0 or size == 0:
+            raise RangeNotSatisfiable
+        return max(size - suffix, 0), size - 1
+    start = int(first)
+    end = int(last) if last else size - 1
+    if last and end < start:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable
+    return start, min(end, size - 1)
+
+
+def _if_range_matches(request, etag, last_modified):
+    value = request.headers.get('If-Range')
+    if value is None:
+        return True
+    if value.startswith(('"', 'W/')):
+        # A weak validator never matches for ranges
+        return value == etag
+    return parse_http_date_safe(value) == last_modified
+
+
+def file_validators(name, stat):
+    """``(etag, last_modified)`` for the stored file ``name``."""
+    last_modified = int(stat.st_mtime)
+    if is_blob(name):
+        etag = '"%s"' % os.path.splitext(os.path.basename(name))[0]
+    else:
+        etag = '"%x-%x"' % (last_modified, stat.st_size)
+    return etag, last_modified
+
+
+def serve_file(request, storage, name):
+    path = storage.path(name)
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    etag, last_modified = file_validators(name, stat)
+    headers = {
+        'ETag': etag,
+        'Last-Modified': http_date(last_modified),
+        'Cache-Control': BLOB_CACHE_CONTROL if is_blob(name) else FILE_CACHE_CONTROL,
+    }
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        for header, value in headers.items():
+            not_modified[header] = value
+        return not_modified
+
+    content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+    mode = settings.MEDIA_SERVE_MODE
+    if mode != 'django':
+        response = HttpResponse(content_type=content_type, headers=headers)
+        if mode == 'x-accel-redirect':
+            response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_PREFIX + quote(name)
+        else:
+            response['X-Sendfile'] = path
+        return response
+
+    size = stat.st_size
+    headers['Accept-Ranges'] = 'bytes'
+    byte_range = None
+    if 'Range' in request.headers and _if_range_matches(request, etag, last_modified):
+        try:
+            byte_range = parse_range(request.headers['Range'], size)
+        except RangeNotSatisfiable:
+            headers['Content-Range'] = f'bytes */{size}'
+            return HttpResponse(status=416, headers=headers)
+
+    start, end = byte_range or (0, size - 1)
+    length = end - start + 1 if size else 0
+    if request.method == 'HEAD':
+        response = HttpResponse(content_type=content_type, headers=headers)
+    elif byte_range is None:
+        response = MediaFileResponse(open(path, 'rb'), content_type=content_type, headers=headers)
+    else:
+        response = MediaFileResponse(FileRange(open(path, 'rb'), start, length),
+                                     content_type=content_type, headers=headers)
+    if byte_range is not None:
+        response.status_code = 206
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response['Content-Length'] = str(length)
+    return response
@@ -0,0 +1,117 @@
+"""
+Content-addressed file storage.
+
+``ContentAddressedStorage`` ignores the name a file field asks for and
+stores the file as ``blobs/<ab>/<sha256><ext>``, so identical uploads,
+whatever field or row they are attached to, share one file on disk. The
+digest is computed while the upload streams in (see
+``blobs.uploadhandler``) or, for other content, while it is copied to a
+temporary file next to the blobs, which is then renamed into place. When
+the blob already exists nothing is written at all.
+
+Each stored file gets a ``Blob`` row. ``blobs.references`` counts the
+rows pointing at each blob from the file fields that use this storage,
+and ``gc_blobs`` removes blobs nothing has pointed at for a while.
+``delete`` therefore leaves blobs alone; names outside ``blobs/`` (files
+stored before the switch) are still deleted normally.
+"""
+
+import hashlib
+import os
+import uuid
+
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.db.models import F
+from django.utils import timezone
+from django.utils.deconstruct import deconstructible
+
+BLOB_DIR = 'blobs'
+INCOMING_DIR = f'{BLOB_DIR}/incoming'
+
+
+def blob_name(digest, original_name):
+    ext = os.path.splitext(original_name)[1].lower()
+    return f'{BLOB_DIR}/{digest[:2]}/{digest}{ext}'
+
+
+def is_blob(name):
+    return bool(name) and name.startswith(f'{BLOB_DIR}/') and not name.startswith(f'{INCOMING_DIR}/')
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    def get_available_name(self, name, max_length=None):
+        # The name is replaced by the digest in _save
+        return name
+
+    def _incoming_path(self):
+        directory = self.path(INCOMING_DIR)
+        os.makedirs(directory, exist_ok=True)
+        return os.path.join(directory, uuid.uuid4().hex)
+
+    def _receive(self, content):
+        """Write ``content`` next to the blobs; returns ``(path, sha256, size)``."""
+        path = self._incoming_path()
+        digest = getattr(content, 'sha256', None)
+        if digest and hasattr(content, 'temporary_file_path'):
+            file_move_safe(content.temporary_file_path(), path)
+            return path, digest, os.path.getsize(path)
+
+        hasher = None if digest else hashlib.sha256()
+        size = 0
+        with open(path, 'wb') as file:
+            for chunk in content.chunks():
+                if isinstance(chunk, str):
+                    chunk = chunk.encode()
+                if hasher is not None:
+                    hasher.update(chunk)
+                size += len(chunk)
+                file.write(chunk)
+        return path, digest or hasher.hexdigest(), size
+
+    def _touch(self, name, digest, size):
+        from .models import Blob
+
+        now = timezone.now()
+        if not Blob.objects.filter(name=name).update(uploads=F('uploads') + 1, touched_at=now):
+            _, created = Blob.objects.get_or_create(
+                name=name, defaults={'sha256': digest, 'size': size, 'uploads': 1, 'touched_at': now},
+            )
+            if not created:
+                Blob.objects.filter(name=name).update(uploads=F('uploads') + 1, touched_at=now)
+
+    def _save(self, name, content):
+        digest = getattr(content, 'sha256', None)
+        path = None
+        if digest is None:
+            path, digest, size = self._receive(content)
+        else:
+            size = content.size
+        name = blob_name(digest, name)
+
+        # Touch the row before looking for the file: gc_blobs locks the rows
+        # it collects, so a blob seen here is not removed under us
+        self._touch(name, digest, size)
+        full_path = self.path(name)
+        if os.path.exists(full_path):
+            if path is not None:
+                os.remove(path)
+            # Recently used files are never swept as orphans
+            os.utime(full_path)
+            return name
+
+        if path is None:
+            path, _, _ = self._receive(content)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        os.replace(path, full_path)
+        if self.file_permissions_mode is not None:
+            os.chmod(full_path, self.file_permissions_mode)
+        return name
+
+    def delete(self, name):
+        if not is_blob(name):
+            super().delete(name)
+
+
+blob_storage = ContentAddressedStorage()
@@ -0,0 +1,442 @@
+import base64
+import datetime
+import fcntl
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+from rest_framework import viewsets
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from jobs.models import Job
+from projects.models import ProjectImage
+from projects.tests import create_project, create_user
+from . import possession
+from .gc import collect_garbage
+from .models import Blob, Upload
+from .serve import FileRange
+from .storage import blob_storage
+from .tus import TusUploadMixin
+from .uploads import CHUNK_SIZE, PARTIAL_DIR, OffsetConflict, append, partial_path
+
+
+def jpeg_bytes(color):
+    buffer = io.BytesIO()
+    Image.new('RGB', (40, 30), color).save(buffer, 'JPEG')
+    return buffer.getvalue()
+
+
+class BlobStorageTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = create_user('manager')
+        self.project = create_project(self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.photo = jpeg_bytes((200, 10, 10))
+
+    def upload(self, data, name='site.jpg'):
+        response = self.client.post('/api/images/', {
+            'project': self.project.pk, 'title': name,
+            'image': SimpleUploadedFile(name, data, content_type='image/jpeg'),
+        })
+        self.assertEqual(response.status_code, 201, response.data)
+        return ProjectImage.objects.get(pk=response.data['id'])
+
+    def age_blobs(self):
+        Blob.objects.update(touched_at=timezone.now() - datetime.timedelta(days=2))
+
+    def test_identical_uploads_are_stored_once(self):
+        first = self.upload(self.photo, 'a.JPG')
+        second = self.upload(self.photo, 'b.jpg')
+        digest = hashlib.sha256(self.photo).hexdigest()
+        self.assertEqual(first.image.name, f'blobs/{digest[:2]}/{digest}.jpg')
+        self.assertEqual(second.image.name, first.image.name)
+        blob = Blob.objects.get(name=first.image.name)
+        self.assertEqual((blob.refcount, blob.uploads, blob.size), (2, 2, len(self.photo)))
+        with blob_storage.open(blob.name) as file:
+            self.assertEqual(file.read(), self.photo)
+
+    @override_settings(FILE_UPLOAD_MAX_MEMORY_SIZE=10)
+    def test_large_uploads_are_moved_into_place(self):
+        image = self.upload(self.photo)
+        self.assertEqual(image.image.name.rsplit('/', 1)[1], hashlib.sha256(self.photo).hexdigest() + '.jpg')
+        self.assertEqual(os.listdir(blob_storage.path('blobs/incoming')), [])
+
+    def test_references_follow_saves_and_deletes(self):
+        image = self.upload(self.photo)
+        old = image.image.name
+        image.image.save('new.jpg', ContentFile(jpeg_bytes((10, 200, 10))), save=False)
+        image.save()
+        self.assertEqual(Blob.objects.get(name=old).refcount, 0)
+        self.assertEqual(Blob.objects.get(name=image.image.name).refcount, 1)
+
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            image.delete()
+            raise RuntimeError
+        self.assertEqual(Blob.objects.get(name=image.image.name).refcount, 1)
+        self.project.delete()
+        self.assertEqual(Blob.objects.get(name=image.image.name).refcount, 0)
+
+    def test_garbage_collection(self):
+        kept = self.upload(self.photo)
+        released = self.upload(jpeg_bytes((10, 10, 200)))
+        released_name = released.image.name
+        released.delete()
+        orphan = blob_storage.path('blobs/00/orphan.jpg')
+        os.makedirs(os.path.dirname(orphan))
+        with open(orphan, 'wb') as file:
+            file.write(b'x' * 10)
+
+        self.assertEqual(collect_garbage(), (0, 0))
+        self.age_blobs()
+        os.utime(orphan, (0, 0))
+        self.assertEqual(collect_garbage(dry_run=True)[0], 2)
+        removed, freed = collect_garbage()
+        self.assertEqual(removed, 2)
+        self.assertFalse(blob_storage.exists(released_name))
+        self.assertFalse(os.path.exists(orphan))
+        self.assertTrue(blob_storage.exists(kept.image.name))
+        self.assertEqual(list(Blob.objects.values_list('name', flat=True)), [kept.image.name])
+
+    def test_images_cannot_be_attached_by_digest(self):
+        # A digest proves nothing about having the file, and would tell
+        # anyone whether it is stored
+        self.upload(self.photo)
+        response = self.client.post('/api/images/', {
+            'project': self.project.pk, 'title': 'Again', 'sha256': hashlib.sha256(self.photo).hexdigest(),
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('image', response.data)
+        self.assertEqual(Blob.objects.get().refcount, 1)
+
+    def challenge(self, data, client=None):
+        response = (client or self.client).post('/api/images/challenges/', {
+            'sha256': hashlib.sha256(data).hexdigest(), 'size': len(data),
+        })
+        self.assertEqual(response.status_code, 201, response.data)
+        challenge = response.data
+        proof = possession.answer(challenge['nonce'], data[challenge['offset']:challenge['offset'] + challenge['length']])
+        return challenge['challenge'], proof
+
+    def attach(self, challenge, proof):
+        return self.client.post('/api/images/', {
+            'project': self.project.pk, 'title': 'Again', 'challenge': challenge, 'proof': proof,
+        })
+
+    def test_attach_on_proof_of_possession(self):
+        self.upload(self.photo)
+        with mock.patch.object(possession, 'CHALLENGE_LENGTH', 100):
+            challenge, proof = self.challenge(self.photo)
+        response = self.attach(challenge, proof)
+        self.assertEqual(response.status_code, 201, response.data)
+        image = ProjectImage.objects.get(pk=response.data['id'])
+        blob = Blob.objects.get()
+        self.assertEqual(image.image.name, blob.name)
+        self.assertEqual((blob.refcount, blob.uploads, blob.links), (2, 1, 1))
+        self.assertEqual(Blob.objects.report()['upload_saved_bytes'], len(self.photo))
+
+        # The digest, or a stale answer, is not enough
+        challenge, _ = self.challenge(self.photo)
+        self.assertIn('proof', self.attach(challenge, proof).data)
+        # Another user's challenge
+        other = APIClient()
+        other.force_authenticate(create_user('other'))
+        challenge, proof = self.challenge(self.photo, other)
+        self.assertIn('challenge', self.attach(challenge, proof).data)
+        self.assertIn('challenge', self.attach(challenge[:-1], proof).data)
+        # Files that are not stored are challenged all the same
+        challenge, proof = self.challenge(b'not stored')
+        response = self.attach(challenge, proof)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('proof', response.data)
+        self.assertEqual(Blob.objects.get().refcount, 2)
+
+    def test_profile_images(self):
+        self.user.profile_image.save('me.jpg', ContentFile(self.photo))
+        self.assertTrue(self.user.profile_image.name.startswith('blobs/'))
+        self.upload(self.photo)
+        self.assertEqual(Blob.objects.get().refcount, 2)
+        # Saves that do not touch the image do not look it up
+        with self.assertNumQueries(1):
+            self.user.save(update_fields=['last_login'])
+
+    def test_report(self):
+        self.upload(self.photo)
+        self.upload(self.photo)
+        report = Blob.objects.report()
+        self.assertEqual(report['storage_saved_bytes'], len(self.photo))
+        self.assertEqual(report['writes_saved_bytes'], len(self.photo))
+        out = StringIO()
+        call_command('blob_report', stdout=out)
+        self.assertIn('1 blobs, 2 references', out.getvalue())
+        self.assertIn('Uploads saved', out.getvalue())
+
+
+class BrokenStream:
+    """A request body whose connection drops after ``limit`` bytes."""
+
+    def __init__(self, data, limit):
+        self.data, self.limit, self.position, self.largest_read = data, limit, 0, 0
+
+    def read(self, size):
+        self.largest_read = max(self.largest_read, size)
+        if self.position >= self.limit:
+            raise OSError('connection reset')
+        chunk = self.data[self.position:min(self.position + size, self.limit)]
+        self.position += len(chunk)
+        return chunk
+
+
+class ResumableUploadTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = create_user('manager')
+        self.project = create_project(self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.photo = jpeg_bytes((200, 10, 10)) + b'\0' * 1000
+
+    def create(self, length=None, **metadata):
+        metadata.setdefault('filename', 'slab.jpg')
+        encoded = ','.join(f'{key} {base64.b64encode(value.encode()).decode()}' for key, value in metadata.items())
+        return self.client.post('/api/images/uploads/', HTTP_UPLOAD_LENGTH=str(length or len(self.photo)),
+                                HTTP_UPLOAD_METADATA=encoded, HTTP_TUS_RESUMABLE='1.0.0')
+
+    def patch(self, url, offset, data):
+        return self.client.generic('PATCH', url, data, content_type='application/offset+octet-stream',
+                                   HTTP_UPLOAD_OFFSET=str(offset), HTTP_TUS_RESUMABLE='1.0.0')
+
+    def test_upload_in_chunks_and_finalize(self):
+        response = self.create(title='Slab pour')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response['Tus-Resumable'], '1.0.0')
+        url = response['Location']
+
+        for start in range(0, len(self.photo), 700):
+            response = self.patch(url, start, self.photo[start:start + 700])
+            self.assertEqual(response.status_code, 204)
+        self.assertEqual(int(self.client.head(url)['Upload-Offset']), len(self.photo))
+
+        response = self.client.post(f'{url}finalize/', {'project': self.project.pk})
+        self.assertEqual(response.status_code, 201, response.data)
+        image = ProjectImage.objects.get(pk=response.data['id'])
+        self.assertEqual(image.title, 'Slab pour')
+        self.assertEqual(image.image.name, f'blobs/{hashlib.sha256(self.photo).hexdigest()[:2]}/'
+                                           f'{hashlib.sha256(self.photo).hexdigest()}.jpg')
+        self.assertEqual(Blob.objects.get().refcount, 1)
+        self.assertFalse(Upload.objects.exists())
+        self.assertEqual(os.listdir(blob_storage.path(PARTIAL_DIR)), [])
+        self.assertEqual(self.client.head(url).status_code, 404)
+
+    def test_resume_after_a_dropped_connection(self):
+        upload = Upload.objects.get(pk=self.create().data['id'])
+        stream = BrokenStream(self.photo, 900)
+        with self.assertRaises(OSError):
+            append(upload, stream, 0)
+        self.assertLessEqual(stream.largest_read, CHUNK_SIZE)
+        url = f'/api/images/uploads/{upload.pk.hex}/'
+        self.assertEqual(self.client.head(url)['Upload-Offset'], '900')
+
+        response = self.patch(url, 0, self.photo)
+        self.assertEqual((response.status_code, response['Upload-Offset']), (409, '900'))
+        self.assertEqual(self.patch(url, 900, self.photo[900:]).status_code, 204)
+        self.assertEqual(self.client.post(f'{url}finalize/', {'project': self.project.pk, 'title': '-'}).status_code, 201)
+        with blob_storage.open(ProjectImage.objects.get().image.name) as file:
+            self.assertEqual(file.read(), self.photo)
+
+    def test_concurrent_appends_do_not_touch_the_file(self):
+        upload = Upload.objects.get(pk=self.create().data['id'])
+        append(upload, io.BytesIO(self.photo[:500]), 0)
+        stale = Upload.objects.get(pk=upload.pk)
+        with open(partial_path(upload), 'rb') as file:
+            # Another request is appending
+            fcntl.flock(file, fcntl.LOCK_EX)
+            with self.assertRaises(OffsetConflict):
+                append(stale, io.BytesIO(b'x' * 100), 500)
+        # It finished while this request waited with the old offset
+        append(upload, io.BytesIO(self.photo[500:800]), 500)
+        stale.offset = 500
+        with self.assertRaises(OffsetConflict):
+            append(stale, io.BytesIO(b'x' * 100), 500)
+        with open(partial_path(upload), 'rb') as file:
+            self.assertEqual(file.read(), self.photo[:800])
+        self.assertEqual(Upload.objects.get().offset, 800)
+
+    def test_protocol_errors(self):
+        self.assertEqual(self.client.post('/api/images/uploads/').status_code, 400)
+        with override_settings(RESUMABLE_UPLOAD_MAX_SIZE=10):
+            self.assertEqual(self.create().status_code, 413)
+        url = self.create()['Location']
+        self.assertEqual(self.client.patch(url, {'data': 'x'}, format='json').status_code, 415)
+        self.assertEqual(self.patch(url, 0, self.photo + b'extra').status_code, 413)
+        response = self.client.generic('PATCH', url, self.photo, content_type='application/offset+octet-stream',
+                                       HTTP_UPLOAD_OFFSET='0', CONTENT_LENGTH='lots')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.post(f'{url}finalize/', {'project': self.project.pk}).status_code, 409)
+
+        other = APIClient()
+        other.force_authenticate(create_user('other'))
+        self.assertEqual(other.head(url).status_code, 404)
+
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertFalse(Upload.objects.exists())
+
+    def test_finalize_validates_the_image(self):
+        self.photo = b'not an image'
+        url = self.create(title='-')['Location']
+        self.patch(url, 0, self.photo)
+        response = self.client.post(f'{url}finalize/', {'project': self.project.pk})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('image', response.data)
+        # Still there to finalize differently or delete
+        self.assertTrue(Upload.objects.exists())
+
+    def test_videos_are_finalized_into_the_video_field(self):
+        self.photo = b'\0\0\0\x18ftypmp42' + b'\0' * 2000
+        url = self.create(filename='walkthrough.mp4', title='Slab inspection')['Location']
+        self.patch(url, 0, self.photo)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f'{url}finalize/', {'project': self.project.pk})
+        self.assertEqual(response.status_code, 201, response.data)
+        video = ProjectImage.objects.get(pk=response.data['id'])
+        self.assertTrue(video.video.name.endswith('.mp4'))
+        self.assertFalse(video.image)
+        # No image jobs for a video
+        self.assertFalse(Job.objects.exists())
+
+        response = self.client.post('/api/images/', {'project': self.project.pk, 'title': 'Nothing'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_viewsets_must_name_the_upload_field(self):
+        with self.assertRaises(ImproperlyConfigured):
+            type('NoFieldViewSet', (TusUploadMixin, viewsets.GenericViewSet), {})
+
+    def test_expiry(self):
+        url = self.create()['Location']
+        upload = Upload.objects.get()
+        Upload.objects.update(expires_at=timezone.now() - datetime.timedelta(seconds=1))
+        self.assertEqual(self.client.head(url).status_code, 410)
+        out = StringIO()
+        call_command('expire_uploads', stdout=out)
+        self.assertIn('Removed 1', out.getvalue())
+        self.assertFalse(os.path.exists(partial_path(upload)))
+
+
+@override_settings(MEDIA_SERVE_MODE='django')
+class MediaServingTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.manager = create_user('manager')
+        self.outsider = create_user('outsider')
+        self.project = create_project(self.manager)
+        self.photo = jpeg_bytes((200, 10, 10)) + bytes(range(256)) * 4
+        self.image = ProjectImage(project=self.project, title='Slab', uploaded_by=self.manager)
+        self.image.image.save('slab.jpg', ContentFile(self.photo))
+        self.url = f'/media/{self.image.image.name}'
+        self.token = str(AccessToken.for_user(self.manager))
+
+    def get(self, url=None, user=None, method='get', **headers):
+        token = str(AccessToken.for_user(user)) if user else self.token
+        return getattr(self.client, method)(url or self.url, HTTP_AUTHORIZATION=f'JWT {token}', **headers)
+
+    def test_access(self):
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+        self.assertEqual(self.get(user=self.outsider).status_code, 404)
+        self.project.team_members.add(self.outsider)
+        self.assertEqual(self.get(user=self.outsider).status_code, 200)
+        # Query string tokens, for <img> and <video> tags
+        response = self.client.get(self.url, {'token': self.token})
+        self.assertEqual(b''.join(response.streaming_content), self.photo)
+
+        self.outsider.profile_image.save('me.jpg', ContentFile(jpeg_bytes((0, 0, 200))))
+        self.assertEqual(self.get(f'/media/{self.outsider.profile_image.name}').status_code, 200)
+        # Files no row points at, like partial uploads, are never served
+        blob_storage.save(f'{PARTIAL_DIR}/abc', ContentFile(b'partial'))
+        self.assertEqual(self.get(f'/media/{PARTIAL_DIR}/abc').status_code, 404)
+        self.assertEqual(self.get(user=create_user('admin', is_staff=True)).status_code, 200)
+
+    def test_caching(self):
+        response = self.get()
+        digest = hashlib.sha256(self.photo).hexdigest()
+        self.assertEqual(response['ETag'], f'"{digest}"')
+        self.assertEqual(response['Content-Length'], str(len(self.photo)))
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertIn('immutable', response['Cache-Control'])
+        response = self.get(HTTP_IF_NONE_MATCH=f'"{digest}"')
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], f'"{digest}"')
+        response = self.get(HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH='"other"').status_code, 200)
+
+    def test_ranges(self):
+        size = len(self.photo)
+        for header, start, end in [
+            ('bytes=0-99', 0, 99), ('bytes=100-', 100, size - 1),
+            ('bytes=-50', size - 50, size - 1), (f'bytes=10-{size * 2}', 10, size - 1),
+        ]:
+            response = self.get(HTTP_RANGE=header)
+            self.assertEqual(response.status_code, 206, header)
+            self.assertEqual(response['Content-Range'], f'bytes {start}-{end}/{size}')
+            self.assertEqual(response['Content-Length'], str(end - start + 1))
+            self.assertEqual(b''.join(response.streaming_content), self.photo[start:end + 1])
+
+        response = self.get(HTTP_RANGE=f'bytes={size}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{size}')
+        # Several ranges, or a stale If-Range, get the whole file
+        self.assertEqual(self.get(HTTP_RANGE='bytes=0-1,5-6').status_code, 200)
+        self.assertEqual(self.get(HTTP_RANGE='bytes=0-1', HTTP_IF_RANGE='"stale"').status_code, 200)
+        etag = self.get()['ETag']
+        self.assertEqual(self.get(HTTP_RANGE='bytes=0-1', HTTP_IF_RANGE=etag).status_code, 206)
+
+        response = self.get(method='head', HTTP_RANGE='bytes=0-9')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Length'], '10')
+
+    def test_file_range_reads_stop_at_the_end(self):
+        with tempfile.TemporaryFile() as file:
+            file.write(b'0123456789')
+            part = FileRange(file, 2, 5)
+            self.assertEqual(part.read(3), b'234')
+            self.assertEqual(part.read(), b'56')
+            self.assertEqual(part.read(), b'')
+
+    def test_handoff_to_the_web_server(self):
+        with override_settings(MEDIA_SERVE_MODE='x-accel-redirect', MEDIA_ACCEL_PREFIX='/protected/'):
+            response = self.get()
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected/{self.image.image.name}')
+        self.assertEqual(response.content, b'')
+        self.assertIn('ETag', response)
+        with override_settings(MEDIA_SERVE_MODE='x-sendfile'):
+            response = self.get()
+        self.assertEqual(response['X-Sendfile'], blob_storage.path(self.image.image.name))
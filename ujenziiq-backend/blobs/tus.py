@@ -0,0 +1,194 @@
+"""
+Resumable uploads for a viewset, following the tus 1.0 protocol
+(https://tus.io/protocols/resumable-upload) with the creation, expiration
+and termination extensions, so that tus clients work unchanged.
+
+``TusUploadMixin`` adds to the viewset's list URL:
+
+- ``POST uploads/`` with ``Upload-Length`` (and optionally
+  ``Upload-Metadata``, whose ``filename`` names the file) creates an
+  upload and returns its URL in ``Location``.
+- ``HEAD uploads/<id>/`` returns the ``Upload-Offset`` reached so far, to
+  resume from after a dropped connection.
+- ``PATCH uploads/<id>/`` with ``Content-Type:
+  application/offset+octet-stream`` and the current ``Upload-Offset``
+  appends the body.
+- ``DELETE uploads/<id>/`` abandons the upload.
+- ``POST uploads/<id>/finalize/``, once every byte has arrived, creates
+  an object through the viewset's serializer and ``perform_create``, as
+  a ``POST`` to the list would, with the file as the field named by the
+  viewset's ``upload_field`` (or by ``get_upload_field``, for viewsets
+  that keep different kinds of file in different fields). The request
+  body carries the other fields and takes precedence over
+  ``Upload-Metadata``.
+"""
+
+import base64
+import binascii
+import io
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils import timezone
+from django.utils.http import http_date
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from rest_framework.reverse import reverse
+
+from . import uploads
+from .models import Upload
+
+TUS_VERSION = '1.0.0'
+TUS_EXTENSIONS = 'creation,expiration,termination'
+UPLOAD_ID_PATTERN = r'[0-9a-f]{8}-?[0-9a-f]{4}-?[0-9a-f]{4}-?[0-9a-f]{4}-?[0-9a-f]{12}'
+
+
+def parse_metadata(value):
+    """``'filename d29ybGQ=,is_confidential'`` -> ``{'filename': 'world', 'is_confidential': ''}``"""
+    metadata = {}
+    for pair in filter(None, (pair.strip() for pair in value.split(','))):
+        key, _, encoded = pair.partition(' ')
+        metadata[key] = base64.b64decode(encoded, validate=True).decode() if encoded else ''
+    return metadata
+
+
+class TusUploadMixin:
+    tus_actions = ('create_upload', 'upload', 'finalize_upload')
+    # The serializer's file field that finished uploads go to; required
+    upload_field = None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if not cls.upload_field:
+            raise ImproperlyConfigured(f'{cls.__name__} must set upload_field to use TusUploadMixin')
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if self.action in self.tus_actions:
+            response['Tus-Resumable'] = TUS_VERSION
+            if request.method == 'POST' and self.action == 'create_upload':
+                response['Tus-Version'] = TUS_VERSION
+                response['Tus-Extension'] = TUS_EXTENSIONS
+                response['Tus-Max-Size'] = str(settings.RESUMABLE_UPLOAD_MAX_SIZE)
+        return response
+
+    def get_upload_field(self, upload):
+        return self.upload_field
+
+    def _error(self, message, status_code):
+        return Response({'error': message}, status=status_code)
+
+    def _offset_headers(self, upload):
+        return {
+            'Upload-Offset': str(upload.offset),
+            'Upload-Length': str(upload.length),
+            'Upload-Expires': http_date(upload.expires_at.timestamp()),
+            'Cache-Control': 'no-store',
+        }
+
+    def _get_upload(self, upload_id):
+        upload = Upload.objects.filter(pk=upload_id, user=self.request.user).first()
+        if upload is None:
+            return None, self._error('Upload not found', status.HTTP_404_NOT_FOUND)
+        if upload.expires_at < timezone.now():
+            return None, self._error('Upload has expired', status.HTTP_410_GONE)
+        return upload, None
+
+    def _version_error(self, request):
+        version = request.headers.get('Tus-Resumable')
+        if version is not None and version != TUS_VERSION:
+            return Response(
+                {'error': f'Unsupported Tus-Resumable version, use {TUS_VERSION}'},
+                status=status.HTTP_412_PRECONDITION_FAILED, headers={'Tus-Version': TUS_VERSION},
+            )
+        return None
+
+    @action(detail=False, methods=['post'], url_path='uploads')
+    def create_upload(self, request):
+        error = self._version_error(request)
+        if error:
+            return error
+        try:
+            length = int(request.headers['Upload-Length'])
+            if length < 0:
+                raise ValueError
+        except (KeyError, ValueError):
+            return self._error('Upload-Length must be the size of the file in bytes', status.HTTP_400_BAD_REQUEST)
+        if length > settings.RESUMABLE_UPLOAD_MAX_SIZE:
+            return self._error('File is too large', status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        try:
+            metadata = parse_metadata(request.headers.get('Upload-Metadata', ''))
+        except (binascii.Error, UnicodeDecodeError):
+            return self._error('Upload-Metadata values must be base64 encoded', status.HTTP_400_BAD_REQUEST)
+
+        upload = uploads.create_upload(request.user, length, metadata.pop('filename', ''), metadata)
+        location = reverse(f'{self.basename}-upload', kwargs={'upload_id': upload.pk.hex}, request=request)
+        headers = self._offset_headers(upload)
+        headers['Location'] = location
+        return Response({'id': upload.pk.hex, 'url': location}, status=status.HTTP_201_CREATED, headers=headers)
+
+    @action(detail=False, methods=['head', 'patch', 'delete'], url_path=rf'uploads/(?P<upload_id>{UPLOAD_ID_PATTERN})')
+    def upload(self, request, upload_id):
+        error = self._version_error(request)
+        if error:
+            return error
+        upload, error = self._get_upload(upload_id)
+        if error:
+            return error
+        if request.method == 'HEAD':
+            return Response(status=status.HTTP_200_OK, headers=self._offset_headers(upload))
+        if request.method == 'DELETE':
+            uploads.discard(upload)
+            return Response(status=status.HTTP_204_NO_CONTENT)
+
+        if request.content_type != 'application/offset+octet-stream':
+            return self._error('Content-Type must be application/offset+octet-stream',
+                               status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+        try:
+            offset = int(request.headers['Upload-Offset'])
+        except (KeyError, ValueError):
+            return self._error('Upload-Offset must be the current offset', status.HTTP_400_BAD_REQUEST)
+        try:
+            body_length = int(request.headers.get('Content-Length') or 0)
+            if body_length < 0:
+                raise ValueError
+        except ValueError:
+            return self._error('Content-Length must be the size of the body in bytes', status.HTTP_400_BAD_REQUEST)
+        if offset + body_length > upload.length:
+            return self._error('Chunk goes past Upload-Length', status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        try:
+            # The body is read from the request's stream, never parsed
+            uploads.append(upload, request.stream or io.BytesIO(), offset)
+        except uploads.OffsetConflict:
+            upload.refresh_from_db()
+            return Response({'error': 'Upload-Offset does not match the upload'},
+                            status=status.HTTP_409_CONFLICT, headers=self._offset_headers(upload))
+        except OSError:
+            # The connection dropped; what arrived is kept for the client to resume from
+            return Response({'error': 'The request body was cut short'},
+                            status=status.HTTP_400_BAD_REQUEST, headers=self._offset_headers(upload))
+        return Response(status=status.HTTP_204_NO_CONTENT, headers=self._offset_headers(upload))
+
+    @action(detail=False, methods=['post'], url_path=rf'uploads/(?P<upload_id>{UPLOAD_ID_PATTERN})/finalize')
+    def finalize_upload(self, request, upload_id):
+        upload, error = self._get_upload(upload_id)
+        if error:
+            return error
+        if not upload.is_complete:
+            return Response({'error': 'The upload is not complete'},
+                            status=status.HTTP_409_CONFLICT, headers=self._offset_headers(upload))
+        data = dict(upload.metadata)
+        data.update(request.data.items())
+        upload_field = self.get_upload_field(upload)
+        file = uploads.complete(upload)
+        try:
+            data[upload_field] = file
+            serializer = self.get_serializer(data=data)
+            serializer.is_valid(raise_exception=True)
+            self.perform_create(serializer)
+        finally:
+            file.close()
+        uploads.discard(upload)
+        return Response(serializer.data, status=status.HTTP_201_CREATED,
+                        headers=self.get_success_headers(serializer.data))
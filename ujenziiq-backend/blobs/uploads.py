@@ -0,0 +1,148 @@
+"""
+Storage for resumable uploads.
+
+Each upload's bytes go to a file of their own under ``partial-uploads/``
+in the media root, written at the offset the client says it has reached.
+The request body is copied in fixed-size chunks straight from the socket,
+so memory use does not grow with the file. Whatever arrived before a
+connection dropped is kept, and the client carries on from there.
+
+Appends to one upload are serialised with an exclusive ``flock`` on its
+file, taken before anything is written: a second request for the same
+upload meanwhile gets an offset conflict instead of overwriting or
+truncating the bytes the first one is writing.
+
+Once complete, the file is hashed and handed to the blob storage, which
+moves it into place. Uploads that see no progress for
+``RESUMABLE_UPLOAD_EXPIRY`` seconds are removed by expire_uploads.
+"""
+
+import datetime
+import fcntl
+import hashlib
+import os
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.utils import timezone
+
+from .models import Upload
+from .storage import blob_storage
+
+PARTIAL_DIR = 'partial-uploads'
+CHUNK_SIZE = 256 * 1024
+
+
+class OffsetConflict(Exception):
+    """The client's offset is not where the upload is."""
+
+
+def partial_path(upload):
+    return blob_storage.path(f'{PARTIAL_DIR}/{upload.pk.hex}')
+
+
+def _expires_at():
+    return timezone.now() + datetime.timedelta(seconds=settings.RESUMABLE_UPLOAD_EXPIRY)
+
+
+def create_upload(user, length, filename='', metadata=None):
+    upload = Upload.objects.create(
+        user=user, length=length, filename=filename, metadata=metadata or {}, expires_at=_expires_at(),
+    )
+    path = partial_path(upload)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, 'wb').close()
+    return upload
+
+
+def append(upload, stream, offset):
+    """
+    Write ``stream`` to the upload from ``offset``, up to its length, and
+    return the new offset. Raises ``OffsetConflict`` when ``offset`` is not
+    the upload's, including when another request is appending or moved it
+    meanwhile. If the stream breaks, the bytes read before it did are kept.
+    """
+    if offset != upload.offset:
+        raise OffsetConflict
+    remaining = upload.length - offset
+    written = 0
+    error = None
+    with open(partial_path(upload), 'r+b') as file:
+        try:
+            fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise OffsetConflict from None
+        # Checked again under the lock: a request that held it may have moved the offset
+        if Upload.objects.filter(pk=upload.pk).values_list('offset', flat=True).first() != offset:
+            raise OffsetConflict
+        file.seek(offset)
+        try:
+            while written < remaining:
+                chunk = stream.read(min(CHUNK_SIZE, remaining - written))
+                if not chunk:
+                    break
+                file.write(chunk)
+                written += len(chunk)
+        except OSError as exc:
+            error = exc
+        file.truncate()
+
+        # Before the file is closed, which releases the lock
+        expires_at = _expires_at()
+        if not Upload.objects.filter(pk=upload.pk, offset=offset).update(
+            offset=offset + written, expires_at=expires_at,
+        ):
+            raise OffsetConflict
+    upload.offset += written
+    upload.expires_at = expires_at
+    if error is not None:
+        raise error
+    return upload.offset
+
+
+class CompletedUpload(UploadedFile):
+    """A finished upload's file, which the blob storage moves instead of copying."""
+
+    def __init__(self, upload, sha256):
+        self.path = partial_path(upload)
+        super().__init__(open(self.path, 'rb'), name=upload.filename or upload.pk.hex, size=upload.length)
+        self.sha256 = sha256
+
+    def temporary_file_path(self):
+        return self.path
+
+
+def complete(upload):
+    hasher = hashlib.sha256()
+    with open(partial_path(upload), 'rb') as file:
+        while chunk := file.read(CHUNK_SIZE):
+            hasher.update(chunk)
+    return CompletedUpload(upload, hasher.hexdigest())
+
+
+def discard(upload):
+    try:
+        os.remove(partial_path(upload))
+    except FileNotFoundError:
+        pass
+    upload.delete()
+
+
+def expire_uploads():
+    """Remove expired uploads and partial files no upload owns; returns how many."""
+    expired = list(Upload.objects.filter(expires_at__lt=timezone.now()))
+    for upload in expired:
+        discard(upload)
+
+    directory = blob_storage.path(PARTIAL_DIR)
+    if not os.path.isdir(directory):
+        return len(expired)
+    cutoff = (timezone.now() - datetime.timedelta(seconds=settings.RESUMABLE_UPLOAD_EXPIRY)).timestamp()
+    known = {upload_id.hex for upload_id in Upload.objects.values_list('pk', flat=True)}
+    orphans = 0
+    for filename in os.listdir(directory):
+        path = os.path.join(directory, filename)
+        if filename not in known and os.stat(path).st_mtime < cutoff:
+            os.remove(path)
+            orphans += 1
+    return len(expired) + orphans
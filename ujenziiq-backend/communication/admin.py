@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Notification, Message, Comment, SMSLog
+from .models import Notification, Message, Conversation, Comment, SMSLog
 
 @admin.register(Notification)
 class NotificationAdmin(admin.ModelAdmin):
@@ -11,12 +11,19 @@ class NotificationAdmin(admin.ModelAdmin):
 
 @admin.register(Message)
 class MessageAdmin(admin.ModelAdmin):
-    list_display = ('sender', 'recipient', 'project', 'is_group_message', 'is_read', 'created_at')
-    list_filter = ('is_group_message', 'is_read', 'created_at')
+    list_display = ('sender', 'recipient', 'project', 'is_group_message', 'conversation', 'seq', 'created_at')
+    list_filter = ('is_group_message', 'created_at')
     search_fields = ('content', 'sender__username', 'recipient__username')
     date_hierarchy = 'created_at'
 
 
+@admin.register(Conversation)
+class ConversationAdmin(admin.ModelAdmin):
+    list_display = ('kind', 'project', 'user_low', 'user_high', 'message_count', 'last_message_at')
+    list_filter = ('kind',)
+    raw_id_fields = ('last_message',)
+
+
 @admin.register(Comment)
 class CommentAdmin(admin.ModelAdmin):
     list_display = ('author', 'comment_on', 'project', 'created_at')
@@ -27,7 +34,7 @@ class CommentAdmin(admin.ModelAdmin):
 
 @admin.register(SMSLog)
 class SMSLogAdmin(admin.ModelAdmin):
-    list_display = ('user', 'phone_number', 'sent_at', 'status')
+    list_display = ('user', 'phone_number', 'sent_at', 'status', 'attempts', 'next_attempt_at')
     list_filter = ('status', 'sent_at')
     search_fields = ('message', 'phone_number', 'user__username')
     date_hierarchy = 'sent_at'
@@ -0,0 +1,16 @@
+from django.conf import settings
+from django.core.checks import Warning, register
+
+
+@register()
+def check_push_broker(app_configs, **kwargs):
+    """Notifications fanned out by a run_jobs worker reach event streams only through a shared broker."""
+    if settings.JOBS_EAGER or settings.PUSH_BROKER != 'communication.push.LocalBroker':
+        return []
+    return [Warning(
+        'PUSH_BROKER is the in-process LocalBroker but JOBS_EAGER is off, so notifications '
+        'created by the run_jobs worker are never pushed to /api/events/ clients.',
+        hint='Set PUSH_BROKER=communication.push.PostgresBroker, or JOBS_EAGER=True '
+             'if no worker runs the jobs.',
+        id='communication.W001',
+    )]
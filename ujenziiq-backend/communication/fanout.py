@@ -0,0 +1,64 @@
+"""
+Notification fan-out for project events.
+
+``fan_out`` notifies everyone on a project (team members, project manager
+and client) at a fixed cost: one query resolves the recipients and the
+notifications and their unread counters are written in batches, so a
+large project costs a handful of INSERT/UPDATE statements per event
+instead of several queries per recipient. ``notify`` writes the same way
+for a given set of users, such as a task's new assignees. Once committed,
+the new notifications are pushed to their users' open event streams.
+
+The receivers in ``communication.signals`` queue it as the
+``notify_project`` job, so it runs on the job worker once the triggering
+save has committed. The push then happens in the worker process, which
+only reaches clients through a ``PUSH_BROKER`` shared between processes.
+"""
+
+from functools import partial
+
+from django.db import transaction
+
+from projects.models import Project
+from .models import Notification, NotificationCounter
+from .push import publish_notifications
+
+BATCH_SIZE = 1000
+
+
+def project_recipients(project_id, exclude=()):
+    """Ids of the project's team members, manager and client, in one query."""
+    project = Project.objects.filter(pk=project_id)
+    user_ids = Project.team_members.through.objects.filter(project_id=project_id).values_list('user_id', flat=True)
+    user_ids = user_ids.union(
+        project.values_list('project_manager_id', flat=True),
+        project.values_list('client_id', flat=True),
+    )
+    return set(user_ids) - set(exclude)
+
+
+def fan_out(project_id, notification_type, title, message, task_id=None, exclude=()):
+    """
+    Notify everyone on the project except ``exclude`` (usually whoever
+    caused the event). Returns the number of notifications created.
+    """
+    return notify(project_recipients(project_id, exclude), notification_type, title, message,
+                  project_id=project_id, task_id=task_id)
+
+
+def notify(user_ids, notification_type, title, message, project_id=None, task_id=None):
+    """Notify ``user_ids`` with the same batched writes. Returns the number of notifications created."""
+    recipients = sorted(set(user_ids))
+    if not recipients:
+        return 0
+    with transaction.atomic():
+        notifications = Notification.objects.bulk_create(
+            (Notification(user_id=user_id, title=title, message=message, notification_type=notification_type,
+                          project_id=project_id, task_id=task_id)
+             for user_id in recipients),
+            batch_size=BATCH_SIZE,
+        )
+        # bulk_create skips Notification.save(), which keeps the counters
+        NotificationCounter.objects.add({(user_id, notification_type): 1 for user_id in recipients})
+        transaction.on_commit(partial(publish_notifications, notifications))
+    return len(recipients)
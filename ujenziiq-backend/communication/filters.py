@@ -0,0 +1,15 @@
+from django_filters import rest_framework as django_filters
+
+from .models import Message
+
+
+class MessageFilter(django_filters.FilterSet):
+    """
+    ``is_read`` is per user: it relies on the ``annotated_is_read``
+    annotation added by MessageViewSet.get_queryset().
+    """
+    is_read = django_filters.BooleanFilter(field_name='annotated_is_read')
+
+    class Meta:
+        model = Message
+        fields = ['project', 'is_group_message']
@@ -0,0 +1,33 @@
+from jobs.registry import job
+from projects.models import ResourceAllocation
+from .fanout import fan_out, notify
+
+
+@job(priority=5)
+def notify_project(project_id, notification_type, title, message, task_id=None, exclude=()):
+    """Queued by the project event receivers in ``communication.signals``."""
+    return fan_out(project_id, notification_type, title, message, task_id=task_id, exclude=exclude)
+
+
+@job(priority=5)
+def notify_users(user_ids, notification_type, title, message, project_id=None, task_id=None):
+    """Queued for events that concern some users only, such as task assignments."""
+    return notify(user_ids, notification_type, title, message, project_id=project_id, task_id=task_id)
+
+
+@job(priority=5)
+def notify_material(allocation_id, delivered):
+    """
+    Queued when materials are allocated to a project or delivered; the
+    material's name is looked up here rather than in the saving request.
+    """
+    allocation = ResourceAllocation.objects.select_related('material').filter(pk=allocation_id).first()
+    if allocation is None:
+        return 0
+    material = allocation.material.name
+    if delivered:
+        return fan_out(allocation.project_id, 'material_delivered', f"Material delivered: {material}",
+                       f"{allocation.received_quantity or allocation.quantity} of {material} "
+                       f"received on {allocation.received_date}.")
+    return fan_out(allocation.project_id, 'other', f"Material allocated: {material}",
+                   f"{allocation.quantity} of {material} allocated on {allocation.allocated_date}.")
@@ -0,0 +1,51 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from communication.sms import SMSDispatcher, get_gateway
+
+
+class Command(BaseCommand):
+    help = 'Sends pending SMS messages from the SMSLog queue through the configured gateway'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help='Messages claimed at a time')
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Exit once no messages are due instead of waiting for more',
+        )
+        parser.add_argument('--idle-sleep', type=float, default=2.0, help='Seconds to wait when no messages are due')
+        parser.add_argument('--gateway', help='Dotted path of the gateway class (defaults to SMS_GATEWAY)')
+        parser.add_argument(
+            '--rate',
+            type=float,
+            help='Messages per second for this worker (defaults to SMS_RATE_LIMIT or the gateway limit)',
+        )
+        parser.add_argument('--max-attempts', type=int, help='Attempts before giving up (defaults to SMS_MAX_ATTEMPTS)')
+
+    def handle(self, *args, **options):
+        dispatcher = SMSDispatcher(
+            gateway=get_gateway(options['gateway']),
+            batch_size=options['batch_size'],
+            max_attempts=options['max_attempts'],
+            rate_limit=options['rate'],
+        )
+        totals = {'sent': 0, 'skipped': 0, 'retried': 0, 'failed': 0}
+        try:
+            while True:
+                counts = dispatcher.run_once()
+                for outcome, count in counts.items():
+                    totals[outcome] += count
+                if not any(counts.values()):
+                    if options['once']:
+                        break
+                    time.sleep(options['idle_sleep'])
+                elif options['verbosity'] > 1:
+                    self.stdout.write(', '.join(f'{count} {outcome}' for outcome, count in counts.items()))
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(
+            self.style.SUCCESS(', '.join(f'{count} {outcome}' for outcome, count in totals.items()))
+        )
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.4 on 2026-10-18 07:32
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def set_thread_roots(apps, schema_editor):
+    Comment = apps.get_model('communication', 'Comment')
+    parents = dict(Comment.objects.filter(parent_comment__isnull=False).values_list('pk', 'parent_comment_id'))
+    roots = {}
+    for pk in parents:
+        root = parents[pk]
+        while root in parents:
+            root = parents[root]
+        roots[pk] = root
+    replies = list(Comment.objects.filter(pk__in=list(roots)).only('pk'))
+    for reply in replies:
+        reply.root_id = roots[reply.pk]
+    Comment.objects.bulk_update(replies, ['root'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('communication', '0003_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='root',
+            field=models.ForeignKey(blank=True, db_index=False, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='thread_comments', to='communication.comment'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['root', 'created_at', 'id'], name='communicati_root_id_e58bc3_idx'),
+        ),
+        migrations.RunPython(set_thread_roots, migrations.RunPython.noop),
+    ]
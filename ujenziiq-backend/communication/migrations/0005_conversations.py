@@ -0,0 +1,135 @@
+# Generated by Django 4.2.4 on 2026-10-18 07:34
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_conversations(apps, schema_editor):
+    Conversation = apps.get_model('communication', 'Conversation')
+    ConversationMember = apps.get_model('communication', 'ConversationMember')
+    Message = apps.get_model('communication', 'Message')
+    Project = apps.get_model('projects', 'Project')
+
+    threads = {}
+    for message in Message.objects.order_by('created_at', 'pk').iterator():
+        if message.recipient_id and not message.is_group_message:
+            key = ('direct', *sorted((message.sender_id, message.recipient_id)))
+        else:
+            key = ('group', message.project_id)
+        thread = threads.setdefault(key, {'messages': [], 'members': set()})
+        thread['messages'].append(message)
+        thread['members'].add(message.sender_id)
+        if key[0] == 'direct':
+            thread['members'].update(key[1:])
+
+    team = Project.team_members.through.objects
+    for key, thread in threads.items():
+        messages = thread['messages']
+        last = messages[-1]
+        if key[0] == 'direct':
+            conversation = Conversation.objects.create(kind='direct', user_low_id=key[1], user_high_id=key[2])
+        else:
+            conversation = Conversation.objects.create(kind='group', project_id=key[1])
+            thread['members'].update(team.filter(project_id=key[1]).values_list('user_id', flat=True))
+        conversation.last_message_id = last.pk
+        conversation.last_message_at = last.created_at
+        conversation.message_count = len(messages)
+        conversation.save()
+
+        ConversationMember.objects.bulk_create([
+            ConversationMember(
+                conversation=conversation, user_id=user_id, last_message_at=last.created_at,
+                unread_count=sum(1 for message in messages if not message.is_read and message.sender_id != user_id),
+            )
+            for user_id in thread['members']
+        ])
+        ids = [message.pk for message in messages]
+        for start in range(0, len(ids), 500):
+            Message.objects.filter(pk__in=ids[start:start + 500]).update(conversation=conversation)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('projects', '0004_task_schedule'),
+        ('communication', '0004_comment_thread_root'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Conversation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('direct', 'Direct'), ('group', 'Project Group')], max_length=10)),
+                ('last_message_at', models.DateTimeField(blank=True, null=True)),
+                ('message_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ConversationMember',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('unread_count', models.PositiveIntegerField(default=0)),
+                ('last_message_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='conversationmember',
+            name='conversation',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='members', to='communication.conversation'),
+        ),
+        migrations.AddField(
+            model_name='conversationmember',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='conversation_memberships', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='last_message',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='communication.message'),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='project',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='conversations', to='projects.project'),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='user_high',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='user_low',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='conversation',
+            field=models.ForeignKey(blank=True, db_index=False, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='messages', to='communication.conversation'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['conversation', 'created_at', 'id'], name='communicati_convers_13b6c3_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='conversationmember',
+            index=models.Index(fields=['user', 'last_message_at', 'id'], name='communicati_user_id_cc7f36_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='conversationmember',
+            constraint=models.UniqueConstraint(fields=('conversation', 'user'), name='unique_conversation_member'),
+        ),
+        migrations.AddConstraint(
+            model_name='conversation',
+            constraint=models.UniqueConstraint(condition=models.Q(('kind', 'direct')), fields=('user_low', 'user_high'), name='unique_direct_conversation'),
+        ),
+        migrations.AddConstraint(
+            model_name='conversation',
+            constraint=models.UniqueConstraint(condition=models.Q(('kind', 'group')), fields=('project',), name='unique_group_conversation'),
+        ),
+        migrations.RunPython(build_conversations, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 4.2.4 on 2026-10-18 07:38
+
+from django.db import migrations, models
+
+
+def number_messages(apps, schema_editor):
+    Conversation = apps.get_model('communication', 'Conversation')
+    ConversationMember = apps.get_model('communication', 'ConversationMember')
+    Message = apps.get_model('communication', 'Message')
+
+    for conversation in Conversation.objects.iterator():
+        messages = list(Message.objects.filter(conversation=conversation).order_by('created_at', 'pk').only('pk'))
+        for seq, message in enumerate(messages, start=1):
+            message.seq = seq
+        Message.objects.bulk_update(messages, ['seq'], batch_size=500)
+        if len(messages) != conversation.message_count:
+            conversation.message_count = len(messages)
+            conversation.save(update_fields=['message_count'])
+        # Place each watermark so that the unread count is unchanged
+        members = list(ConversationMember.objects.filter(conversation=conversation))
+        for member in members:
+            member.last_read_seq = max(len(messages) - member.unread_count, 0)
+        ConversationMember.objects.bulk_update(members, ['last_read_seq'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('communication', '0005_conversations'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversationmember',
+            name='last_read_seq',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='seq',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(number_messages, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='conversationmember',
+            name='unread_count',
+        ),
+        migrations.RemoveField(
+            model_name='message',
+            name='is_read',
+        ),
+        migrations.AddConstraint(
+            model_name='message',
+            constraint=models.UniqueConstraint(fields=('conversation', 'seq'), name='unique_message_seq'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 4.2.4 on 2026-10-18 07:40
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def count_unread(apps, schema_editor):
+    Notification = apps.get_model('communication', 'Notification')
+    NotificationCounter = apps.get_model('communication', 'NotificationCounter')
+    unread = Notification.objects.filter(is_read=False).values('user_id', 'notification_type').annotate(
+        unread=models.Count('pk')
+    ).values_list('user_id', 'notification_type', 'unread')
+    NotificationCounter.objects.bulk_create(
+        (NotificationCounter(user_id=user_id, notification_type=notification_type, unread_count=count)
+         for user_id, notification_type, count in unread),
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('communication', '0006_read_watermarks'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('notification_type', models.CharField(choices=[('task_assigned', 'Task Assigned'), ('task_completed', 'Task Completed'), ('task_updated', 'Task Updated'), ('safety_incident', 'Safety Incident'), ('material_delivered', 'Material Delivered'), ('progress_report', 'Progress Report'), ('comment', 'New Comment'), ('deadline', 'Deadline Approaching'), ('milestone', 'Milestone Reached'), ('other', 'Other')], max_length=20)),
+                ('unread_count', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notification_counters', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='notificationcounter',
+            constraint=models.UniqueConstraint(fields=('user', 'notification_type'), name='unique_notification_counter'),
+        ),
+        migrations.RunPython(count_unread, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,87 @@
+# Generated by Django 4.2.4 on 2026-10-18 08:37
+
+from bisect import bisect_right
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def move_private_messages(apps, schema_editor):
+    """
+    0005 put messages with neither a recipient nor the group flag in the
+    project's group conversation, although only their sender could see
+    them. Move them to their sender's private conversation, and renumber
+    what is left of each group conversation.
+    """
+    Conversation = apps.get_model('communication', 'Conversation')
+    ConversationMember = apps.get_model('communication', 'ConversationMember')
+    Message = apps.get_model('communication', 'Message')
+    Project = apps.get_model('projects', 'Project')
+
+    private = list(Message.objects.filter(
+        recipient=None, is_group_message=False, conversation__kind='group',
+    ).order_by('created_at', 'pk'))
+    if not private:
+        return
+    groups = {message.conversation_id for message in private}
+
+    threads = {}
+    for message in private:
+        threads.setdefault((message.sender_id, message.project_id), []).append(message)
+    for (sender_id, project_id), messages in threads.items():
+        last = messages[-1]
+        conversation = Conversation.objects.create(
+            kind='private', user_low_id=sender_id, project_id=project_id,
+            last_message_id=last.pk, last_message_at=last.created_at, message_count=len(messages),
+        )
+        ConversationMember.objects.create(conversation=conversation, user_id=sender_id,
+                                          last_message_at=last.created_at, last_read_seq=len(messages))
+        for seq, message in enumerate(messages, start=1):
+            message.conversation = conversation
+            message.seq = seq
+        Message.objects.bulk_update(messages, ['conversation', 'seq'], batch_size=500)
+
+    team = Project.team_members.through.objects
+    for conversation in Conversation.objects.filter(pk__in=groups):
+        messages = list(Message.objects.filter(conversation=conversation).order_by('seq'))
+        old_seqs = [message.seq for message in messages]
+        # Out of the way first, so no row collides with another's seq
+        Message.objects.filter(conversation=conversation).update(seq=F('seq') + conversation.message_count)
+        for seq, message in enumerate(messages, start=1):
+            message.seq = seq
+        Message.objects.bulk_update(messages, ['seq'], batch_size=500)
+
+        last = messages[-1] if messages else None
+        conversation.message_count = len(messages)
+        conversation.last_message = last
+        conversation.last_message_at = last.created_at if last else None
+        conversation.save(update_fields=['message_count', 'last_message', 'last_message_at'])
+        # Keep only the team and the senders of what remains
+        keep = set(team.filter(project_id=conversation.project_id).values_list('user_id', flat=True))
+        keep.update(message.sender_id for message in messages)
+        ConversationMember.objects.filter(conversation=conversation).exclude(user_id__in=keep).delete()
+        members = list(ConversationMember.objects.filter(conversation=conversation))
+        for member in members:
+            member.last_read_seq = bisect_right(old_seqs, member.last_read_seq)
+            member.last_message_at = conversation.last_message_at
+        ConversationMember.objects.bulk_update(members, ['last_read_seq', 'last_message_at'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('communication', '0008_sms_dispatch'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='conversation',
+            name='kind',
+            field=models.CharField(choices=[('direct', 'Direct'), ('group', 'Project Group'), ('private', 'Private')], max_length=10),
+        ),
+        migrations.AddConstraint(
+            model_name='conversation',
+            constraint=models.UniqueConstraint(condition=models.Q(('kind', 'private')), fields=('user_low', 'project'), name='unique_private_conversation'),
+        ),
+        migrations.RunPython(move_private_messages, migrations.RunPython.noop),
+    ]
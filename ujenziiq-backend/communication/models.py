@@ -1,7 +1,40 @@
-from django.db import models
+from bisect import bisect_right
+from collections import defaultdict
+
+from django.db import models, transaction
+from django.db.models import Case, F, OuterRef, Q, Subquery, Value, When
 from django.conf import settings
+from django.utils import timezone
 from projects.models import Project, Task, Safety
 
+class NotificationQuerySet(models.QuerySet):
+    # Fields the unread counters are kept by
+    COUNTED_FIELDS = {'user', 'user_id', 'notification_type', 'is_read'}
+    
+    def update(self, **kwargs):
+        """
+        Bulk updates skip ``Notification.save``, so recount the unread
+        counters of every user they touch.
+        """
+        if not self.COUNTED_FIELDS & kwargs.keys():
+            return super().update(**kwargs)
+        with transaction.atomic():
+            user_ids = set(self.order_by().values_list('user_id', flat=True).distinct())
+            user = kwargs.get('user', kwargs.get('user_id'))
+            if user is not None:
+                user_ids.add(getattr(user, 'pk', user))
+            # Counters first: a notification created meanwhile waits on the
+            # counter lock, so it is either updated here or counted after
+            list(NotificationCounter.objects.select_for_update().filter(user_id__in=user_ids).values_list('pk'))
+            rows = super().update(**kwargs)
+            NotificationCounter.objects.rebuild(user_ids)
+        return rows
+    
+    def update_uncounted(self, **kwargs):
+        """A plain UPDATE, for callers that adjust the counters themselves."""
+        return super().update(**kwargs)
+
+
 class Notification(models.Model):
     """
     System notifications for users
@@ -29,11 +62,284 @@ class Notification(models.Model):
     is_sms_sent = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     
+    objects = NotificationQuerySet.as_manager()
+    
     def __str__(self):
         return f"{self.title} - {self.user.username}"
     
+    def save(self, *args, **kwargs):
+        if not self._state.adding or self.is_read:
+            return super().save(*args, **kwargs)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            NotificationCounter.objects.add({(self.user_id, self.notification_type): 1})
+    
+    def mark_read(self):
+        """Mark as read and update the counter once, however often it is called."""
+        with transaction.atomic():
+            if Notification.objects.filter(pk=self.pk, is_read=False).update_uncounted(is_read=True):
+                NotificationCounter.objects.add({(self.user_id, self.notification_type): -1})
+        self.is_read = True
+    
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'created_at', 'id']),
+        ]
+
+
+class NotificationCounterManager(models.Manager):
+    BATCH_SIZE = 500
+    
+    def add(self, deltas):
+        """
+        Apply ``{(user_id, notification_type): delta}`` to the unread
+        counters with F() updates. Users with the same delta for a type
+        share one UPDATE, so a fan-out to many users costs a few statements
+        rather than one per user; missing rows are created on the way.
+        """
+        groups = defaultdict(list)
+        for (user_id, notification_type), delta in deltas.items():
+            if delta:
+                groups[notification_type, delta].append(user_id)
+        for (notification_type, delta), user_ids in groups.items():
+            for start in range(0, len(user_ids), self.BATCH_SIZE):
+                batch = user_ids[start:start + self.BATCH_SIZE]
+                counters = self.filter(notification_type=notification_type, user_id__in=batch)
+                if counters.update(unread_count=F('unread_count') + delta) == len(batch):
+                    continue
+                missing = set(batch) - set(counters.values_list('user_id', flat=True))
+                self.bulk_create(
+                    [NotificationCounter(user_id=user_id, notification_type=notification_type) for user_id in missing],
+                    ignore_conflicts=True,
+                )
+                self.filter(notification_type=notification_type, user_id__in=missing).update(
+                    unread_count=F('unread_count') + delta
+                )
+    
+    def rebuild(self, user_ids):
+        """Recount the counters of ``user_ids`` from their notifications."""
+        user_ids = list(user_ids)
+        with transaction.atomic():
+            self.filter(user_id__in=user_ids).update(unread_count=0)
+            unread = Notification.objects.filter(user_id__in=user_ids, is_read=False).values(
+                'user_id', 'notification_type'
+            ).annotate(unread=models.Count('pk')).values_list('user_id', 'notification_type', 'unread')
+            self.add({(user_id, notification_type): count for user_id, notification_type, count in unread})
+    
+    def for_user(self, user):
+        """``(total, {notification_type: count})`` of the user's unread notifications."""
+        by_type = {notification_type: 0 for notification_type, _ in Notification.NOTIFICATION_TYPE_CHOICES}
+        by_type.update(self.filter(user=user).values_list('notification_type', 'unread_count'))
+        return sum(by_type.values()), by_type
+
+
+class NotificationCounter(models.Model):
+    """
+    A user's number of unread notifications of one type, kept in step with
+    the notifications so the count never scans them
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='notification_counters')
+    notification_type = models.CharField(max_length=20, choices=Notification.NOTIFICATION_TYPE_CHOICES)
+    unread_count = models.IntegerField(default=0)
+    
+    objects = NotificationCounterManager()
+    
+    def __str__(self):
+        return f"{self.user.username}: {self.unread_count} unread {self.notification_type}"
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'notification_type'], name='unique_notification_counter'),
+        ]
+
+
+class ConversationManager(models.Manager):
+    def for_message(self, message):
+        """
+        The conversation ``message`` belongs to: the direct conversation of
+        the sender and recipient, the project's group conversation for group
+        messages, or else the sender's private conversation in the project,
+        as such messages are for the sender alone. Creates it, and the
+        sender's membership, if needed.
+        """
+        if message.recipient_id and not message.is_group_message:
+            low, high = sorted((message.sender_id, message.recipient_id))
+            conversation, created = self.get_or_create(kind='direct', user_low_id=low, user_high_id=high)
+            member_ids = {low, high} if created else set()
+        elif not message.is_group_message:
+            conversation, created = self.get_or_create(kind='private', user_low_id=message.sender_id,
+                                                       project_id=message.project_id)
+            member_ids = {message.sender_id} if created else set()
+        else:
+            conversation, created = self.get_or_create(kind='group', project_id=message.project_id)
+            member_ids = {message.sender_id}
+            if created:
+                member_ids.update(Project.team_members.through.objects.filter(
+                    project_id=message.project_id
+                ).values_list('user_id', flat=True))
+        if member_ids:
+            conversation.add_members(member_ids)
+        return conversation
+
+
+class Conversation(models.Model):
+    """
+    A direct conversation between two users, a project's group chat or a
+    user's private messages in a project, with a summary of its latest
+    message for the inbox
+    """
+    KIND_CHOICES = (
+        ('direct', 'Direct'),
+        ('group', 'Project Group'),
+        ('private', 'Private'),
+    )
+    
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, null=True, blank=True, related_name='conversations')
+    user_low = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    user_high = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    last_message = models.ForeignKey('Message', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    last_message_at = models.DateTimeField(null=True, blank=True)
+    message_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    objects = ConversationManager()
+    
+    def __str__(self):
+        if self.kind == 'group':
+            return f"Group conversation in {self.project.name}"
+        if self.kind == 'private':
+            return f"Private conversation of {self.user_low.username} in {self.project.name}"
+        return f"Conversation between {self.user_low.username} and {self.user_high.username}"
+    
+    def add_members(self, user_ids):
+        # New members start with the history already read
+        ConversationMember.objects.bulk_create(
+            [ConversationMember(conversation=self, user_id=user_id, last_message_at=self.last_message_at,
+                                last_read_seq=self.message_count)
+             for user_id in user_ids],
+            ignore_conflicts=True,
+        )
+    
+    def next_seq(self):
+        """
+        Allocate the sequence number of a new message. The UPDATE locks the
+        conversation until the surrounding transaction commits, so
+        concurrent senders get consecutive numbers.
+        """
+        Conversation.objects.filter(pk=self.pk).update(message_count=F('message_count') + 1)
+        self.message_count = Conversation.objects.values_list('message_count', flat=True).get(pk=self.pk)
+        return self.message_count
+    
+    def record(self, message):
+        """Update the summary and every member's inbox entry for a new message."""
+        Conversation.objects.filter(pk=self.pk).update(last_message=message, last_message_at=message.created_at)
+        # Senders have read everything up to their own message
+        self.members.update(
+            last_message_at=message.created_at,
+            last_read_seq=Case(When(user_id=message.sender_id, then=Value(message.seq)),
+                               default=F('last_read_seq'), output_field=models.PositiveIntegerField()),
+        )
+    
+    def compact(self, from_seq):
+        """
+        Close the gaps left by messages removed from ``from_seq`` on: later
+        messages and members' read watermarks move down so that seqs stay
+        consecutive, ``message_count`` and unread counts only count messages
+        that still exist, and the summary points at the latest of them.
+        """
+        with transaction.atomic():
+            # Lock the conversation so no seq is allocated meanwhile
+            message_count = Conversation.objects.select_for_update().filter(pk=self.pk).values_list(
+                'message_count', flat=True).first()
+            if message_count is None:
+                return
+            messages = Message.objects.filter(conversation_id=self.pk)
+            base = messages.filter(seq__lt=from_seq).count()
+            if base != from_seq - 1:
+                # Several messages went at once and the gaps start earlier
+                from_seq, base = 1, 0
+            remaining = list(messages.filter(seq__gte=from_seq).order_by('seq').values_list('pk', 'seq'))
+            moved = [Message(pk=pk, seq=base + position)
+                     for position, (pk, seq) in enumerate(remaining, 1) if seq != base + position]
+            if moved:
+                # Out of the way first, so no row ever collides with another's seq
+                Message.objects.filter(pk__in=[message.pk for message in moved]).update(
+                    seq=F('seq') + message_count)
+                Message.objects.bulk_update(moved, ['seq'], batch_size=500)
+            old_seqs = [seq for _, seq in remaining]
+            members = list(self.members.filter(last_read_seq__gte=from_seq).only('pk', 'last_read_seq'))
+            for member in members:
+                member.last_read_seq = base + bisect_right(old_seqs, member.last_read_seq)
+            ConversationMember.objects.bulk_update(members, ['last_read_seq'])
+            
+            last = messages.order_by('-seq').values('pk', 'created_at').first() or {'pk': None, 'created_at': None}
+            self.message_count = base + len(remaining)
+            Conversation.objects.filter(pk=self.pk).update(
+                message_count=self.message_count, last_message_id=last['pk'], last_message_at=last['created_at'],
+            )
+            self.members.update(last_message_at=last['created_at'])
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user_low', 'user_high'], condition=Q(kind='direct'),
+                                    name='unique_direct_conversation'),
+            models.UniqueConstraint(fields=['project'], condition=Q(kind='group'),
+                                    name='unique_group_conversation'),
+            models.UniqueConstraint(fields=['user_low', 'project'], condition=Q(kind='private'),
+                                    name='unique_private_conversation'),
+        ]
+
+
+class ConversationMemberQuerySet(models.QuerySet):
+    def with_unread_count(self):
+        return self.annotate(annotated_unread_count=F('conversation__message_count') - F('last_read_seq'))
+    
+    def mark_read(self, message_id=None):
+        """
+        Move the read watermark of these memberships up to ``message_id``, or
+        to the latest message, in one UPDATE. Watermarks never move back and
+        a message from another conversation matches nothing. Returns the
+        number of memberships moved.
+        """
+        if message_id is None:
+            seq = Conversation.objects.filter(pk=OuterRef('conversation_id')).values('message_count')
+        else:
+            seq = Message.objects.filter(pk=message_id, conversation_id=OuterRef('conversation_id')).values('seq')
+        return self.filter(last_read_seq__lt=Subquery(seq)).update(last_read_seq=Subquery(seq))
+
+
+class ConversationMember(models.Model):
+    """
+    A user's entry for a conversation in their inbox, with their read
+    watermark: every message up to ``last_read_seq`` has been read
+    """
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name='members')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='conversation_memberships')
+    last_read_seq = models.PositiveIntegerField(default=0)
+    # Copied from the conversation so the inbox is a single index range
+    last_message_at = models.DateTimeField(null=True, blank=True)
+    
+    objects = ConversationMemberQuerySet.as_manager()
+    
+    def __str__(self):
+        return f"{self.user.username} in conversation {self.conversation_id}"
+    
+    @property
+    def unread_count(self):
+        # Use the value from ConversationMemberQuerySet.with_unread_count() when present
+        if hasattr(self, 'annotated_unread_count'):
+            return self.annotated_unread_count
+        return self.conversation.message_count - self.last_read_seq
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['conversation', 'user'], name='unique_conversation_member'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'last_message_at', 'id']),
+        ]
 
 
 class Message(models.Model):
@@ -45,11 +351,17 @@ class Message(models.Model):
     project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='messages')
     content = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
-    is_read = models.BooleanField(default=False)
     parent_message = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='replies')
     
     # For group messaging
     is_group_message = models.BooleanField(default=False)
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, null=True, blank=True, editable=False,
+                                     db_index=False, related_name='messages')
+    # Position in the conversation, compared against members' read watermarks
+    seq = models.PositiveIntegerField(default=0, editable=False)
+    
+    # The fields Conversation.objects.for_message() decides by
+    CONVERSATION_FIELDS = ('sender', 'recipient', 'project', 'is_group_message')
     
     def __str__(self):
         if self.is_group_message:
@@ -59,8 +371,48 @@ class Message(models.Model):
         else:
             return f"Project message in {self.project.name} by {self.sender.username}"
     
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            return self._save_changes(*args, **kwargs)
+        with transaction.atomic():
+            if self.conversation_id is None:
+                self.conversation = Conversation.objects.for_message(self)
+            self.seq = self.conversation.next_seq()
+            super().save(*args, **kwargs)
+            self.conversation.record(self)
+    
+    def _save_changes(self, *args, update_fields=None, **kwargs):
+        """Save an edit, moving the message if it now belongs to another conversation."""
+        if update_fields is not None and not set(update_fields) & set(self.CONVERSATION_FIELDS):
+            return super().save(*args, update_fields=update_fields, **kwargs)
+        with transaction.atomic():
+            previous = Message.objects.filter(pk=self.pk).values_list(*self.CONVERSATION_FIELDS).first()
+            current = tuple(getattr(self, self._meta.get_field(field).attname) for field in self.CONVERSATION_FIELDS)
+            conversation = self.conversation
+            if previous != current:
+                conversation = Conversation.objects.for_message(self)
+            if conversation is None or conversation.pk == self.conversation_id:
+                return super().save(*args, update_fields=update_fields, **kwargs)
+            
+            old_conversation_id, old_seq = self.conversation_id, self.seq
+            self.conversation = conversation
+            self.seq = conversation.next_seq()
+            if update_fields is not None:
+                update_fields = {*update_fields, 'conversation', 'seq'}
+            super().save(*args, update_fields=update_fields, **kwargs)
+            if old_conversation_id is not None:
+                Conversation(pk=old_conversation_id).compact(old_seq)
+            conversation.record(self)
+    
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['created_at', 'id']),
+            models.Index(fields=['conversation', 'created_at', 'id']),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['conversation', 'seq'], name='unique_message_seq'),
+        ]
 
 
 class Comment(models.Model):
@@ -81,26 +433,67 @@ class Comment(models.Model):
     task = models.ForeignKey(Task, on_delete=models.CASCADE, null=True, blank=True, related_name='comments')
     safety_incident = models.ForeignKey(Safety, on_delete=models.CASCADE, null=True, blank=True, related_name='comments')
     parent_comment = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='replies')
+    # Top-level comment of the thread (None for top-level comments), so a
+    # whole thread can be loaded with one query
+    root = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, editable=False,
+                             db_index=False, related_name='thread_comments')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     def __str__(self):
         return f"Comment by {self.author.username} on {self.comment_on}"
     
+    def save(self, *args, **kwargs):
+        if self.parent_comment_id is None:
+            self.root = None
+        else:
+            # A reply belongs to the same thread and element as its parent
+            parent = self.parent_comment
+            self.root_id = parent.root_id or parent.pk
+            self.comment_on = parent.comment_on
+            self.project_id = parent.project_id
+            self.task_id = parent.task_id
+            self.safety_incident_id = parent.safety_incident_id
+        super().save(*args, **kwargs)
+    
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['created_at', 'id']),
+            models.Index(fields=['root', 'created_at', 'id']),
+        ]
 
 
 class SMSLog(models.Model):
     """
-    Log of SMS messages sent to users without smartphones
+    Log of SMS messages sent to users without smartphones, and the queue
+    the dispatch_sms worker sends them from (see communication/sms.py)
     """
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+        ('skipped', 'Skipped'),
+    )
+    
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='sms_logs')
     phone_number = models.CharField(max_length=15)
     message = models.TextField()
     notification = models.ForeignKey(Notification, on_delete=models.CASCADE, null=True, blank=True, related_name='sms_logs')
     sent_at = models.DateTimeField(auto_now_add=True)
-    status = models.CharField(max_length=50, default='pending')
+    status = models.CharField(max_length=50, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # When a pending message is due, or when a worker's claim on it expires
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    claim_token = models.CharField(max_length=32, blank=True, default='', editable=False)
+    last_error = models.TextField(blank=True, default='')
     
     def __str__(self):
         return f"SMS to {self.phone_number} at {self.sent_at}"
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['sent_at', 'id']),
+            models.Index(fields=['status', 'next_attempt_at', 'id']),
+        ]
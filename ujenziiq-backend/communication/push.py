@@ -0,0 +1,347 @@
+"""
+Real-time push of notifications and messages as Server-Sent Events.
+
+``EventStreamApp`` is a plain ASGI app that ``ujenziiq/asgi.py`` mounts at
+``EVENTS_PATH``: a client opens one long-lived ``GET`` (``EventSource``),
+authenticated with a SimpleJWT access token in the ``Authorization``
+header or, since ``EventSource`` cannot set headers, a ``token`` query
+parameter. It then receives an ``event: notification`` for each of its
+new notifications and an ``event: message`` for each new message in its
+conversations, and a comment line every ``PUSH_HEARTBEAT`` seconds so that
+proxies keep idle connections open. It is kept out of Django's request
+handling so an idle connection costs a parked coroutine and a small queue;
+as the middleware does not run, it adds the CORS headers of
+django-cors-headers (``CORS_ALLOWED_ORIGINS``, ``CORS_ALLOW_ALL_ORIGINS``
+and the rest) itself, and answers preflight requests.
+
+Events go through a broker (``settings.PUSH_BROKER``). ``LocalBroker``
+delivers to the connections of the current process only, which is enough
+when every notification is created in the web process (``JOBS_EAGER``).
+``PostgresBroker`` sends events through the database with ``NOTIFY`` and
+has each process that holds connections ``LISTEN``, so the notifications
+that a run_jobs worker fans out reach them too (check
+``communication.W001``). The push only works under an ASGI server, e.g.
+``gunicorn -k uvicorn.workers.UvicornWorker ujenziiq.asgi:application``.
+"""
+
+import asyncio
+import io
+import json
+import logging
+import select
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from corsheaders.middleware import CorsMiddleware
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.exceptions import ImproperlyConfigured
+from django.db import close_old_connections, connection, connections
+from django.http import HttpResponse
+from django.utils.module_loading import import_string
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+
+from .models import ConversationMember
+
+EVENTS_PATH = '/api/events/'
+
+logger = logging.getLogger(__name__)
+
+
+def encode_event(event_type, data):
+    payload = json.dumps(data, cls=DjangoJSONEncoder, separators=(',', ':'))
+    return f'event: {event_type}\ndata: {payload}\n\n'.encode()
+
+
+class Subscription:
+    def __init__(self, user_id, loop, maxsize):
+        self.user_id = user_id
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize)
+        # Set when events had to be dropped; the client should reload
+        self.overflowed = False
+
+    def put(self, data):
+        try:
+            self.queue.put_nowait(data)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+
+def _deliver(batch):
+    for subscription, data in batch:
+        subscription.put(data)
+
+
+class LocalBroker:
+    """
+    In-process broker. ``publish`` may be called from any thread; each
+    event is encoded once and handed to the event loops of the receiving
+    connections.
+    """
+
+    def __init__(self):
+        self._subscriptions = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id):
+        subscription = Subscription(user_id, asyncio.get_running_loop(), settings.PUSH_QUEUE_SIZE)
+        with self._lock:
+            self._subscriptions[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.user_id]
+
+    def has_subscribers(self):
+        return bool(self._subscriptions)
+
+    def connection_count(self):
+        with self._lock:
+            return sum(len(subscriptions) for subscriptions in self._subscriptions.values())
+
+    def publish(self, events):
+        """Deliver ``[(user_id, event_type, data)]`` to the users' open connections."""
+        batches = defaultdict(list)
+        with self._lock:
+            for user_id, event_type, data in events:
+                subscriptions = self._subscriptions.get(user_id)
+                if not subscriptions:
+                    continue
+                encoded = encode_event(event_type, data)
+                for subscription in subscriptions:
+                    batches[subscription.loop].append((subscription, encoded))
+        for loop, batch in batches.items():
+            try:
+                loop.call_soon_threadsafe(_deliver, batch)
+            except RuntimeError:
+                # The loop has been closed; its connections are gone
+                pass
+
+
+class PostgresBroker(LocalBroker):
+    """
+    Broker shared by every process using the same PostgreSQL database.
+    ``publish`` sends the events with ``pg_notify``, from inside the
+    caller's transaction if there is one, so they go out when it commits.
+    The first ``subscribe`` in a process starts a thread that ``LISTEN``\s
+    on its own connection and delivers what arrives to the process's
+    connections as ``LocalBroker`` would.
+    """
+
+    CHANNEL = 'ujenziiq_push'
+    # NOTIFY payloads must be shorter than 8000 bytes
+    MAX_PAYLOAD = 7900
+
+    def __init__(self):
+        super().__init__()
+        if connection.vendor != 'postgresql':
+            raise ImproperlyConfigured('PostgresBroker needs a PostgreSQL database')
+        self._listener = None
+
+    def subscribe(self, user_id):
+        with self._lock:
+            if self._listener is None:
+                self._listener = threading.Thread(target=self._listen, name='push-listener', daemon=True)
+                self._listener.start()
+        return super().subscribe(user_id)
+
+    def has_subscribers(self):
+        # Other processes' connections are not known here
+        return True
+
+    def publish(self, events):
+        payloads = list(self.payloads(events))
+        if payloads:
+            with connection.cursor() as cursor:
+                for payload in payloads:
+                    cursor.execute('SELECT pg_notify(%s, %s)', [self.CHANNEL, payload])
+
+    @classmethod
+    def payloads(cls, events):
+        """The events as JSON arrays, each short enough for one NOTIFY."""
+        batch, size = [], 2
+        for user_id, event_type, data in events:
+            event = json.dumps([user_id, event_type, data], cls=DjangoJSONEncoder, separators=(',', ':'))
+            if len(event.encode()) + 2 > cls.MAX_PAYLOAD:
+                # Too long to send (a long message): the client is told
+                # which object it was and loads it itself
+                partial = {key: data[key] for key in ('id', 'conversation') if key in data}
+                event = json.dumps([user_id, event_type, {**partial, 'partial': True}])
+            if batch and size + len(event.encode()) + 1 > cls.MAX_PAYLOAD:
+                yield '[' + ','.join(batch) + ']'
+                batch, size = [], 2
+            batch.append(event)
+            size += len(event.encode()) + 1
+        if batch:
+            yield '[' + ','.join(batch) + ']'
+
+    def deliver(self, payload):
+        super().publish(json.loads(payload))
+
+    def _listen(self):
+        database = connections['default']
+        while True:
+            try:
+                listener = database.get_new_connection(database.get_connection_params())
+                try:
+                    listener.autocommit = True
+                    with listener.cursor() as cursor:
+                        cursor.execute(f'LISTEN {self.CHANNEL}')
+                    while True:
+                        select.select([listener], [], [], settings.PUSH_HEARTBEAT)
+                        listener.poll()
+                        while listener.notifies:
+                            self.deliver(listener.notifies.pop(0).payload)
+                finally:
+                    listener.close()
+            except Exception:
+                logger.exception('Push listener lost its database connection; reconnecting')
+                time.sleep(1)
+
+
+_broker = None
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        _broker = import_string(settings.PUSH_BROKER)()
+    return _broker
+
+
+def notification_event(notification):
+    return (notification.user_id, 'notification', {
+        'id': notification.pk,
+        'notification_type': notification.notification_type,
+        'title': notification.title,
+        'message': notification.message,
+        'project': notification.project_id,
+        'task': notification.task_id,
+        'created_at': notification.created_at,
+    })
+
+
+def publish_notifications(notifications):
+    broker = get_broker()
+    if broker.has_subscribers():
+        broker.publish(notification_event(notification) for notification in notifications)
+
+
+def publish_message(message):
+    broker = get_broker()
+    if not broker.has_subscribers():
+        return
+    data = {
+        'id': message.pk,
+        'conversation': message.conversation_id,
+        'seq': message.seq,
+        'project': message.project_id,
+        'sender': message.sender_id,
+        'content': message.content,
+        'created_at': message.created_at,
+    }
+    members = ConversationMember.objects.filter(conversation_id=message.conversation_id).values_list('user_id', flat=True)
+    broker.publish((user_id, 'message', data) for user_id in members)
+
+
+def _authenticate(raw_token):
+    """The active user the access token belongs to, or None."""
+    authentication = JWTAuthentication()
+    try:
+        return authentication.get_user(authentication.get_validated_token(raw_token))
+    except (InvalidToken, AuthenticationFailed):
+        return None
+    finally:
+        close_old_connections()
+
+
+def _raw_token(scope):
+    for name, value in scope['headers']:
+        if name == b'authorization':
+            return JWTAuthentication().get_raw_token(value)
+    tokens = parse_qs(scope.get('query_string', b'').decode()).get('token')
+    return tokens[0].encode() if tokens else None
+
+
+def _cors_headers(scope):
+    """The CORS headers django-cors-headers would add to the response to this request."""
+    request = ASGIRequest(scope, io.BytesIO())
+    response = HttpResponse()
+    CorsMiddleware(lambda request: response).add_response_headers(request, response)
+    return [
+        (name.lower().encode('latin-1'), value.encode('latin-1'))
+        for name, value in response.items()
+        if name.lower().startswith('access-control-') or name.lower() == 'vary'
+    ]
+
+
+class EventStreamApp:
+    async def __call__(self, scope, receive, send):
+        cors_headers = _cors_headers(scope)
+        if scope['method'] == 'OPTIONS':
+            # Preflight, e.g. for an EventSource polyfill sending Authorization
+            await send({'type': 'http.response.start', 'status': 200,
+                        'headers': [(b'content-length', b'0'), *cors_headers]})
+            await send({'type': 'http.response.body', 'body': b''})
+            return
+        raw_token = _raw_token(scope)
+        user = await sync_to_async(_authenticate)(raw_token) if raw_token else None
+        if user is None:
+            await self._reject(send, cors_headers)
+            return
+
+        broker = get_broker()
+        subscription = broker.subscribe(user.pk)
+        stream = asyncio.ensure_future(self._stream(send, subscription, cors_headers))
+        disconnect = asyncio.ensure_future(self._wait_for_disconnect(receive))
+        try:
+            await asyncio.wait({stream, disconnect}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            stream.cancel()
+            disconnect.cancel()
+            broker.unsubscribe(subscription)
+
+    async def _reject(self, send, cors_headers):
+        body = json.dumps({'detail': 'Authentication credentials were not provided or are invalid.'}).encode()
+        header_type = settings.SIMPLE_JWT['AUTH_HEADER_TYPES'][0]
+        await send({'type': 'http.response.start', 'status': 401, 'headers': [
+            (b'content-type', b'application/json'),
+            (b'www-authenticate', f'{header_type} realm="api"'.encode()),
+            *cors_headers,
+        ]})
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def _wait_for_disconnect(self, receive):
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+    async def _stream(self, send, subscription, cors_headers):
+        await send({'type': 'http.response.start', 'status': 200, 'headers': [
+            (b'content-type', b'text/event-stream'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no'),
+            *cors_headers,
+        ]})
+        await send({'type': 'http.response.body', 'body': b'retry: 5000\n\n', 'more_body': True})
+        while True:
+            try:
+                data = await asyncio.wait_for(subscription.queue.get(), settings.PUSH_HEARTBEAT)
+            except asyncio.TimeoutError:
+                data = b': ping\n\n'
+            await send({'type': 'http.response.body', 'body': data, 'more_body': True})
+            if subscription.overflowed and subscription.queue.empty():
+                # Too slow to keep up: end the stream so that the client
+                # reconnects and reloads instead of missing events silently
+                await send({'type': 'http.response.body', 'body': b'event: overflow\ndata: {}\n\n'})
+                return
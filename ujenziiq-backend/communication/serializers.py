@@ -1,26 +1,48 @@
 from rest_framework import serializers
+from ujenziiq.serializers import DynamicFieldsModelSerializer
 from django.contrib.auth import get_user_model
-from .models import Notification, Message, Comment, SMSLog
+from .models import Notification, Message, Conversation, ConversationMember, Comment, SMSLog
+from .threads import attach_replies
 from projects.serializers import UserMiniSerializer
 
 User = get_user_model()
 
-class NotificationSerializer(serializers.ModelSerializer):
+class NotificationSerializer(DynamicFieldsModelSerializer):
     user = UserMiniSerializer(read_only=True)
     
     class Meta:
         model = Notification
         fields = '__all__'
 
-class MessageSerializer(serializers.ModelSerializer):
+class MessageSerializer(DynamicFieldsModelSerializer):
     sender = UserMiniSerializer(read_only=True)
     recipient = UserMiniSerializer(read_only=True)
+    # Whether the requesting user has read it, when the view annotates that
+    is_read = serializers.SerializerMethodField()
     
     class Meta:
         model = Message
         fields = '__all__'
+    
+    def get_is_read(self, obj):
+        return getattr(obj, 'annotated_is_read', None)
+
+class ConversationSerializer(DynamicFieldsModelSerializer):
+    last_message = MessageSerializer(read_only=True)
+    
+    class Meta:
+        model = Conversation
+        fields = ('id', 'kind', 'project', 'user_low', 'user_high', 'last_message', 'last_message_at', 'message_count')
+
+class InboxSerializer(DynamicFieldsModelSerializer):
+    conversation = ConversationSerializer(read_only=True)
+    unread_count = serializers.IntegerField(read_only=True)
+    
+    class Meta:
+        model = ConversationMember
+        fields = ('conversation', 'last_read_seq', 'unread_count', 'last_message_at')
 
-class CommentSerializer(serializers.ModelSerializer):
+class CommentSerializer(DynamicFieldsModelSerializer):
     author = UserMiniSerializer(read_only=True)
     replies = serializers.SerializerMethodField()
     
@@ -29,11 +51,11 @@ class CommentSerializer(serializers.ModelSerializer):
         fields = '__all__'
     
     def get_replies(self, obj):
-        if obj.replies.exists():
-            return CommentSerializer(obj.replies.all(), many=True).data
-        return []
+        if not hasattr(obj, 'thread_replies'):
+            attach_replies([obj])
+        return CommentSerializer(obj.thread_replies, many=True, context=self.context).data
 
-class SMSLogSerializer(serializers.ModelSerializer):
+class SMSLogSerializer(DynamicFieldsModelSerializer):
     user = UserMiniSerializer(read_only=True)
     
     class Meta:
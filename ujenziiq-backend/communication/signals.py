@@ -0,0 +1,143 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from projects.models import Project, ProgressReport, ResourceAllocation, Safety, Task
+from jobs.queue import enqueue
+from .jobs import notify_material, notify_project, notify_users
+from .models import Comment, Conversation, ConversationMember, Message, Notification, NotificationCounter
+from .push import publish_message, publish_notifications
+
+
+@receiver(m2m_changed, sender=Project.team_members.through)
+def sync_group_conversation_members(sender, instance, action, reverse, pk_set, **kwargs):
+    """Keep project group conversations in step with the project's team."""
+    if action not in ('post_add', 'post_remove') or not pk_set:
+        return
+    if reverse:
+        # user.assigned_projects.add(...): pk_set holds project ids
+        pairs = [(project_id, instance.pk) for project_id in pk_set]
+    else:
+        pairs = [(instance.pk, user_id) for user_id in pk_set]
+
+    conversations = {
+        conversation.project_id: conversation
+        for conversation in Conversation.objects.filter(kind='group', project_id__in={p for p, _ in pairs})
+    }
+    for project_id, user_id in pairs:
+        conversation = conversations.get(project_id)
+        if conversation is None:
+            continue
+        if action == 'post_add':
+            conversation.add_members([user_id])
+        else:
+            ConversationMember.objects.filter(conversation=conversation, user_id=user_id).delete()
+
+
+
+def _notify_project(project_id, notification_type, title, message, task_id=None, exclude=()):
+    # Queued in the save's transaction, so a rolled back save notifies nobody
+    enqueue(notify_project, project_id, notification_type, title, message, task_id, list(exclude))
+
+
+def _previous_value(sender, instance, field):
+    if instance.pk is None:
+        return None
+    return sender.objects.filter(pk=instance.pk).values_list(field, flat=True).first()
+
+
+@receiver(pre_save, sender=Task)
+def remember_task_status(sender, instance, **kwargs):
+    # Only saves that complete a task need to know what it was before
+    if instance.status == 'completed':
+        instance._previous_status = _previous_value(sender, instance, 'status')
+
+
+@receiver(post_save, sender=Task)
+def notify_task(sender, instance, created, **kwargs):
+    if created:
+        _notify_project(instance.project_id, 'task_assigned', f"New task: {instance.name}",
+                        f"{instance.name} is due on {instance.due_date}.", task_id=instance.pk)
+    elif instance.status == 'completed' and getattr(instance, '_previous_status', 'completed') != 'completed':
+        _notify_project(instance.project_id, 'task_completed', f"Task completed: {instance.name}",
+                        f"{instance.name} has been completed.", task_id=instance.pk)
+
+
+@receiver(m2m_changed, sender=Task.assignees.through)
+def notify_new_assignees(sender, instance, action, reverse, pk_set, **kwargs):
+    """Tell users assigned to a task after it was created; ``pk_set`` only holds the new assignments."""
+    if action != 'post_add' or not pk_set:
+        return
+    if reverse:
+        # user.assigned_tasks.add(...): pk_set holds task ids
+        assignments = [(task, [instance.pk]) for task in Task.objects.filter(pk__in=pk_set)]
+    else:
+        assignments = [(instance, sorted(pk_set))]
+    for task, user_ids in assignments:
+        enqueue(notify_users, user_ids, 'task_assigned', f"Task assigned: {task.name}",
+                f"You have been assigned {task.name}, due on {task.due_date}.", task.project_id, task.pk)
+
+
+@receiver(post_save, sender=Safety)
+def notify_safety_incident(sender, instance, created, **kwargs):
+    if created:
+        _notify_project(instance.project_id, 'safety_incident', f"Safety incident: {instance.title}",
+                        f"A {instance.severity} severity incident was reported at {instance.location_in_site}.",
+                        exclude=[instance.reported_by_id])
+
+
+@receiver(post_save, sender=ProgressReport)
+def notify_progress_report(sender, instance, created, **kwargs):
+    if created:
+        _notify_project(instance.project_id, 'progress_report', f"Progress report: {instance.title}",
+                        f"A {instance.report_type} report for {instance.period_start} to {instance.period_end} was submitted.",
+                        exclude=[instance.submitted_by_id])
+
+
+@receiver(pre_save, sender=ResourceAllocation)
+def remember_received_date(sender, instance, **kwargs):
+    if instance.received_date is not None:
+        instance._previous_received_date = _previous_value(sender, instance, 'received_date')
+
+
+@receiver(post_save, sender=ResourceAllocation)
+def notify_resource_allocation(sender, instance, created, **kwargs):
+    if instance.received_date is not None and getattr(instance, '_previous_received_date', None) is None:
+        enqueue(notify_material, instance.pk, True)
+    elif created:
+        enqueue(notify_material, instance.pk, False)
+
+
+@receiver(post_save, sender=Comment)
+def notify_comment(sender, instance, created, **kwargs):
+    if created:
+        _notify_project(instance.project_id, 'comment', f"New comment from {instance.author.username}",
+                        instance.content[:200], task_id=instance.task_id, exclude=[instance.author_id])
+
+
+@receiver(post_save, sender=Notification)
+def push_notification(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(partial(publish_notifications, [instance]))
+
+
+@receiver(post_delete, sender=Notification)
+def uncount_deleted_notification(sender, instance, **kwargs):
+    """Deletes, cascades from projects, tasks and users included, take unread notifications off the counters."""
+    if not instance.is_read:
+        NotificationCounter.objects.add({(instance.user_id, instance.notification_type): -1})
+
+
+@receiver(post_save, sender=Message)
+def push_message(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(partial(publish_message, instance))
+
+
+@receiver(post_delete, sender=Message)
+def compact_conversation(sender, instance, **kwargs):
+    """Keep the conversation's counts and summary to the messages that remain."""
+    if instance.conversation_id is not None:
+        Conversation(pk=instance.conversation_id).compact(instance.seq)
@@ -0,0 +1,201 @@
+"""
+SMS dispatch from the ``SMSLog`` queue.
+
+A message is ``pending`` until a worker claims it (``sending``), then ends
+up ``sent``, ``failed`` after ``max_attempts`` or ``skipped`` when its user
+no longer wants SMS. Failed attempts go back to ``pending`` with an
+exponential backoff.
+
+Workers (the dispatch_sms command) claim a batch of due rows with one
+UPDATE, send them through the configured gateway within its rate limit,
+and write the outcome back with one statement per outcome. The linked
+notifications are marked as sent in the same transaction. A claim expires
+after ``LEASE``, so the batch of a worker that died is sent again, and a
+worker that was only slow writes back just the messages it still holds.
+"""
+
+import dataclasses
+import datetime
+import logging
+import time
+import uuid
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Notification, SMSLog
+
+logger = logging.getLogger(__name__)
+
+LEASE = datetime.timedelta(minutes=5)
+
+
+@dataclasses.dataclass
+class SendResult:
+    ok: bool
+    error: str = ''
+    # Whether a failure is worth another attempt (e.g. not an invalid number)
+    retry: bool = True
+
+
+class SMSGateway:
+    """
+    Interface of SMS providers. ``rate_limit`` is the number of messages
+    per second the provider accepts (``settings.SMS_RATE_LIMIT`` overrides
+    it).
+    """
+    rate_limit = 10.0
+
+    def send(self, phone_number, message):
+        """Send one message and return a SendResult; exceptions count as retryable failures."""
+        raise NotImplementedError
+
+
+class StubGateway(SMSGateway):
+    """Local gateway that logs messages and keeps them in ``outbox`` instead of sending them."""
+    rate_limit = 1000.0
+
+    def __init__(self):
+        self.outbox = []
+
+    def send(self, phone_number, message):
+        logger.info('SMS to %s: %s', phone_number, message)
+        self.outbox.append((phone_number, message))
+        return SendResult(ok=True)
+
+
+def get_gateway(path=None):
+    return import_string(path or settings.SMS_GATEWAY)()
+
+
+class RateLimiter:
+    """Token bucket allowing ``rate`` messages per second with bursts of up to ``burst``."""
+
+    def __init__(self, rate, burst=None, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.burst = burst or max(1.0, rate)
+        self.tokens = self.burst
+        self.clock, self.sleep = clock, sleep
+        self.updated = clock()
+
+    def acquire(self):
+        while True:
+            now = self.clock()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            self.sleep((1 - self.tokens) / self.rate)
+
+
+def backoff(attempts, base=30, cap=3600):
+    """Seconds to wait before the next attempt after ``attempts`` failed ones."""
+    return min(cap, base * 2 ** (attempts - 1))
+
+
+class SMSDispatcher:
+    def __init__(self, gateway=None, batch_size=100, max_attempts=None, rate_limit=None, limiter=None):
+        self.gateway = gateway or get_gateway()
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts or settings.SMS_MAX_ATTEMPTS
+        rate = rate_limit or settings.SMS_RATE_LIMIT or self.gateway.rate_limit
+        self.limiter = limiter or RateLimiter(rate)
+
+    def claim(self):
+        """Claim up to ``batch_size`` due messages for this worker."""
+        now = timezone.now()
+        # Pending messages that are due, and claims that have expired
+        due = Q(status__in=['pending', 'sending'], next_attempt_at__lte=now)
+        token = uuid.uuid4().hex
+        with transaction.atomic():
+            ids = list(SMSLog.objects.select_for_update(skip_locked=True).filter(due).order_by(
+                'next_attempt_at', 'id'
+            ).values_list('pk', flat=True)[:self.batch_size])
+            if not ids:
+                return []
+            # The condition is checked again in case another worker got there first
+            SMSLog.objects.filter(due, pk__in=ids).update(
+                status='sending', next_attempt_at=now + LEASE, claim_token=token,
+            )
+        return list(SMSLog.objects.filter(pk__in=ids, claim_token=token).select_related('user'))
+
+    def send(self, sms):
+        if not (sms.user.receive_sms_notifications and sms.phone_number):
+            return None
+        self.limiter.acquire()
+        try:
+            return self.gateway.send(sms.phone_number, sms.message)
+        except Exception as exc:
+            logger.warning('SMS %s failed: %s', sms.pk, exc)
+            return SendResult(ok=False, error=str(exc))
+
+    def record(self, results):
+        """
+        Write back ``[(sms, SendResult or None for skipped)]`` in one
+        transaction. Messages whose claim expired and was taken by another
+        worker are left to that worker and not counted.
+        """
+        with transaction.atomic():
+            claims = {sms.pk: sms.claim_token for sms, _ in results}
+            held = {
+                pk for pk, token in SMSLog.objects.select_for_update().filter(
+                    pk__in=claims
+                ).values_list('pk', 'claim_token')
+                if token and token == claims[pk]
+            }
+            lost = sorted(set(claims) - held)
+            if lost:
+                logger.warning('Lost the claim on SMS %s to another worker', ', '.join(map(str, lost)))
+            results = [(sms, result) for sms, result in results if sms.pk in held]
+            
+            sent = [sms for sms, result in results if result is not None and result.ok]
+            skipped = [sms.pk for sms, result in results if result is None]
+            failed = []
+            now = timezone.now()
+            for sms, result in results:
+                if result is None or result.ok:
+                    continue
+                sms.attempts += 1
+                sms.last_error = result.error
+                sms.claim_token = ''
+                if result.retry and sms.attempts < self.max_attempts:
+                    sms.status = 'pending'
+                    sms.next_attempt_at = now + datetime.timedelta(seconds=backoff(sms.attempts))
+                else:
+                    sms.status = 'failed'
+                failed.append(sms)
+            
+            # The rows stay locked until the end of the transaction, so the
+            # claims checked above still hold for these writes
+            if sent:
+                SMSLog.objects.filter(pk__in=[sms.pk for sms in sent]).update(
+                    status='sent', attempts=F('attempts') + 1, last_error='', claim_token='',
+                )
+                notification_ids = {sms.notification_id for sms in sent if sms.notification_id}
+                if notification_ids:
+                    Notification.objects.filter(pk__in=notification_ids).update(is_sms_sent=True)
+            if skipped:
+                SMSLog.objects.filter(pk__in=skipped).update(status='skipped', claim_token='')
+            if failed:
+                SMSLog.objects.bulk_update(
+                    failed, ['status', 'attempts', 'next_attempt_at', 'last_error', 'claim_token'],
+                )
+        return {'sent': len(sent), 'skipped': len(skipped),
+                'retried': sum(sms.status == 'pending' for sms in failed),
+                'failed': sum(sms.status == 'failed' for sms in failed)}
+
+    def run_once(self):
+        """
+        Claim, send and record one batch. Returns outcome counts, all zero
+        only when nothing was due: a batch whose claims were all lost to
+        another worker is followed by the next one.
+        """
+        while True:
+            batch = self.claim()
+            counts = self.record([(sms, self.send(sms)) for sms in batch])
+            if not batch or any(counts.values()):
+                return counts
@@ -1,3 +1,691 @@
-from django.test import TestCase
+import asyncio
+import datetime
+import json
+from contextlib import contextmanager
+from importlib import import_module
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+
+from django.apps import apps
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from jobs.worker import Worker
+from projects.models import Material, ResourceAllocation, Safety
+from projects.tests import ConstantQueriesMixin, create_project, create_task, create_user
+from .checks import check_push_broker
+from .fanout import fan_out
+from .push import EventStreamApp, LocalBroker, PostgresBroker, get_broker
+from .sms import RateLimiter, SendResult, SMSDispatcher, StubGateway
+from .models import Comment, Conversation, ConversationMember, Message, Notification, NotificationCounter, SMSLog
+
+
+class PrefetchPlanTests(ConstantQueriesMixin, TestCase):
+    def setUp(self):
+        self.user = create_user('manager', is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.project = create_project(self.user)
+        self.project.team_members.add(self.user)
+        self.task = create_task(self.project)
+
+    def test_notification_list(self):
+        def grow():
+            for i in range(4):
+                Notification.objects.create(
+                    user=self.user, title=f'N{i}', message='-', notification_type='other',
+                    project=self.project, task=self.task,
+                )
+        grow()
+        self.assertConstantQueries('/api/notifications/', grow)
+
+    def test_message_list(self):
+        def grow():
+            for i in range(4):
+                other = create_user(f'sender-{Message.objects.count()}')
+                Message.objects.create(sender=other, recipient=self.user, project=self.project, content='-')
+                Message.objects.create(sender=other, project=self.project, content='-', is_group_message=True)
+        grow()
+        self.assertConstantQueries('/api/messages/', grow)
+
+    def test_comment_list(self):
+        def grow():
+            for i in range(4):
+                author = create_user(f'author-{Comment.objects.count()}')
+                Comment.objects.create(
+                    author=author, content='-', comment_on='task', project=self.project, task=self.task,
+                )
+        grow()
+        self.assertConstantQueries('/api/comments/', grow)
+
+    def test_sms_log_list(self):
+        def grow():
+            for i in range(4):
+                user = create_user(f'sms-{SMSLog.objects.count()}')
+                SMSLog.objects.create(user=user, phone_number='0700000000', message='-')
+        grow()
+        self.assertConstantQueries('/api/sms-logs/', grow)
+
+
+class CommentThreadTests(TestCase):
+    def setUp(self):
+        self.user = create_user('manager')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.project = create_project(self.user)
+        self.task = create_task(self.project)
+
+    def comment(self, content, parent=None):
+        return Comment.objects.create(
+            author=self.user, content=content, comment_on='task', project=self.project,
+            task=None if parent else self.task, parent_comment=parent,
+        )
+
+    def tree(self, data):
+        return [(item['content'], self.tree(item['replies'])) for item in data]
+
+    def test_reply_joins_the_thread(self):
+        top = self.comment('top')
+        reply = self.comment('reply', top)
+        nested = self.comment('nested', reply)
+        self.assertEqual((reply.root_id, nested.root_id), (top.pk, top.pk))
+        self.assertEqual(nested.task_id, self.task.pk)
+
+    def test_list_nests_replies_in_constant_queries(self):
+        first = self.comment('first')
+        second = self.comment('second')
+        reply = self.comment('reply', first)
+        self.comment('nested', reply)
+        # Filter validation, the page of top-level comments, their replies
+        with self.assertNumQueries(3):
+            response = self.client.get(f'/api/comments/?task={self.task.pk}')
+        self.assertEqual(self.tree(response.data['results']), [
+            ('first', [('reply', [('nested', [])])]),
+            ('second', []),
+        ])
+
+        for i in range(5):
+            reply = self.comment(f'deeper {i}', reply)
+        self.comment('another', second)
+        with self.assertNumQueries(3):
+            self.client.get(f'/api/comments/?task={self.task.pk}')
+
+    def test_top_level_comments_are_paginated(self):
+        first = self.comment('first')
+        self.comment('reply', first)
+        self.comment('second')
+        response = self.client.get('/api/comments/?page_size=1')
+        self.assertEqual(self.tree(response.data['results']), [('first', [('reply', [])])])
+        response = self.client.get(response.data['next'])
+        self.assertEqual(self.tree(response.data['results']), [('second', [])])
+
+    def test_retrieve_reply_includes_its_subtree(self):
+        top = self.comment('top')
+        reply = self.comment('reply', top)
+        self.comment('nested', reply)
+        self.comment('sibling', top)
+        response = self.client.get(f'/api/comments/{reply.pk}/')
+        self.assertEqual(self.tree(response.data['replies']), [('nested', [])])
+
+
+class ConversationTests(TestCase):
+    def setUp(self):
+        self.user = create_user('manager')
+        self.worker = create_user('worker')
+        self.outsider = create_user('outsider')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.project = create_project(self.user)
+        self.project.team_members.add(self.user, self.worker)
+
+    def send(self, sender, content='-', recipient=None):
+        return Message.objects.create(
+            sender=sender, recipient=recipient, project=self.project, content=content,
+            is_group_message=recipient is None,
+        )
+
+    def unread(self, user, conversation):
+        return ConversationMember.objects.get(user=user, conversation=conversation).unread_count
+
+    def test_direct_conversation_summary(self):
+        self.send(self.worker, 'hi', recipient=self.user)
+        reply = self.send(self.user, 'hello', recipient=self.worker)
+        conversation = Conversation.objects.get()
+        self.assertEqual(conversation.kind, 'direct')
+        self.assertEqual((conversation.last_message, conversation.message_count), (reply, 2))
+        # Replying reads everything before the reply
+        self.assertEqual(self.unread(self.user, conversation), 0)
+        self.assertEqual(self.unread(self.worker, conversation), 1)
+
+    def test_group_conversation_follows_the_team(self):
+        message = self.send(self.worker)
+        conversation = message.conversation
+        self.assertEqual(self.unread(self.user, conversation), 1)
+        self.assertEqual(self.unread(self.worker, conversation), 0)
+        self.project.team_members.add(self.outsider)
+        self.send(self.worker)
+        self.assertEqual(self.unread(self.outsider, conversation), 1)
+        self.project.team_members.remove(self.outsider)
+        self.assertFalse(ConversationMember.objects.filter(user=self.outsider).exists())
+
+    def test_inbox_is_one_query(self):
+        self.send(self.worker, 'group')
+        self.send(self.worker, 'direct', recipient=self.user)
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/conversations/')
+        results = response.data['results']
+        self.assertEqual([entry['conversation']['last_message']['content'] for entry in results], ['direct', 'group'])
+        self.assertEqual([entry['unread_count'] for entry in results], [1, 1])
+
+        for i in range(3):
+            self.send(create_user(f'sender-{i}'), recipient=self.user)
+        with self.assertNumQueries(1):
+            self.client.get('/api/conversations/')
+
+    def test_thread_pages_back_from_newest(self):
+        messages = [self.send(self.worker, f'm{i}') for i in range(5)]
+        conversation = messages[0].conversation_id
+        response = self.client.get(f'/api/conversations/{conversation}/messages/?page_size=2')
+        self.assertEqual([m['content'] for m in response.data['results']], ['m4', 'm3'])
+        response = self.client.get(response.data['next'])
+        self.assertEqual([m['content'] for m in response.data['results']], ['m2', 'm1'])
+
+    def test_read_clears_unread_count(self):
+        conversation = self.send(self.worker).conversation
+        response = self.client.post(f'/api/conversations/{conversation.pk}/read/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.unread(self.user, conversation), 0)
+
+    def test_read_up_to_a_message_is_one_query(self):
+        messages = [self.send(self.worker) for _ in range(3)]
+        conversation = messages[0].conversation
+        url = f'/api/conversations/{conversation.pk}/read/'
+        with self.assertNumQueries(1):
+            response = self.client.post(url, {'message': messages[1].pk}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.unread(self.user, conversation), 1)
+        # The watermark never moves back
+        self.client.post(url, {'message': messages[0].pk}, format='json')
+        self.assertEqual(self.unread(self.user, conversation), 1)
+        self.assertEqual(self.client.post(url, {'message': 'x'}, format='json').status_code, 400)
+
+    def test_group_messages_are_read_per_user(self):
+        reader = create_user('reader')
+        self.project.team_members.add(reader)
+        messages = [self.send(self.worker) for _ in range(3)]
+        response = self.client.post(f'/api/messages/{messages[1].pk}/mark_as_read/')
+        self.assertEqual(response.status_code, 200)
+        conversation = messages[0].conversation
+        self.assertEqual(self.unread(self.user, conversation), 1)
+        self.assertEqual(self.unread(reader, conversation), 3)
+
+        response = self.client.get('/api/messages/')
+        self.assertEqual([m['is_read'] for m in response.data['results']], [True, True, False])
+        response = self.client.get('/api/messages/?is_read=false')
+        self.assertEqual([m['id'] for m in response.data['results']], [messages[2].pk])
+        response = self.client.get(f'/api/conversations/{conversation.pk}/messages/')
+        self.assertEqual([m['is_read'] for m in response.data['results']], [False, True, True])
+
+    def test_new_members_start_with_the_history_read(self):
+        conversation = self.send(self.worker).conversation
+        self.project.team_members.add(self.outsider)
+        self.assertEqual(self.unread(self.outsider, conversation), 0)
+
+    def test_deleting_messages_keeps_the_counts(self):
+        messages = [self.send(self.worker, f'm{i}') for i in range(5)]
+        conversation = messages[0].conversation
+        self.client.post(f'/api/conversations/{conversation.pk}/read/', {'message': messages[2].pk}, format='json')
+        messages[4].delete()
+        conversation.refresh_from_db()
+        self.assertEqual((conversation.message_count, conversation.last_message), (4, messages[3]))
+        self.assertEqual(self.unread(self.user, conversation), 1)
+
+        # Messages read and unread going at once, as in a cascade
+        Message.objects.filter(pk__in=[messages[1].pk, messages[3].pk]).delete()
+        conversation.refresh_from_db()
+        self.assertEqual((conversation.message_count, conversation.last_message), (2, messages[2]))
+        self.assertEqual(list(conversation.messages.order_by('seq').values_list('content', 'seq')),
+                         [('m0', 1), ('m2', 2)])
+        self.assertEqual(self.unread(self.user, conversation), 0)
+        self.assertEqual(self.unread(self.worker, conversation), 0)
+        # The next message still gets the next seq
+        self.assertEqual(self.send(self.worker).seq, 3)
+        self.assertEqual(self.unread(self.user, conversation), 1)
+
+    def test_edits_move_messages_between_conversations(self):
+        group = self.send(self.worker, 'first').conversation
+        message = self.send(self.worker, 'meant for one')
+        message.recipient, message.is_group_message = self.user, False
+        message.save()
+        direct = Conversation.objects.get(kind='direct')
+        group.refresh_from_db()
+        self.assertEqual((message.conversation, message.seq), (direct, 1))
+        self.assertEqual((group.message_count, group.last_message.content), (1, 'first'))
+        self.assertEqual((direct.message_count, direct.last_message), (1, message))
+        self.assertEqual(self.unread(self.user, group), 1)
+        self.assertEqual(self.unread(self.user, direct), 1)
+
+    def test_messages_without_recipient_or_group_flag_stay_private(self):
+        self.send(self.worker, 'team')
+        note = Message.objects.create(sender=self.worker, project=self.project, content='note')
+        self.assertEqual((note.conversation.kind, note.seq), ('private', 1))
+        self.assertEqual([m['content'] for m in self.client.get('/api/messages/').data['results']], ['team'])
+        self.client.force_authenticate(self.worker)
+        self.assertEqual([m['content'] for m in self.client.get('/api/messages/').data['results']], ['team', 'note'])
+
+    def test_migration_moves_backfilled_private_messages(self):
+        move_private_messages = import_module(
+            'communication.migrations.0009_private_conversations').move_private_messages
+        messages = [self.send(self.worker, content) for content in ('m0', 'note', 'm2')]
+        group = messages[0].conversation
+        # As 0005 left it: in the group conversation, with the user having read past it
+        Message.objects.filter(pk=messages[1].pk).update(is_group_message=False)
+        group.members.filter(user=self.user).update(last_read_seq=2)
+        move_private_messages(apps, None)
+
+        group.refresh_from_db()
+        self.assertEqual((group.message_count, group.last_message), (2, messages[2]))
+        self.assertEqual(list(group.messages.order_by('seq').values_list('content', 'seq')), [('m0', 1), ('m2', 2)])
+        self.assertEqual(self.unread(self.user, group), 1)
+        private = Conversation.objects.get(kind='private')
+        self.assertEqual(list(private.messages.values_list('content', 'seq')), [('note', 1)])
+        self.assertEqual(list(private.members.values_list('user', flat=True)), [self.worker.pk])
+        self.assertEqual([m['content'] for m in self.client.get('/api/messages/').data['results']], ['m0', 'm2'])
+
+    def test_outsiders_cannot_read_the_conversation(self):
+        message = self.send(self.worker)
+        conversation = message.conversation
+        self.client.force_authenticate(self.outsider)
+        self.assertEqual(self.client.get(f'/api/conversations/{conversation.pk}/messages/').status_code, 404)
+        self.assertEqual(self.client.get('/api/messages/').data['results'], [])
+        self.assertEqual(self.client.post(f'/api/messages/{message.pk}/mark_as_read/').status_code, 404)
+        self.assertEqual(self.client.post(f'/api/conversations/{conversation.pk}/read/').status_code, 404)
+
+
+class NotificationCounterTests(TestCase):
+    def setUp(self):
+        self.user = create_user('manager')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def notify(self, notification_type='other', user=None):
+        return Notification.objects.create(
+            user=user or self.user, title='-', message='-', notification_type=notification_type,
+        )
+
+    def unread(self):
+        response = self.client.get('/api/notifications/unread_count/')
+        return response.data['unread_count'], {k: v for k, v in response.data['by_type'].items() if v}
+
+    def test_unread_count_is_one_query(self):
+        self.notify('deadline')
+        self.notify('deadline')
+        self.notify('safety_incident')
+        self.notify('deadline', user=create_user('other'))
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/notifications/unread_count/')
+        self.assertEqual(response.data['unread_count'], 3)
+        self.assertEqual(response.data['by_type']['deadline'], 2)
+        self.assertEqual(response.data['by_type']['milestone'], 0)
+
+    def test_marking_read_decrements_once(self):
+        notification = self.notify('deadline')
+        self.notify('deadline')
+        for _ in range(2):
+            self.client.post(f'/api/notifications/{notification.pk}/mark_as_read/')
+        self.assertEqual(self.unread(), (1, {'deadline': 1}))
+        self.client.post('/api/notifications/mark_all_as_read/')
+        self.assertEqual(self.unread(), (0, {}))
+
+    def test_updates_and_deletes_keep_the_counters(self):
+        notification = self.notify('deadline')
+        self.client.patch(f'/api/notifications/{notification.pk}/', {'notification_type': 'milestone'}, format='json')
+        self.assertEqual(self.unread(), (1, {'milestone': 1}))
+        self.client.patch(f'/api/notifications/{notification.pk}/', {'is_read': True}, format='json')
+        self.assertEqual(self.unread(), (0, {}))
+        self.client.delete(f'/api/notifications/{self.notify().pk}/')
+        self.assertEqual(self.unread(), (0, {}))
+
+    def test_cascades_and_bulk_changes_keep_the_counters(self):
+        project = create_project(self.user)
+        task = create_task(project)
+        Notification.objects.create(user=self.user, title='-', message='-', notification_type='deadline', task=task)
+        Notification.objects.create(user=self.user, title='-', message='-', notification_type='comment',
+                                    project=project)
+        self.notify('deadline')
+        task.delete()
+        self.assertEqual(self.unread(), (2, {'deadline': 1, 'comment': 1}))
+        project.delete()
+        self.assertEqual(self.unread(), (1, {'deadline': 1}))
+
+        self.notify('comment')
+        Notification.objects.filter(notification_type='deadline').update(is_read=True)
+        self.assertEqual(self.unread(), (1, {'comment': 1}))
+        Notification.objects.filter(user=self.user).update(notification_type='milestone', is_read=False)
+        self.assertEqual(self.unread(), (2, {'milestone': 2}))
+        Notification.objects.all().delete()
+        self.assertEqual(self.unread(), (0, {}))
+
+    def test_rebuild_matches_the_notifications(self):
+        self.notify('deadline')
+        self.notify('comment')
+        NotificationCounter.objects.filter(user=self.user).update(unread_count=7)
+        NotificationCounter.objects.rebuild([self.user.pk])
+        self.assertEqual(self.unread(), (2, {'deadline': 1, 'comment': 1}))
+
+
+class FanOutTests(TestCase):
+    def setUp(self):
+        self.manager = create_user('manager')
+        self.client_user = create_user('client')
+        self.project = create_project(self.manager, client=self.client_user)
+        self.workers = [create_user(f'worker-{i}') for i in range(3)]
+        self.project.team_members.add(self.manager, *self.workers)
+
+    @contextmanager
+    def run_jobs(self):
+        yield
+        Worker(threads=0).run(stop_when_idle=True)
+
+    def recipients(self, notification_type):
+        return set(Notification.objects.filter(notification_type=notification_type).values_list('user__username', flat=True))
+
+    def test_safety_incident_notifies_the_project(self):
+        with self.run_jobs():
+            Safety.objects.create(
+                project=self.project, title='Fall', description='-', date_occurred=timezone.now(),
+                location_in_site='Scaffold', severity='high', reported_by=self.workers[0],
+            )
+        self.assertEqual(self.recipients('safety_incident'), {'manager', 'client', 'worker-1', 'worker-2'})
+        self.assertEqual(NotificationCounter.objects.for_user(self.client_user)[1]['safety_incident'], 1)
+
+    def test_task_completion_notifies_once(self):
+        task = create_task(self.project)
+        with self.run_jobs():
+            task.status = 'completed'
+            task.save()
+        with self.run_jobs():
+            task.save()
+        self.assertEqual(Notification.objects.filter(notification_type='task_completed', task=task).count(), 5)
+
+    def test_later_assignees_are_notified(self):
+        task = create_task(self.project)
+        with self.run_jobs():
+            task.assignees.add(self.workers[0])
+        with self.run_jobs():
+            task.assignees.add(self.workers[0], self.workers[1])
+        with self.run_jobs():
+            self.workers[2].assigned_tasks.add(task)
+        notifications = Notification.objects.filter(notification_type='task_assigned', title__startswith='Task assigned')
+        self.assertEqual(sorted(notifications.values_list('user__username', flat=True)),
+                         ['worker-0', 'worker-1', 'worker-2'])
+
+    def test_material_name_is_read_by_the_job(self):
+        material = Material.objects.create(name='Cement', unit='bag', unit_price=10)
+        allocation = ResourceAllocation(
+            project_id=self.project.pk, material_id=material.pk, quantity=5, allocated_date=timezone.now().date(),
+        )
+        with CaptureQueriesContext(connection) as captured:
+            allocation.save()
+        self.assertFalse([query for query in captured if 'projects_material' in query['sql']])
+
+    def test_material_delivery(self):
+        material = Material.objects.create(name='Cement', unit='bag', unit_price=10)
+        with self.run_jobs():
+            allocation = ResourceAllocation.objects.create(
+                project=self.project, material=material, quantity=5, allocated_date=timezone.now().date(),
+            )
+        with self.run_jobs():
+            allocation.received_date = timezone.now().date()
+            allocation.save()
+        self.assertEqual(len(self.recipients('other')), 5)
+        self.assertEqual(len(self.recipients('material_delivered')), 5)
+
+    def test_query_count_does_not_grow_with_the_team(self):
+        def queries():
+            with CaptureQueriesContext(connection) as captured:
+                fan_out(self.project.pk, 'other', '-', '-')
+            return len(captured)
+        small = queries()
+        self.project.team_members.add(*[create_user(f'member-{i}') for i in range(40)])
+        self.assertEqual(queries(), small)
+        self.assertEqual(Notification.objects.filter(user=self.manager).count(), 2)
+
+
+class FailingGateway(StubGateway):
+    def send(self, phone_number, message):
+        if phone_number.endswith('0'):
+            return SendResult(ok=False, error='invalid number', retry=False)
+        raise ConnectionError('gateway unavailable')
+
+
+class SMSDispatchTests(TestCase):
+    def setUp(self):
+        self.user = create_user('worker', phone_number='+254700000001', receive_sms_notifications=True)
+
+    def queue(self, count=1, user=None, phone_number='+254700000001'):
+        user = user or self.user
+        logs = []
+        for i in range(count):
+            notification = Notification.objects.create(user=user, title='-', message='-', notification_type='other')
+            logs.append(SMSLog.objects.create(user=user, phone_number=phone_number, message=f'SMS {i}',
+                                              notification=notification))
+        return logs
+
+    def dispatcher(self, gateway=None, **kwargs):
+        return SMSDispatcher(gateway=gateway or StubGateway(), **kwargs)
+
+    def test_batch_is_sent_with_constant_queries(self):
+        def queries(count):
+            self.queue(count)
+            dispatcher = self.dispatcher(batch_size=50)
+            with CaptureQueriesContext(connection) as captured:
+                self.assertEqual(dispatcher.run_once()['sent'], count)
+            self.assertEqual(len(dispatcher.gateway.outbox), count)
+            return len(captured)
+        self.assertEqual(queries(2), queries(20))
+        self.assertFalse(SMSLog.objects.exclude(status='sent').exists())
+        self.assertFalse(Notification.objects.filter(is_sms_sent=False).exists())
+
+    def test_failures_back_off_then_fail(self):
+        retried, = self.queue()
+        invalid, = self.queue(phone_number='+254700000000')
+        dispatcher = self.dispatcher(FailingGateway(), max_attempts=2)
+        with self.assertLogs('communication.sms', 'WARNING'):
+            counts = dispatcher.run_once()
+        self.assertEqual(counts, {'sent': 0, 'skipped': 0, 'retried': 1, 'failed': 1})
+        retried.refresh_from_db()
+        self.assertEqual((retried.status, retried.attempts, retried.last_error), ('pending', 1, 'gateway unavailable'))
+        self.assertGreater(retried.next_attempt_at, timezone.now())
+        self.assertEqual(SMSLog.objects.get(pk=invalid.pk).status, 'failed')
+
+        # Not due yet, then due and out of attempts
+        self.assertEqual(dispatcher.claim(), [])
+        SMSLog.objects.filter(pk=retried.pk).update(next_attempt_at=timezone.now())
+        with self.assertLogs('communication.sms', 'WARNING'):
+            dispatcher.run_once()
+        self.assertEqual(SMSLog.objects.get(pk=retried.pk).status, 'failed')
+        self.assertFalse(Notification.objects.filter(is_sms_sent=True).exists())
+
+    def test_users_who_opted_out_are_skipped(self):
+        user = create_user('opted-out', phone_number='+254700000002')
+        self.queue(user=user)
+        self.assertEqual(self.dispatcher().run_once()['skipped'], 1)
+
+    def test_expired_claims_are_sent_again(self):
+        self.queue(2)
+        first = self.dispatcher(batch_size=1)
+        claimed = first.claim()
+        second = self.dispatcher()
+        self.assertEqual([sms.pk for sms in second.claim()], [SMSLog.objects.exclude(pk=claimed[0].pk).get().pk])
+        SMSLog.objects.filter(pk=claimed[0].pk).update(next_attempt_at=timezone.now() - datetime.timedelta(seconds=1))
+        self.assertEqual([sms.pk for sms in second.claim()], [claimed[0].pk])
+
+    def test_a_lost_claim_is_left_to_the_new_worker(self):
+        self.queue()
+        first, second = self.dispatcher(), self.dispatcher(FailingGateway())
+        stale, = first.claim()
+        SMSLog.objects.update(next_attempt_at=timezone.now())
+        reclaimed, = second.claim()
+        with self.assertLogs('communication.sms', 'WARNING'):
+            counts = first.record([(stale, first.send(stale))])
+        self.assertEqual(counts['sent'], 0)
+        sms = SMSLog.objects.get()
+        self.assertEqual((sms.status, sms.claim_token), ('sending', reclaimed.claim_token))
+        self.assertFalse(Notification.objects.filter(is_sms_sent=True).exists())
+        with self.assertLogs('communication.sms', 'WARNING'):
+            self.assertEqual(second.record([(reclaimed, second.send(reclaimed))])['retried'], 1)
+
+    def test_a_batch_of_lost_claims_is_not_taken_for_an_empty_queue(self):
+        first, second = self.queue(2)
+
+        class ReclaimedGateway(StubGateway):
+            def send(self, phone_number, message):
+                if message == first.message:
+                    # Another worker takes the message over while it is being sent
+                    SMSLog.objects.filter(pk=first.pk).update(claim_token='other')
+                return super().send(phone_number, message)
+        dispatcher = self.dispatcher(ReclaimedGateway(), batch_size=1)
+        with self.assertLogs('communication.sms', 'WARNING'):
+            self.assertEqual(dispatcher.run_once()['sent'], 1)
+        self.assertEqual(SMSLog.objects.get(pk=second.pk).status, 'sent')
+
+    def test_rate_limiter_spaces_out_messages(self):
+        now, sleeps = [0.0], []
+
+        def sleep(seconds):
+            sleeps.append(seconds)
+            now[0] += seconds
+        limiter = RateLimiter(rate=10, burst=2, clock=lambda: now[0], sleep=sleep)
+        for _ in range(4):
+            limiter.acquire()
+        self.assertEqual(len(sleeps), 2)
+        self.assertAlmostEqual(now[0], 0.2)
+
+    def test_command_sends_until_idle(self):
+        self.queue(3)
+        out = StringIO()
+        call_command('dispatch_sms', '--once', stdout=out)
+        self.assertIn('3 sent', out.getvalue())
+
+
+class PushTests(TestCase):
+    def setUp(self):
+        self.user = create_user('manager')
+        self.worker = create_user('worker')
+        self.project = create_project(self.user)
+        self.project.team_members.add(self.user, self.worker)
+
+    def open_stream(self, query_string=b'', headers=(), method='GET'):
+        scope = {'type': 'http', 'method': method, 'path': '/api/events/', 'query_string': query_string,
+                 'headers': list(headers)}
+        sent, closed = asyncio.Queue(), asyncio.Event()
+
+        async def receive():
+            await closed.wait()
+            return {'type': 'http.disconnect'}
+
+        task = asyncio.ensure_future(EventStreamApp()(scope, receive, sent.put))
+        return task, sent, closed
+
+    def create_with_callbacks(self, create):
+        with self.captureOnCommitCallbacks(execute=True):
+            return create()
+
+    async def test_requires_a_token(self):
+        task, sent, _ = self.open_stream(headers=[(b'authorization', b'JWT invalid')])
+        await asyncio.wait_for(task, 5)
+        self.assertEqual((await sent.get())['status'], 401)
+
+    @override_settings(CORS_ALLOW_ALL_ORIGINS=False, CORS_ALLOWED_ORIGINS=['https://ujenziiq.vercel.app'])
+    async def test_cors_headers(self):
+        origin = (b'origin', b'https://ujenziiq.vercel.app')
+        token = str(AccessToken.for_user(self.user))
+        task, sent, closed = self.open_stream(query_string=f'token={token}'.encode(), headers=[origin])
+        headers = dict((await asyncio.wait_for(sent.get(), 5))['headers'])
+        self.assertEqual(headers[b'access-control-allow-origin'], b'https://ujenziiq.vercel.app')
+        self.assertEqual(headers[b'access-control-allow-credentials'], b'true')
+        closed.set()
+        await asyncio.wait_for(task, 5)
+
+        task, sent, _ = self.open_stream(headers=[origin])
+        await asyncio.wait_for(task, 5)
+        response = await sent.get()
+        self.assertEqual(response['status'], 401)
+        self.assertEqual(dict(response['headers'])[b'access-control-allow-origin'], b'https://ujenziiq.vercel.app')
+
+        task, sent, _ = self.open_stream(method='OPTIONS', headers=[
+            origin, (b'access-control-request-method', b'GET'), (b'access-control-request-headers', b'authorization'),
+        ])
+        await asyncio.wait_for(task, 5)
+        response = await sent.get()
+        self.assertEqual(response['status'], 200)
+        self.assertIn(b'authorization', dict(response['headers'])[b'access-control-allow-headers'])
+
+        task, sent, _ = self.open_stream(headers=[(b'origin', b'https://elsewhere.example')])
+        await asyncio.wait_for(task, 5)
+        self.assertNotIn(b'access-control-allow-origin', dict((await sent.get())['headers']))
+
+    def test_worker_jobs_need_a_shared_broker(self):
+        with override_settings(JOBS_EAGER=False):
+            self.assertEqual([warning.id for warning in check_push_broker(None)], ['communication.W001'])
+            with override_settings(PUSH_BROKER='communication.push.PostgresBroker'):
+                self.assertEqual(check_push_broker(None), [])
+        with override_settings(JOBS_EAGER=True):
+            self.assertEqual(check_push_broker(None), [])
+
+    def test_postgres_broker_payloads(self):
+        with self.assertRaises(ImproperlyConfigured):
+            PostgresBroker()
+
+        events = [(user_id, 'notification', {'id': user_id, 'message': 'x' * 100}) for user_id in range(200)]
+        events.append((1, 'message', {'id': 7, 'conversation': 3, 'content': 'x' * 10000}))
+        payloads = list(PostgresBroker.payloads(events))
+        self.assertGreater(len(payloads), 1)
+        self.assertTrue(all(len(payload.encode()) <= PostgresBroker.MAX_PAYLOAD for payload in payloads))
+        received = [event for payload in payloads for event in json.loads(payload)]
+        self.assertEqual(received[:200], [[user_id, event_type, data] for user_id, event_type, data in events[:200]])
+        # Too long for NOTIFY: the client loads it itself
+        self.assertEqual(received[200], [1, 'message', {'id': 7, 'conversation': 3, 'partial': True}])
+
+    async def test_postgres_broker_delivers_to_local_connections(self):
+        with mock.patch.object(connection, 'vendor', 'postgresql'):
+            broker = PostgresBroker()
+        # Subscribed without starting the listener, which needs PostgreSQL
+        subscription = LocalBroker.subscribe(broker, self.user.pk)
+        payload, = PostgresBroker.payloads([(self.user.pk, 'notification', {'id': 1})])
+        await asyncio.get_running_loop().run_in_executor(None, broker.deliver, payload)
+        self.assertEqual(await asyncio.wait_for(subscription.queue.get(), 5),
+                         b'event: notification\ndata: {"id":1}\n\n')
+
+    async def test_streams_notifications_and_messages(self):
+        token = str(AccessToken.for_user(self.user))
+        task, sent, closed = self.open_stream(query_string=f'token={token}'.encode())
+        self.assertEqual((await asyncio.wait_for(sent.get(), 5))['status'], 200)
+        await sent.get()  # retry interval
+
+        await sync_to_async(self.create_with_callbacks)(lambda: Notification.objects.create(
+            user=self.user, title='Inspection', message='-', notification_type='other',
+        ))
+        body = (await asyncio.wait_for(sent.get(), 5))['body'].decode()
+        self.assertTrue(body.startswith('event: notification\n'))
+        self.assertIn('"title":"Inspection"', body)
+
+        await sync_to_async(self.create_with_callbacks)(lambda: Message.objects.create(
+            sender=self.worker, project=self.project, content='Concrete arrives at 9', is_group_message=True,
+        ))
+        body = (await asyncio.wait_for(sent.get(), 5))['body'].decode()
+        self.assertTrue(body.startswith('event: message\n'))
+        self.assertIn('Concrete arrives at 9', body)
+
+        closed.set()
+        await asyncio.wait_for(task, 5)
+        self.assertEqual(get_broker().connection_count(), 0)
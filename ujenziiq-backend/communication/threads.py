@@ -0,0 +1,29 @@
+"""
+In-memory assembly of comment threads.
+
+Every reply stores the top-level comment of its thread in ``Comment.root``,
+so all replies below a page of comments are loaded with one query and
+linked into a tree here instead of querying each comment's replies.
+"""
+
+from collections import defaultdict
+
+from .models import Comment
+
+
+def attach_replies(comments):
+    """
+    Set ``thread_replies`` (oldest first) on ``comments`` and on every reply
+    below them, using one query.
+    """
+    comments = list(comments)
+    roots = {comment.root_id or comment.pk for comment in comments}
+    replies = list(
+        Comment.objects.filter(root_id__in=roots).select_related('author').order_by('created_at', 'pk')
+    )
+    children = defaultdict(list)
+    for reply in replies:
+        children[reply.parent_comment_id].append(reply)
+    for comment in [*comments, *replies]:
+        comment.thread_replies = children.get(comment.pk, [])
+    return comments
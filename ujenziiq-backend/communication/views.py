@@ -1,77 +1,169 @@
 from rest_framework import viewsets, permissions, status, filters
 from rest_framework.response import Response
 from rest_framework.decorators import action
-from django.db.models import Q
+from django.db import transaction
+from django.db.models import BooleanField, ExpressionWrapper, F, Q
 from django_filters.rest_framework import DjangoFilterBackend
-from .models import Notification, Message, Comment, SMSLog
+from ujenziiq.pagination import KeysetPagination
+from ujenziiq.prefetch import PrefetchPlanMixin, plan_queryset
+from .filters import MessageFilter
+from .models import Notification, NotificationCounter, Message, ConversationMember, Comment, SMSLog
+from .threads import attach_replies
 from .serializers import (
-    NotificationSerializer, MessageSerializer, 
+    NotificationSerializer, MessageSerializer, InboxSerializer,
     CommentSerializer, SMSLogSerializer
 )
 
-class NotificationViewSet(viewsets.ModelViewSet):
+class NotificationViewSet(PrefetchPlanMixin, viewsets.ModelViewSet):
     serializer_class = NotificationSerializer
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ['notification_type', 'is_read', 'is_sms_sent', 'project']
     ordering_fields = ['created_at']
+    ordering = ['-created_at']
     
     def get_queryset(self):
         return Notification.objects.filter(user=self.request.user)
     
+    def perform_update(self, serializer):
+        with transaction.atomic():
+            notification_type, is_read = Notification.objects.select_for_update().filter(
+                pk=serializer.instance.pk
+            ).values_list('notification_type', 'is_read').get()
+            notification = serializer.save()
+            deltas = {}
+            if not is_read:
+                deltas[notification.user_id, notification_type] = -1
+            if not notification.is_read:
+                key = (notification.user_id, notification.notification_type)
+                deltas[key] = deltas.get(key, 0) + 1
+            NotificationCounter.objects.add(deltas)
+    
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            # The post_delete receiver uncounts it if it is still unread
+            instance.is_read = Notification.objects.select_for_update().values_list(
+                'is_read', flat=True).get(pk=instance.pk)
+            instance.delete()
+    
     @action(detail=True, methods=['post'])
     def mark_as_read(self, request, pk=None):
         notification = self.get_object()
-        notification.is_read = True
-        notification.save()
+        notification.mark_read()
         return Response({'status': 'notification marked as read'})
     
     @action(detail=False, methods=['post'])
     def mark_all_as_read(self, request):
-        self.get_queryset().update(is_read=True)
+        # The queryset recounts the user's counters
+        self.get_queryset().filter(is_read=False).update(is_read=True)
         return Response({'status': 'all notifications marked as read'})
+    
+    @action(detail=False, methods=['get'])
+    def unread_count(self, request):
+        """Unread notifications in total and per type, from the counters."""
+        total, by_type = NotificationCounter.objects.for_user(request.user)
+        return Response({'unread_count': total, 'by_type': by_type})
 
-class MessageViewSet(viewsets.ModelViewSet):
+class MessageViewSet(PrefetchPlanMixin, viewsets.ModelViewSet):
     serializer_class = MessageSerializer
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
-    filterset_fields = ['project', 'is_group_message', 'is_read']
+    filterset_class = MessageFilter
     ordering_fields = ['created_at']
+    ordering = ['created_at']
     
     def get_queryset(self):
-        user = self.request.user
-        return Message.objects.filter(
-            Q(sender=user) | 
-            Q(recipient=user) | 
-            Q(is_group_message=True, project__team_members=user)
-        ).distinct()
+        # One row per member, so no DISTINCT is needed; the read flag
+        # compares against the same membership row's watermark
+        return Message.objects.filter(conversation__members__user=self.request.user).annotate(
+            annotated_is_read=ExpressionWrapper(
+                Q(seq__lte=F('conversation__members__last_read_seq')), output_field=BooleanField()
+            ),
+        )
     
     def perform_create(self, serializer):
         serializer.save(sender=self.request.user)
     
     @action(detail=True, methods=['post'])
     def mark_as_read(self, request, pk=None):
-        message = self.get_object()
-        if message.recipient == request.user or (message.is_group_message and message.project.team_members.filter(id=request.user.id).exists()):
-            message.is_read = True
-            message.save()
-            return Response({'status': 'message marked as read'})
-        return Response({'error': 'Not authorized to mark this message as read'}, status=status.HTTP_403_FORBIDDEN)
+        """Mark this message, and everything before it in its conversation, as read."""
+        try:
+            message_id = int(pk)
+        except ValueError:
+            return Response({'error': 'Invalid message id'}, status=status.HTTP_400_BAD_REQUEST)
+        if not ConversationMember.objects.filter(user=request.user).mark_read(message_id):
+            # Already read, or not visible to the user (404)
+            self.get_object()
+        return Response({'status': 'message marked as read'})
+
+class ThreadPagination(KeysetPagination):
+    # Newest first; ``next`` pages back through older messages
+    default_ordering = ('-created_at',)
 
-class CommentViewSet(viewsets.ModelViewSet):
+class ConversationViewSet(PrefetchPlanMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    The user's inbox: one entry per conversation, most recent first
+    """
+    serializer_class = InboxSerializer
+    lookup_field = 'conversation'
+    ordering = ['-last_message_at']
+    
+    def get_queryset(self):
+        return ConversationMember.objects.filter(user=self.request.user).with_unread_count()
+    
+    @action(detail=True, methods=['get'])
+    def messages(self, request, conversation=None):
+        member = self.get_object()
+        queryset = Message.objects.filter(conversation_id=member.conversation_id).annotate(
+            annotated_is_read=ExpressionWrapper(Q(seq__lte=member.last_read_seq), output_field=BooleanField()),
+        )
+        queryset = plan_queryset(queryset, MessageSerializer())
+        paginator = ThreadPagination()
+        page = paginator.paginate_queryset(queryset, request)
+        serializer = MessageSerializer(page, many=True, context=self.get_serializer_context())
+        return paginator.get_paginated_response(serializer.data)
+    
+    @action(detail=True, methods=['post'])
+    def read(self, request, conversation=None):
+        """Move the read watermark up to ``message`` (default: the latest message)."""
+        message_id = request.data.get('message')
+        try:
+            conversation_id = int(conversation)
+            message_id = None if message_id in (None, '') else int(message_id)
+        except (TypeError, ValueError):
+            return Response({'error': 'message must be a message id'}, status=status.HTTP_400_BAD_REQUEST)
+        memberships = ConversationMember.objects.filter(user=request.user, conversation_id=conversation_id)
+        if not memberships.mark_read(message_id):
+            # Already read, or not a member (404)
+            self.get_object()
+        return Response({'status': 'conversation marked as read'})
+
+class CommentViewSet(PrefetchPlanMixin, viewsets.ModelViewSet):
     queryset = Comment.objects.all()
     serializer_class = CommentSerializer
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ['comment_on', 'project', 'task', 'safety_incident']
     ordering_fields = ['created_at']
+    ordering = ['created_at']
+    
+    def get_queryset(self):
+        # Lists page through top-level comments; replies are nested below them
+        if self.action == 'list':
+            return Comment.objects.filter(parent_comment__isnull=True)
+        return Comment.objects.all()
+    
+    def paginate_queryset(self, queryset):
+        page = super().paginate_queryset(queryset)
+        return page if page is None else attach_replies(page)
     
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
-class SMSLogViewSet(viewsets.ModelViewSet):
+class SMSLogViewSet(PrefetchPlanMixin, viewsets.ModelViewSet):
     queryset = SMSLog.objects.all()
     serializer_class = SMSLogSerializer
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ['user', 'status']
     ordering_fields = ['sent_at']
+    ordering = ['-sent_at']
     
     def get_permissions(self):
         if self.action in ['list', 'retrieve']:
@@ -0,0 +1,56 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+
+from jobs.metrics import queue_metrics
+from jobs.worker import Worker
+
+logger = logging.getLogger('jobs.worker')
+
+
+class Command(BaseCommand):
+    help = 'Runs queued background jobs on a thread pool and, for CPU-bound jobs, a process pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=4, help='Threads for I/O-bound jobs (0 runs jobs inline)')
+        parser.add_argument(
+            '--processes',
+            type=int,
+            default=0,
+            help='Processes for CPU-bound jobs (0 runs them on the thread pool)',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Exit once no jobs are due instead of waiting for more',
+        )
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds to wait when no jobs are due')
+        parser.add_argument('--metrics-interval', type=float, default=60.0, help='Seconds between queue metrics logs')
+
+    def handle(self, *args, **options):
+        worker = Worker(
+            threads=options['threads'],
+            processes=options['processes'],
+            poll_interval=options['poll_interval'],
+        )
+        started = 0
+        logged = time.monotonic()
+        try:
+            while True:
+                count = worker.run_once()
+                started += count
+                if not count and not worker.running:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+                if time.monotonic() - logged >= options['metrics_interval']:
+                    metrics = queue_metrics()
+                    logger.info('%d queued, %d running', metrics['queued'], metrics['running'])
+                    logged = time.monotonic()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            worker.shutdown()
+
+        self.stdout.write(self.style.SUCCESS(f'{started} jobs run'))
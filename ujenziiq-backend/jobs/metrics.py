@@ -0,0 +1,52 @@
+"""
+Queue depth and latency, for the metrics endpoint and the worker's log.
+"""
+
+import datetime
+
+from django.db.models import Avg, Count, DurationField, ExpressionWrapper, F, Max, Min
+from django.utils import timezone
+
+from .models import Job
+
+
+def _seconds(value):
+    return round(value.total_seconds(), 3) if value is not None else None
+
+
+def queue_metrics(window=datetime.timedelta(hours=1)):
+    """
+    Jobs waiting or running per job name, with the age of the oldest due
+    job, and for jobs finished within ``window`` how long they waited
+    between being queued and being started and how long they ran.
+    """
+    now = timezone.now()
+    depth = {}
+    pending = Job.objects.filter(status__in=['queued', 'running']).values('name', 'status').annotate(
+        count=Count('id'), oldest=Min('enqueued_at'),
+    ).order_by('name', 'status')
+    for row in pending:
+        entry = depth.setdefault(row['name'], {'queued': 0, 'running': 0, 'oldest_age': None})
+        entry[row['status']] = row['count']
+        if row['status'] == 'queued':
+            entry['oldest_age'] = _seconds(now - row['oldest'])
+
+    wait = ExpressionWrapper(F('started_at') - F('enqueued_at'), output_field=DurationField())
+    run = ExpressionWrapper(F('finished_at') - F('started_at'), output_field=DurationField())
+    finished = Job.objects.filter(finished_at__gte=now - window).values('name', 'status').annotate(
+        count=Count('id'), avg_wait=Avg(wait), max_wait=Max(wait), avg_run=Avg(run), max_run=Max(run),
+    ).order_by('name', 'status')
+    latency = {}
+    for row in finished:
+        entry = latency.setdefault(row['name'], {'done': 0, 'failed': 0})
+        entry[row['status']] = row['count']
+        if row['status'] == 'done':
+            entry.update({key: _seconds(row[key]) for key in ('avg_wait', 'max_wait', 'avg_run', 'max_run')})
+
+    return {
+        'queued': sum(entry['queued'] for entry in depth.values()),
+        'running': sum(entry['running'] for entry in depth.values()),
+        'depth': depth,
+        'window': int(window.total_seconds()),
+        'latency': latency,
+    }
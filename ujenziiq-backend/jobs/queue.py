@@ -0,0 +1,108 @@
+"""
+The job queue: a ``Job`` table that views write to and workers claim from.
+
+``enqueue`` inserts a row in the caller's transaction, so a job queued by
+a request that rolls back never runs and a worker never sees the job
+before the data it refers to is committed.
+
+A worker claims due jobs in priority order with one SELECT (``FOR UPDATE
+SKIP LOCKED`` where supported) and one UPDATE that re-checks the due
+condition and moves ``run_at`` to the end of the job's visibility
+timeout. A claimed job that is neither completed nor failed by then,
+because its worker died, is claimed again. Attempts are counted at claim
+time, so a job that keeps killing its worker still runs out of attempts.
+
+Deployments without a run_jobs worker set ``JOBS_EAGER`` (``api/index.py``
+does for the serverless one): ``enqueue`` still records the job, and runs
+it in the enqueuing process as soon as the caller's transaction commits. Delayed jobs, and jobs that fail there and wait for a retry,
+are left to a worker, e.g. ``run_jobs --once`` run from a scheduler.
+"""
+
+import datetime
+import uuid
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, DateTimeField, F, Q, Value, When
+from django.utils import timezone
+
+from .models import Job
+from .registry import get_job
+
+
+def enqueue(func_or_name, *args, priority=None, delay=None):
+    """Queue a registered job with positional ``args``; ``delay`` is a timedelta or seconds."""
+    name = func_or_name if isinstance(func_or_name, str) else func_or_name.job.name
+    definition = get_job(name)
+    if delay is not None and not isinstance(delay, datetime.timedelta):
+        delay = datetime.timedelta(seconds=delay)
+    now = timezone.now()
+    job = Job.objects.create(
+        name=name, args=list(args),
+        priority=definition.priority if priority is None else priority,
+        max_attempts=definition.max_attempts,
+        run_at=now + delay if delay else now, enqueued_at=now,
+    )
+    if settings.JOBS_EAGER and not delay:
+        transaction.on_commit(partial(_run_eagerly, job.pk))
+    return job
+
+
+def _run_eagerly(job_id):
+    # Imported here: the worker imports this module
+    from .worker import Worker
+    Worker(threads=0).run_inline(job_ids=[job_id])
+
+
+def retry_delay(attempts, base=10, cap=3600):
+    """Seconds before retrying a job that has failed ``attempts`` times."""
+    return min(cap, base * 2 ** (attempts - 1))
+
+
+def claim(definitions, limit, job_ids=None):
+    """Claim up to ``limit`` due jobs among ``definitions`` (and ``job_ids``), most urgent first."""
+    if limit <= 0 or not definitions:
+        return []
+    now = timezone.now()
+    due = Q(status__in=['queued', 'running'], run_at__lte=now, name__in=[d.name for d in definitions])
+    if job_ids is not None:
+        due &= Q(pk__in=job_ids)
+    token = uuid.uuid4().hex
+    with transaction.atomic():
+        ids = list(Job.objects.select_for_update(skip_locked=True).filter(due).order_by(
+            '-priority', 'run_at', 'id'
+        ).values_list('pk', flat=True)[:limit])
+        if not ids:
+            return []
+        Job.objects.filter(due, pk__in=ids).update(
+            status='running', claim_token=token, started_at=now, attempts=F('attempts') + 1,
+            run_at=Case(
+                *[When(name=d.name, then=Value(now + d.timeout)) for d in definitions],
+                output_field=DateTimeField(),
+            ),
+        )
+    jobs = list(Job.objects.filter(pk__in=ids, claim_token=token).order_by('-priority', 'run_at', 'id'))
+    # Jobs whose worker died on every attempt
+    exhausted = [job for job in jobs if job.attempts > job.max_attempts]
+    for job in exhausted:
+        fail(job, 'Visibility timeout expired on the last attempt')
+    return [job for job in jobs if job.attempts <= job.max_attempts]
+
+
+def complete(job):
+    return Job.objects.filter(pk=job.pk, claim_token=job.claim_token).update(
+        status='done', finished_at=timezone.now(), claim_token='', last_error='',
+    )
+
+
+def fail(job, error):
+    """Retry the job after a backoff, or mark it failed once it is out of attempts."""
+    now = timezone.now()
+    if job.attempts < job.max_attempts:
+        changes = {'status': 'queued', 'run_at': now + datetime.timedelta(seconds=retry_delay(job.attempts))}
+    else:
+        changes = {'status': 'failed', 'finished_at': now}
+    return Job.objects.filter(pk=job.pk, claim_token=job.claim_token).update(
+        claim_token='', last_error=error, **changes,
+    )
@@ -0,0 +1,48 @@
+"""
+Job functions, registered with ``@job`` in each app's ``jobs.py``.
+
+A job takes JSON-serialisable positional arguments. ``pool`` says where
+the worker runs it: ``'thread'`` for I/O-bound work (database, network),
+``'process'`` for CPU-bound work that would otherwise hold the GIL.
+"""
+
+import dataclasses
+import datetime
+
+_registry = {}
+
+
+@dataclasses.dataclass(frozen=True)
+class JobDefinition:
+    name: str
+    func: object
+    pool: str = 'thread'
+    priority: int = 0
+    max_attempts: int = 3
+    # How long a worker may hold the job before it is handed to another
+    timeout: datetime.timedelta = datetime.timedelta(minutes=5)
+
+
+def job(name=None, pool='thread', priority=0, max_attempts=3, timeout=300):
+    """Register the decorated function as a job (named ``<module>.<function>`` by default)."""
+    if pool not in ('thread', 'process'):
+        raise ValueError(f"Unknown pool {pool!r}")
+
+    def register(func):
+        definition = JobDefinition(
+            name=name or f'{func.__module__}.{func.__name__}', func=func, pool=pool, priority=priority,
+            max_attempts=max_attempts, timeout=datetime.timedelta(seconds=timeout),
+        )
+        _registry[definition.name] = definition
+        func.job = definition
+        return func
+
+    return register
+
+
+def get_job(name):
+    return _registry[name]
+
+
+def registered(pool=None):
+    return [definition for definition in _registry.values() if pool is None or definition.pool == pool]
@@ -0,0 +1,23 @@
+"""
+What runs in the worker's pools. This module must not import models: a
+spawned process imports it to unpickle ``setup`` before Django is set up.
+"""
+
+import os
+
+from django.db import close_old_connections
+
+from .registry import get_job
+
+
+def setup(settings_module):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    import django
+    django.setup()
+
+
+def execute(name, args):
+    try:
+        return get_job(name).func(*args)
+    finally:
+        close_old_connections()
@@ -0,0 +1,156 @@
+import datetime
+import io
+import shutil
+import tempfile
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+
+from projects.models import ProjectImage
+from projects.tests import create_project, create_user
+from .metrics import queue_metrics
+from .models import Job
+from .queue import claim, enqueue, fail
+from .registry import get_job, job
+from .worker import Worker
+
+calls = []
+
+
+@job(name='jobs.tests.record')
+def record(value):
+    calls.append(value)
+
+
+@job(name='jobs.tests.explode', max_attempts=2)
+def explode():
+    raise ValueError('boom')
+
+
+class JobQueueTests(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def run_jobs(self):
+        Worker(threads=0).run(stop_when_idle=True)
+
+    def test_runs_jobs_by_priority(self):
+        enqueue(record, 'low')
+        enqueue(record, 'high', priority=10)
+        enqueue('jobs.tests.record', 'normal', priority=5)
+        self.run_jobs()
+        self.assertEqual(calls, ['high', 'normal', 'low'])
+        self.assertEqual(Job.objects.filter(status='done').count(), 3)
+
+    def test_delayed_jobs_wait(self):
+        enqueue(record, 'later', delay=60)
+        self.run_jobs()
+        self.assertEqual(calls, [])
+
+    def test_rolled_back_enqueue_never_runs(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            enqueue(record, 'ghost')
+            raise RuntimeError
+        self.run_jobs()
+        self.assertEqual(calls, [])
+
+    @override_settings(JOBS_EAGER=True)
+    def test_eager_jobs_run_once_the_transaction_commits(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            queued = enqueue(record, 'now')
+            enqueue(record, 'later', delay=60)
+            self.assertEqual(calls, [])
+        self.assertEqual(calls, ['now'])
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, 'done')
+        self.assertEqual(Job.objects.filter(status='queued').count(), 1)
+
+    @override_settings(JOBS_EAGER=False)
+    def test_without_eager_jobs_wait_for_a_worker(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            enqueue(record, 'queued')
+        self.assertEqual(calls, [])
+        self.run_jobs()
+        self.assertEqual(calls, ['queued'])
+
+    def test_failures_retry_with_backoff_then_fail(self):
+        queued = enqueue(explode)
+        with self.assertLogs('jobs.worker', 'ERROR'):
+            self.run_jobs()
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), ('queued', 1))
+        self.assertGreater(queued.run_at, timezone.now() + datetime.timedelta(seconds=5))
+        self.assertIn('ValueError: boom', queued.last_error)
+
+        Job.objects.filter(pk=queued.pk).update(run_at=timezone.now())
+        with self.assertLogs('jobs.worker', 'ERROR'):
+            self.run_jobs()
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), ('failed', 2))
+        self.assertIsNotNone(queued.finished_at)
+
+    def test_visibility_timeout_hands_the_job_to_another_worker(self):
+        queued = enqueue(record, 'once')
+        [first] = claim([get_job('jobs.tests.record')], 10)
+        self.assertEqual(claim([get_job('jobs.tests.record')], 10), [])
+
+        # The first worker dies; its lease runs out
+        Job.objects.filter(pk=queued.pk).update(run_at=timezone.now() - datetime.timedelta(seconds=1))
+        [second] = claim([get_job('jobs.tests.record')], 10)
+        self.assertEqual(second.attempts, 2)
+        # The first worker's late result is ignored
+        self.assertEqual(fail(first, 'late'), 0)
+
+        Job.objects.filter(pk=queued.pk).update(run_at=timezone.now() - datetime.timedelta(seconds=1), attempts=3)
+        self.assertEqual(claim([get_job('jobs.tests.record')], 10), [])
+        self.assertEqual(Job.objects.get(pk=queued.pk).status, 'failed')
+
+    def test_metrics(self):
+        enqueue(record, 'a')
+        enqueue(record, 'b')
+        self.assertEqual(queue_metrics()['depth']['jobs.tests.record']['queued'], 2)
+        self.run_jobs()
+        metrics = queue_metrics()
+        self.assertEqual(metrics['queued'], 0)
+        self.assertEqual(metrics['latency']['jobs.tests.record']['done'], 2)
+        self.assertGreaterEqual(metrics['latency']['jobs.tests.record']['max_wait'], 0)
+
+        client = APIClient()
+        client.force_authenticate(create_user('staff', is_staff=True))
+        self.assertEqual(client.get('/api/jobs/metrics/', {'window': 60}).data['window'], 60)
+        client.force_authenticate(create_user('worker'))
+        self.assertEqual(client.get('/api/jobs/metrics/').status_code, 403)
+
+
+class ProjectImageJobTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+
+    def test_upload_returns_before_the_image_is_processed(self):
+        user = create_user('manager')
+        project = create_project(user)
+        buffer = io.BytesIO()
+        Image.new('RGB', (64, 48)).save(buffer, 'JPEG')
+        client = APIClient()
+        client.force_authenticate(user)
+
+        with override_settings(MEDIA_ROOT=self.media_root):
+            response = client.post('/api/images/', {
+                'project': project.pk, 'title': 'Slab',
+                'image': SimpleUploadedFile('slab.jpg', buffer.getvalue(), content_type='image/jpeg'),
+            })
+            self.assertEqual(response.status_code, 201)
+            self.assertIsNone(response.data['width'])
+            self.assertEqual(
+                sorted(Job.objects.values_list('name', flat=True)),
+                ['projects.jobs.extract_photo_metadata', 'projects.jobs.process_project_image'],
+            )
+            Worker(threads=0).run(stop_when_idle=True)
+
+        image = ProjectImage.objects.get()
+        self.assertEqual((image.width, image.height), (64, 48))
@@ -0,0 +1,18 @@
+import datetime
+
+from rest_framework import permissions, status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.response import Response
+
+from .metrics import queue_metrics
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def job_metrics(request):
+    """Queue depth and latency; ``?window=`` sets the latency window in seconds."""
+    try:
+        window = int(request.query_params.get('window', 3600))
+    except ValueError:
+        return Response({'error': 'window must be a number of seconds'}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(queue_metrics(datetime.timedelta(seconds=max(window, 1))))
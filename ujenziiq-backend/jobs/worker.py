@@ -0,0 +1,104 @@
+"""
+The worker behind the run_jobs command.
+
+Thread-pool jobs run on a ``ThreadPoolExecutor`` in the worker process,
+each thread with its own database connection. Process-pool jobs run on a
+``ProcessPoolExecutor`` of freshly spawned interpreters that set Django up
+themselves; a worker with only one of the pools runs every job on it. The
+worker only claims as many jobs as it has free slots in each pool, so
+jobs it cannot start yet stay available to other workers.
+
+With neither pool (``threads=0``) jobs run one after another in the
+calling thread, which is what tests and the in-memory database need.
+"""
+
+import logging
+import multiprocessing
+import os
+import time
+import traceback
+from concurrent import futures
+from concurrent.futures.process import BrokenProcessPool
+
+from . import queue
+from .registry import registered
+from .runner import execute, setup
+
+logger = logging.getLogger(__name__)
+
+
+class Worker:
+    def __init__(self, threads=4, processes=0, poll_interval=1.0):
+        self.poll_interval = poll_interval
+        self.slots = {'thread': threads, 'process': processes}
+        self.pools = {}
+        if threads:
+            self.pools['thread'] = futures.ThreadPoolExecutor(threads, thread_name_prefix='job')
+        if processes:
+            self.pools['process'] = self._process_pool()
+        self.running = {}
+
+    def _process_pool(self):
+        return futures.ProcessPoolExecutor(
+            self.slots['process'], mp_context=multiprocessing.get_context('spawn'),
+            initializer=setup, initargs=(os.environ.get('DJANGO_SETTINGS_MODULE'),),
+        )
+
+    def _definitions(self, pool):
+        if len(self.pools) == 1:
+            # A single pool runs every job
+            return registered()
+        return registered(pool)
+
+    def _finish(self, job, run):
+        try:
+            run()
+        except Exception:
+            logger.exception('Job %s (%s) failed', job.pk, job.name)
+            queue.fail(job, traceback.format_exc(limit=20))
+        else:
+            queue.complete(job)
+
+    def run_inline(self, job_ids=None):
+        """Claim and run one batch (of ``job_ids`` only, if given) in this thread. Returns the number of jobs run."""
+        jobs = queue.claim(registered(), 100, job_ids)
+        for job in jobs:
+            self._finish(job, lambda job=job: execute(job.name, job.args))
+        return len(jobs)
+
+    def run_once(self):
+        """Start claimed jobs in free slots and record finished ones. Returns the number of jobs started."""
+        if not self.pools:
+            return self.run_inline()
+        started = 0
+        for pool_name, pool in self.pools.items():
+            busy = sum(1 for _, name, _ in self.running.values() if name == pool_name)
+            for job in queue.claim(self._definitions(pool_name), self.slots[pool_name] - busy):
+                self.running[pool.submit(execute, job.name, job.args)] = (job, pool_name, pool)
+                started += 1
+        if self.running:
+            done, _ = futures.wait(list(self.running), timeout=self.poll_interval,
+                                   return_when=futures.FIRST_COMPLETED)
+            for future in done:
+                job, pool_name, pool = self.running.pop(future)
+                self._finish(job, future.result)
+                if isinstance(future.exception(), BrokenProcessPool) and pool is self.pools[pool_name]:
+                    # A child died (e.g. killed for memory); the pool cannot be reused
+                    self.pools['process'].shutdown(wait=False)
+                    self.pools['process'] = self._process_pool()
+        return started
+
+    def run(self, stop_when_idle=False):
+        while True:
+            started = self.run_once()
+            if not started and not self.running:
+                if stop_when_idle:
+                    return
+                time.sleep(self.poll_interval)
+
+    def shutdown(self):
+        for pool in self.pools.values():
+            pool.shutdown(wait=True)
+        for future, (job, _, _) in list(self.running.items()):
+            self._finish(job, future.result)
+        self.running.clear()
@@ -0,0 +1,108 @@
+"""
+Async project dashboard, served concurrently under ``ujenziiq/asgi.py``.
+
+The project row and its task counts come from one conditional aggregate,
+and the independent sections (project, recent safety incidents, recent
+material allocations) run at the same time on separate worker threads, each
+with its own database connection. ``?summary=true`` skips the nested
+project payload.
+"""
+
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections, connection
+from django.db.models import Count, Q
+from django.http import HttpResponse
+from rest_framework import exceptions, status
+from rest_framework.renderers import JSONRenderer
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from ujenziiq.prefetch import plan_queryset
+from .models import Project, ResourceAllocation, Safety
+from .serializers import (
+    ProjectDetailSerializer, ProjectListSerializer,
+    ResourceAllocationSerializer, SafetySerializer
+)
+
+
+def _json_response(data, status_code=status.HTTP_200_OK):
+    return HttpResponse(JSONRenderer().render(data), status=status_code, content_type='application/json')
+
+
+def _runs_in_parallel():
+    # Every connection to an in-memory SQLite database sees its own empty
+    # database, so the sections have to share the request's connection
+    return not (connection.vendor == 'sqlite' and connection.is_in_memory_db())
+
+
+def _section(func, *args):
+    parallel = _runs_in_parallel()
+
+    def run():
+        try:
+            return func(*args)
+        finally:
+            if parallel:
+                close_old_connections()
+
+    return sync_to_async(run, thread_sensitive=not parallel)()
+
+
+def _authenticate(request):
+    result = JWTAuthentication().authenticate(request)
+    if result is None:
+        raise exceptions.NotAuthenticated()
+    return result[0]
+
+
+def project_section(pk, summary):
+    serializer_class = ProjectListSerializer if summary else ProjectDetailSerializer
+    queryset = Project.objects.with_progress().annotate(
+        annotated_pending_task_count=Count('tasks', filter=Q(tasks__status='pending'), distinct=True),
+    )
+    project = plan_queryset(queryset, serializer_class()).filter(pk=pk).first()
+    if project is None:
+        return None
+    return {
+        'project': serializer_class(project).data,
+        'task_summary': {
+            'pending': project.annotated_pending_task_count,
+            'completed': project.annotated_completed_task_count,
+            'completion_percentage': project.completion_percentage,
+        },
+    }
+
+
+def recent_safety_section(pk):
+    queryset = plan_queryset(Safety.objects.filter(project_id=pk), SafetySerializer())
+    return SafetySerializer(queryset.order_by('-date_occurred')[:5], many=True).data
+
+
+def recent_materials_section(pk):
+    queryset = plan_queryset(ResourceAllocation.objects.filter(project_id=pk), ResourceAllocationSerializer())
+    return ResourceAllocationSerializer(queryset.order_by('-allocated_date')[:5], many=True).data
+
+
+async def project_dashboard(request, pk):
+    try:
+        await sync_to_async(_authenticate)(request)
+    except exceptions.APIException as exc:
+        response = _json_response({'detail': exc.detail}, exc.status_code)
+        response['WWW-Authenticate'] = JWTAuthentication().authenticate_header(request)
+        return response
+
+    summary = request.GET.get('summary', '').lower() in ('1', 'true')
+    project, recent_safety, recent_materials = await asyncio.gather(
+        _section(project_section, pk, summary),
+        _section(recent_safety_section, pk),
+        _section(recent_materials_section, pk),
+    )
+    if project is None:
+        return _json_response({'detail': 'Not found.'}, status.HTTP_404_NOT_FOUND)
+
+    return _json_response({
+        **project,
+        'recent_safety': recent_safety,
+        'recent_materials': recent_materials,
+    })
@@ -0,0 +1,223 @@
+"""
+Reachability queries over ``Task.dependencies`` with recursive CTEs.
+
+The generated SQL only uses ``WITH RECURSIVE`` / ``UNION`` and runs on both
+SQLite and PostgreSQL. Both evaluate the recursion lazily, so a query that
+stops at the first match (``LIMIT 1``) stops walking the graph as well.
+
+``closure`` / ``closure_counts`` return every task reachable from a task
+with its depth (the fewest dependency hops), in one query each.
+
+Cycle checks are pruned with ``Task.dependency_level``, a topological
+rank: every task's level is higher than the levels of the tasks it
+depends on, so a task can only reach tasks of lower level. The signals in
+``projects.signals`` raise levels as dependencies are added; removing one
+leaves them valid. Changes that bypass signals (writing the dependencies'
+through model directly, raw SQL) must call ``rebuild_dependency_levels``.
+"""
+
+from collections import defaultdict
+
+from django.db import connection
+from django.db.models import F, Max
+
+from .models import Task
+
+# Tasks that depend on the task (directly or transitively)
+DOWNSTREAM = 'downstream'
+# Tasks the task depends on (directly or transitively)
+UPSTREAM = 'upstream'
+MAX_DEPTH = 100
+
+
+def _edge_table():
+    through = Task.dependencies.through
+    task_column = through._meta.get_field('from_task').column
+    dependency_column = through._meta.get_field('to_task').column
+    return through._meta.db_table, task_column, dependency_column
+
+
+def _placeholders(values):
+    return ', '.join(['%s'] * len(values))
+
+
+def _closure_cte(direction):
+    """
+    ``closure(id, depth)`` CTE taking the task id and the maximum depth as
+    parameters. A task reached along paths of different lengths appears
+    once per length; the depth limit also keeps cyclic data from recursing
+    forever. On cyclic data the start task reaches itself, so callers
+    leave it out.
+    """
+    table, task_column, dependency_column = _edge_table()
+    if direction == DOWNSTREAM:
+        next_column, current_column = task_column, dependency_column
+    else:
+        next_column, current_column = dependency_column, task_column
+    return (
+        f'WITH RECURSIVE closure(id, depth) AS ('
+        f'SELECT edge.{next_column}, 1 FROM {table} edge WHERE edge.{current_column} = %s '
+        f'UNION '
+        f'SELECT edge.{next_column}, closure.depth + 1 FROM {table} edge '
+        f'JOIN closure ON edge.{current_column} = closure.id WHERE closure.depth < %s'
+        f')'
+    )
+
+
+def closure(task_id, direction, max_depth=MAX_DEPTH):
+    """Tasks reachable from ``task_id`` as dicts, nearest first."""
+    fields = [Task._meta.get_field(name) for name in ('id', 'name', 'status', 'start_date', 'due_date')]
+    columns = ', '.join(f'task.{field.column}' for field in fields)
+    sql = (
+        f'{_closure_cte(direction)} '
+        f'SELECT {columns}, MIN(closure.depth) AS depth '
+        f'FROM closure JOIN {Task._meta.db_table} task ON task.id = closure.id '
+        f'WHERE closure.id <> %s '
+        f'GROUP BY {columns} ORDER BY depth, task.id'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [task_id, max_depth, task_id])
+        rows = cursor.fetchall()
+    return [
+        dict(zip([field.name for field in fields] + ['depth'],
+                 [field.to_python(value) for field, value in zip(fields, row)] + [row[-1]]))
+        for row in rows
+    ]
+
+
+def closure_counts(task_id, direction, max_depth=MAX_DEPTH):
+    """``{depth: number of tasks}`` for the tasks reachable from ``task_id``."""
+    sql = (
+        f'{_closure_cte(direction)} '
+        f'SELECT depth, COUNT(*) FROM ('
+        f'SELECT id, MIN(depth) AS depth FROM closure WHERE id <> %s GROUP BY id'
+        f') nearest GROUP BY depth ORDER BY depth'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [task_id, max_depth, task_id])
+        return dict(cursor.fetchall())
+
+
+def depends_on(task_ids, target_id, target_level=None):
+    """
+    Whether any of ``task_ids`` depends, directly or transitively, on
+    ``target_id``. With the target's ``dependency_level``, the walk skips
+    the tasks that cannot lead to it: those of its level or lower.
+    """
+    task_ids = list(task_ids)
+    if not task_ids:
+        return False
+    table, task_column, dependency_column = _edge_table()
+    params = [*task_ids]
+    if target_level is None:
+        step = (
+            f'SELECT edge.{dependency_column} FROM {table} edge '
+            f'JOIN upstream ON edge.{task_column} = upstream.id'
+        )
+    else:
+        level_column = Task._meta.get_field('dependency_level').column
+        step = (
+            f'SELECT edge.{dependency_column} FROM {table} edge '
+            f'JOIN upstream ON edge.{task_column} = upstream.id '
+            f'JOIN {Task._meta.db_table} task ON task.id = edge.{dependency_column} '
+            f'WHERE task.{level_column} > %s OR task.id = %s'
+        )
+        params += [target_level, target_id]
+    sql = (
+        f'WITH RECURSIVE upstream(id) AS ('
+        f'SELECT id FROM {Task._meta.db_table} WHERE id IN ({_placeholders(task_ids)}) '
+        f'UNION {step}'
+        f') SELECT 1 FROM upstream WHERE id = %s LIMIT 1'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [*params, target_id])
+        return cursor.fetchone() is not None
+
+
+def creates_cycle(task, dependency_ids):
+    """
+    Whether making ``task`` depend on ``dependency_ids`` closes a cycle, i.e.
+    whether one of them already depends on ``task``. A brand new task has
+    nothing depending on it yet. Only dependencies of a higher level than
+    ``task`` can depend on it, so when there are none the graph is not
+    walked at all.
+    """
+    dependency_ids = set(dependency_ids)
+    if task is None or task.pk is None or not dependency_ids:
+        return False
+    if task.pk in dependency_ids:
+        return True
+    levels = dict(Task.objects.filter(pk__in=[task.pk, *dependency_ids]).values_list('pk', 'dependency_level'))
+    task_level = levels.get(task.pk, 0)
+    candidates = [pk for pk in dependency_ids if levels.get(pk, 0) > task_level]
+    if not candidates:
+        return False
+    return depends_on(candidates, task.pk, task_level)
+
+
+def _set_levels(levels):
+    """Store ``{task id: level}``, one UPDATE per distinct level."""
+    by_level = defaultdict(list)
+    for task_id, level in levels.items():
+        by_level[level].append(task_id)
+    for level, task_ids in by_level.items():
+        Task.objects.filter(pk__in=task_ids).update(dependency_level=level)
+
+
+def raise_levels(task_ids):
+    """
+    Raise the levels of ``task_ids``, which gained dependencies, above those
+    of their dependencies, and then of the tasks that depend on them, for
+    as long as levels change. Returns how many tasks were raised.
+    """
+    Through = Task.dependencies.through
+    frontier, seen, rounds, raised_count = set(task_ids), set(), 0, 0
+    while frontier:
+        seen |= frontier
+        rounds += 1
+        if rounds > len(seen):
+            # Each round follows one more edge; in a graph without cycles no
+            # path is longer than the tasks it reaches, while around a
+            # cycle levels would rise forever
+            break
+        raised = dict(
+            Task.objects.filter(pk__in=frontier)
+            .annotate(required=Max('dependencies__dependency_level') + 1)
+            .filter(dependency_level__lt=F('required'))
+            .values_list('pk', 'required')
+        )
+        if not raised:
+            break
+        _set_levels(raised)
+        raised_count += len(raised)
+        frontier = set(Through.objects.filter(to_task_id__in=raised).values_list('from_task_id', flat=True))
+    return raised_count
+
+
+def rebuild_dependency_levels(project_id):
+    """
+    Recompute the levels of a project's tasks from its dependencies, e.g.
+    after rows of the through model were written directly. Returns how many
+    changed.
+    """
+    current = dict(Task.objects.filter(project_id=project_id).values_list('pk', 'dependency_level'))
+    edges = Task.dependencies.through.objects.filter(
+        from_task__project_id=project_id, to_task__project_id=project_id,
+    ).values_list('from_task_id', 'to_task_id')
+    dependents = defaultdict(list)
+    waiting = dict.fromkeys(current, 0)
+    for task_id, dependency_id in edges:
+        dependents[dependency_id].append(task_id)
+        waiting[task_id] += 1
+    levels = dict.fromkeys(current, 0)
+    ready = [task_id for task_id, count in waiting.items() if not count]
+    while ready:
+        dependency_id = ready.pop()
+        for task_id in dependents[dependency_id]:
+            levels[task_id] = max(levels[task_id], levels[dependency_id] + 1)
+            waiting[task_id] -= 1
+            if not waiting[task_id]:
+                ready.append(task_id)
+    changed = {task_id: level for task_id, level in levels.items() if level != current[task_id]}
+    _set_levels(changed)
+    return len(changed)
@@ -0,0 +1,75 @@
+import datetime
+
+from django import forms
+from django.db.models import Q
+from django_filters import rest_framework as django_filters
+
+from .models import Project, ProjectImage
+
+
+class BoundingBoxField(forms.CharField):
+    """``min_lon,min_lat,max_lon,max_lat`` in degrees, as a tuple of floats."""
+
+    def clean(self, value):
+        value = super().clean(value)
+        if not value:
+            return None
+        try:
+            min_lon, min_lat, max_lon, max_lat = (float(part) for part in value.split(','))
+        except ValueError:
+            raise forms.ValidationError('Enter min_lon,min_lat,max_lon,max_lat in degrees.')
+        if not (-180 <= min_lon <= 180 and -180 <= max_lon <= 180 and -90 <= min_lat <= max_lat <= 90):
+            raise forms.ValidationError('Longitudes must be between -180 and 180, latitudes between -90 and 90 with the south first.')
+        return min_lon, min_lat, max_lon, max_lat
+
+
+class BoundingBoxFilter(django_filters.Filter):
+    field_class = BoundingBoxField
+
+    def filter(self, qs, value):
+        if value is None:
+            return qs
+        min_lon, min_lat, max_lon, max_lat = value
+        if min_lon <= max_lon:
+            longitude = Q(longitude__gte=min_lon, longitude__lte=max_lon)
+        else:
+            # The box crosses the 180th meridian
+            longitude = Q(longitude__gte=min_lon) | Q(longitude__lte=max_lon)
+        return qs.filter(longitude, latitude__gte=min_lat, latitude__lte=max_lat)
+
+
+class ProjectFilter(django_filters.FilterSet):
+    """
+    Project filters that run in the database. The completion range filters
+    rely on ProjectQuerySet.with_progress() annotations.
+    """
+    delayed = django_filters.BooleanFilter(method='filter_delayed')
+    completion_min = django_filters.NumberFilter(
+        field_name='annotated_completion_percentage', lookup_expr='gte'
+    )
+    completion_max = django_filters.NumberFilter(
+        field_name='annotated_completion_percentage', lookup_expr='lte'
+    )
+
+    class Meta:
+        model = Project
+        fields = ['status', 'project_type']
+
+    def filter_delayed(self, queryset, name, value):
+        delayed = Q(status='in_progress', expected_end_date__lt=datetime.date.today())
+        return queryset.filter(delayed) if value else queryset.exclude(delayed)
+
+
+class ProjectImageFilter(django_filters.FilterSet):
+    """
+    Photos by when and where they were taken, on the indexed columns that
+    extract_photo_metadata fills in from EXIF; no file is opened. Photos
+    without a capture time or position never match these filters.
+    """
+    taken_after = django_filters.IsoDateTimeFilter(field_name='taken_at', lookup_expr='gte')
+    taken_before = django_filters.IsoDateTimeFilter(field_name='taken_at', lookup_expr='lt')
+    bbox = BoundingBoxFilter()
+
+    class Meta:
+        model = ProjectImage
+        fields = ['project', 'device']
@@ -0,0 +1,157 @@
+"""
+Web variants of uploaded project images.
+
+``render_variants`` turns an uploaded photo into JPEG re-encodes at a few
+display sizes, upright and without the camera's EXIF block (GPS position,
+device and so on). The original upload is kept as it is.
+
+A phone photo is decoded once. For JPEGs the decoder's draft mode scales
+by 1/2, 1/4 or 1/8 while decoding, so a 12MP photo is decoded at 2000x1500
+for the 1600 pixel web variant instead of in full. Each variant is scaled
+down from the one before it, and the orientation is applied after the
+first downscale rather than to the full frame. The module only needs
+Pillow, so it can run in the job worker's process pool.
+
+``read_metadata`` reads when, where and on what a photo was taken from the
+original's EXIF block, without decoding the picture.
+"""
+
+import datetime
+import io
+import math
+
+from PIL import ExifTags, Image
+
+# (name, longest side in pixels, JPEG quality), largest first
+VARIANTS = (
+    ('web', 1600, 82),
+    ('medium', 800, 80),
+    ('thumbnail', 320, 75),
+)
+
+# How to turn the stored pixels upright for each EXIF orientation
+_ORIENTATIONS = {
+    2: Image.Transpose.FLIP_LEFT_RIGHT,
+    3: Image.Transpose.ROTATE_180,
+    4: Image.Transpose.FLIP_TOP_BOTTOM,
+    5: Image.Transpose.TRANSPOSE,
+    6: Image.Transpose.ROTATE_270,
+    7: Image.Transpose.TRANSVERSE,
+    8: Image.Transpose.ROTATE_90,
+}
+# Orientations that turn the picture a quarter turn
+_TRANSPOSED = {5, 6, 7, 8}
+
+
+def _rgb(picture):
+    if picture.mode == 'RGB':
+        return picture
+    if picture.mode in ('RGBA', 'LA') or 'transparency' in picture.info:
+        # JPEG has no alpha channel: flatten onto white
+        picture = picture.convert('RGBA')
+        background = Image.new('RGB', picture.size, (255, 255, 255))
+        background.paste(picture, mask=picture.getchannel('A'))
+        return background
+    return picture.convert('RGB')
+
+
+def _encode(picture, quality, icc_profile):
+    buffer = io.BytesIO()
+    # No exif= argument, so none of the original metadata is written; the
+    # colour profile is kept so that wide-gamut photos keep their colours
+    picture.save(buffer, 'JPEG', quality=quality, optimize=True, progressive=True, icc_profile=icc_profile)
+    return buffer.getvalue()
+
+
+def render_variants(file):
+    """
+    ``((width, height), {name: jpeg_bytes})`` for an image file, with the
+    size as displayed (after the EXIF orientation).
+    """
+    with Image.open(file) as picture:
+        width, height = picture.size
+        orientation = picture.getexif().get(0x0112)
+        if orientation in _TRANSPOSED:
+            width, height = height, width
+        icc_profile = picture.info.get('icc_profile')
+
+        # The largest variant's size in the stored orientation; draft only
+        # scales down while both sides stay at least this big
+        largest = VARIANTS[0][1]
+        scale = min(1, largest / max(picture.size))
+        picture.draft('RGB', (round(picture.width * scale), round(picture.height * scale)))
+        current = _rgb(picture)
+        current.load()
+
+    variants = {}
+    for name, longest, quality in VARIANTS:
+        current.thumbnail((longest, longest), Image.LANCZOS, reducing_gap=3.0)
+        if not variants and orientation in _ORIENTATIONS:
+            current = current.transpose(_ORIENTATIONS[orientation])
+        variants[name] = _encode(current, quality, icc_profile)
+    return (width, height), variants
+
+
+def _text(value):
+    if isinstance(value, bytes):
+        value = value.decode('ascii', 'ignore')
+    return value.replace('\0', '').strip() if isinstance(value, str) else ''
+
+
+def _degrees(value, ref):
+    try:
+        degrees, minutes, seconds = (float(part) for part in value)
+    except (TypeError, ValueError, ZeroDivisionError):
+        return None
+    degrees += minutes / 60 + seconds / 3600
+    if not math.isfinite(degrees):
+        return None
+    return -degrees if _text(ref).upper() in ('S', 'W') else degrees
+
+
+def _taken_at(exif, exif_ifd, gps):
+    """
+    The capture time: aware when the camera recorded its UTC offset or a GPS
+    fix time (which is UTC), otherwise naive local time.
+    """
+    value = _text(exif_ifd.get(ExifTags.Base.DateTimeOriginal) or exif.get(ExifTags.Base.DateTime))
+    try:
+        taken_at = datetime.datetime.strptime(value, '%Y:%m:%d %H:%M:%S')
+    except ValueError:
+        return None
+    offset = _text(exif_ifd.get(ExifTags.Base.OffsetTimeOriginal))
+    try:
+        return taken_at.replace(tzinfo=datetime.datetime.strptime(offset, '%z').tzinfo)
+    except ValueError:
+        pass
+    try:
+        date = datetime.datetime.strptime(_text(gps[ExifTags.GPS.GPSDateStamp]), '%Y:%m:%d')
+        hours, minutes, seconds = (float(part) for part in gps[ExifTags.GPS.GPSTimeStamp])
+        return (date + datetime.timedelta(hours=hours, minutes=minutes, seconds=int(seconds))).replace(
+            tzinfo=datetime.timezone.utc,
+        )
+    except (KeyError, TypeError, ValueError, ZeroDivisionError, OverflowError):
+        return taken_at
+
+
+def read_metadata(file):
+    """
+    ``{'taken_at', 'latitude', 'longitude', 'device'}`` from an image's EXIF
+    block; each is None (``''`` for the device) when the photo does not
+    record it.
+    """
+    with Image.open(file) as picture:
+        exif = picture.getexif()
+        exif_ifd = exif.get_ifd(ExifTags.IFD.Exif)
+        gps = exif.get_ifd(ExifTags.IFD.GPSInfo)
+    latitude = _degrees(gps.get(ExifTags.GPS.GPSLatitude), gps.get(ExifTags.GPS.GPSLatitudeRef))
+    longitude = _degrees(gps.get(ExifTags.GPS.GPSLongitude), gps.get(ExifTags.GPS.GPSLongitudeRef))
+    if latitude is None or longitude is None or not (-90 <= latitude <= 90 and -180 <= longitude <= 180) \
+            or (latitude == 0 and longitude == 0):
+        # 0, 0 is what some phones write without a fix
+        latitude = longitude = None
+
+    make = _text(exif.get(ExifTags.Base.Make))
+    model = _text(exif.get(ExifTags.Base.Model))
+    device = model if model.lower().startswith(make.lower()) else f'{make} {model}'.strip()
+    return {'taken_at': _taken_at(exif, exif_ifd, gps), 'latitude': latitude, 'longitude': longitude, 'device': device}
@@ -0,0 +1,51 @@
+import os
+
+from django.core.files.base import ContentFile
+from django.utils import timezone
+
+from jobs.registry import job
+from .images import VARIANTS, read_metadata, render_variants
+from .models import ProjectImage
+
+VARIANT_FIELDS = [name for name, _, _ in VARIANTS]
+
+
+@job(pool='process', timeout=120)
+def process_project_image(image_id):
+    """Render the image's variants and record its displayed size."""
+    project_image = ProjectImage.objects.filter(pk=image_id).first()
+    if project_image is None:
+        # Deleted before the job ran
+        return
+    # The same file attached again (images are content-addressed) already
+    # has its variants
+    processed = ProjectImage.objects.filter(image=project_image.image.name).exclude(
+        pk=image_id,
+    ).exclude(thumbnail='').values('width', 'height', *VARIANT_FIELDS).first()
+    if processed is not None:
+        for field, value in processed.items():
+            setattr(project_image, field, value)
+    else:
+        with project_image.image.open('rb') as file:
+            (project_image.width, project_image.height), variants = render_variants(file)
+        stem = os.path.splitext(os.path.basename(project_image.image.name))[0]
+        for name, data in variants.items():
+            getattr(project_image, name).save(f'{stem}_{name}.jpg', ContentFile(data), save=False)
+    # A full save keeps the blobs' reference counts
+    project_image.save(update_fields=['width', 'height', *VARIANT_FIELDS])
+
+
+@job()
+def extract_photo_metadata(image_id):
+    """Record when, where and on what the photo was taken from its EXIF block."""
+    project_image = ProjectImage.objects.filter(pk=image_id).first()
+    if project_image is None:
+        return
+    with project_image.image.open('rb') as file:
+        metadata = read_metadata(file)
+    if metadata['taken_at'] is not None and timezone.is_naive(metadata['taken_at']):
+        # No offset recorded: the camera's clock is taken to be in TIME_ZONE
+        metadata['taken_at'] = timezone.make_aware(metadata['taken_at'])
+    metadata['device'] = metadata['device'][:ProjectImage._meta.get_field('device').max_length]
+    # Only these columns, so a variants job saving at the same time is not undone
+    ProjectImage.objects.filter(pk=image_id).update(**metadata)
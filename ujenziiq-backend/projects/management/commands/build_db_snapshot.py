@@ -0,0 +1,39 @@
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from ujenziiq.snapshot import build_snapshot, supports_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Builds a migrated (optionally seeded) SQLite image that is loaded into memory on startup'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output',
+            default=settings.DB_SNAPSHOT_PATH,
+            help='Where to write the snapshot (defaults to DB_SNAPSHOT_PATH)',
+        )
+        parser.add_argument(
+            '--seed',
+            action='store_true',
+            help='Load the create_sample_data fixtures into the snapshot',
+        )
+
+    def handle(self, *args, **options):
+        if not supports_snapshot(connection):
+            raise CommandError('Snapshots can only be built from the in-memory SQLite database')
+
+        call_command('migrate', run_syncdb=True, interactive=False, verbosity=0)
+        if options['seed']:
+            call_command('create_sample_data', stdout=StringIO())
+
+        output = str(options['output'])
+        build_snapshot(output, connection)
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Database snapshot written to {output}')
+        )
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from jobs.queue import enqueue
+from projects.jobs import extract_photo_metadata
+from projects.models import ProjectImage
+
+
+class Command(BaseCommand):
+    help = 'Queues EXIF extraction (capture time, position, device) for images that have none recorded'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Read every image again')
+
+    def handle(self, *args, **options):
+        images = ProjectImage.objects.all()
+        if not options['all']:
+            images = images.filter(taken_at__isnull=True, latitude__isnull=True, device='')
+        count = 0
+        for image_id in images.values_list('pk', flat=True).iterator():
+            enqueue(extract_photo_metadata, image_id)
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f'Queued {count} images'))
@@ -0,0 +1,70 @@
+"""
+Uploaded media for signed-in users, served by ``blobs.serve`` in production.
+
+A project image and its variants, or a project video, are visible to the project's manager,
+client and team members, profile images to any signed-in user, and
+everything to staff. Other files under the media root, such as partial
+uploads, are never served. Browsers cannot add an ``Authorization`` header
+to ``<img>`` and ``<video>`` requests, so the access token may also be
+passed as ``?token=``.
+"""
+
+from django.contrib.auth import get_user_model
+from django.db.models import Q
+from django.http import Http404, JsonResponse
+from django.views.decorators.http import require_safe
+from rest_framework import status
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+
+from blobs.serve import serve_file
+from blobs.storage import blob_storage
+from .models import ProjectImage
+
+User = get_user_model()
+
+IMAGE_FILE_FIELDS = ('image', 'thumbnail', 'medium', 'web')
+
+
+def _authenticate(request):
+    authentication = JWTAuthentication()
+    try:
+        result = authentication.authenticate(request)
+        if result is not None:
+            return result[0]
+        raw_token = request.GET.get('token')
+        if raw_token:
+            return authentication.get_user(authentication.get_validated_token(raw_token.encode()))
+    except (InvalidToken, AuthenticationFailed):
+        pass
+    return None
+
+
+def can_view(user, name):
+    images = ProjectImage.objects.filter(
+        Q(image=name) | Q(video=name) | Q(thumbnail=name) | Q(medium=name) | Q(web=name)
+    )
+    if not user.is_staff:
+        images = images.filter(
+            Q(project__project_manager=user) |
+            Q(project__client=user) |
+            Q(project__team_members=user)
+        )
+    return images.exists() or User.objects.filter(profile_image=name).exists()
+
+
+@require_safe
+def serve_media(request, name):
+    user = _authenticate(request)
+    if user is None:
+        return JsonResponse(
+            {'error': 'Authentication credentials were not provided'}, status=status.HTTP_401_UNAUTHORIZED,
+            headers={'WWW-Authenticate': JWTAuthentication().authenticate_header(request)},
+        )
+    if not can_view(user, name):
+        raise Http404
+    response = serve_file(request, blob_storage, name)
+    if response is None:
+        raise Http404
+    return response
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.4 on 2026-10-18 06:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='project',
+            index=models.Index(fields=['created_at', 'id'], name='projects_pr_created_3ed563_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='safety',
+            index=models.Index(fields=['date_occurred', 'id'], name='projects_sa_date_oc_1b562f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['due_date', 'id'], name='projects_ta_due_dat_d75709_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.4 on 2026-10-18 07:11
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0003_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProjectSchedule',
+            fields=[
+                ('project', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='schedule', serialize=False, to='projects.project')),
+                ('project_start', models.DateField(blank=True, null=True)),
+                ('project_finish', models.DateField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TaskSchedule',
+            fields=[
+                ('task', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='schedule', serialize=False, to='projects.task')),
+                ('early_start', models.DateField()),
+                ('early_finish', models.DateField()),
+                ('late_start', models.DateField()),
+                ('late_finish', models.DateField()),
+                ('total_float', models.IntegerField()),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='task_schedules', to='projects.project')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['project', 'early_start', 'task'], name='projects_ta_project_8f6881_idx')],
+            },
+        ),
+    ]
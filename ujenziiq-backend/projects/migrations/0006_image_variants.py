@@ -0,0 +1,28 @@
+# Generated by Django 4.2.4 on 2026-10-18 07:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0005_image_dimensions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='projectimage',
+            name='medium',
+            field=models.ImageField(blank=True, editable=False, upload_to='project_images/variants/'),
+        ),
+        migrations.AddField(
+            model_name='projectimage',
+            name='thumbnail',
+            field=models.ImageField(blank=True, editable=False, upload_to='project_images/variants/'),
+        ),
+        migrations.AddField(
+            model_name='projectimage',
+            name='web',
+            field=models.ImageField(blank=True, editable=False, upload_to='project_images/variants/'),
+        ),
+    ]
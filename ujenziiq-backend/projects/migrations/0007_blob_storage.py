@@ -0,0 +1,34 @@
+# Generated by Django 4.2.4 on 2026-10-18 08:05
+
+import blobs.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0006_image_variants'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='projectimage',
+            name='image',
+            field=models.ImageField(storage=blobs.storage.ContentAddressedStorage(), upload_to='project_images/'),
+        ),
+        migrations.AlterField(
+            model_name='projectimage',
+            name='medium',
+            field=models.ImageField(blank=True, editable=False, storage=blobs.storage.ContentAddressedStorage(), upload_to='project_images/variants/'),
+        ),
+        migrations.AlterField(
+            model_name='projectimage',
+            name='thumbnail',
+            field=models.ImageField(blank=True, editable=False, storage=blobs.storage.ContentAddressedStorage(), upload_to='project_images/variants/'),
+        ),
+        migrations.AlterField(
+            model_name='projectimage',
+            name='web',
+            field=models.ImageField(blank=True, editable=False, storage=blobs.storage.ContentAddressedStorage(), upload_to='project_images/variants/'),
+        ),
+    ]
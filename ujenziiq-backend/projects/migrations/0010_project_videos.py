@@ -0,0 +1,24 @@
+# Generated by Django 4.2.4 on 2026-10-18 08:58
+
+import blobs.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0009_photo_metadata'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='projectimage',
+            name='video',
+            field=models.FileField(blank=True, db_index=True, storage=blobs.storage.ContentAddressedStorage(), upload_to='project_videos/'),
+        ),
+        migrations.AlterField(
+            model_name='projectimage',
+            name='image',
+            field=models.ImageField(blank=True, db_index=True, storage=blobs.storage.ContentAddressedStorage(), upload_to='project_images/'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 4.2.4 on 2026-10-18 09:07
+
+from collections import defaultdict
+
+from django.db import migrations, models
+
+
+def compute_dependency_levels(apps, schema_editor):
+    """Level every existing task one above the highest of its dependencies."""
+    Task = apps.get_model('projects', 'Task')
+    Through = Task.dependencies.through
+
+    dependents = defaultdict(list)
+    waiting = dict.fromkeys(Task.objects.values_list('pk', flat=True), 0)
+    for task_id, dependency_id in Through.objects.values_list('from_task_id', 'to_task_id'):
+        dependents[dependency_id].append(task_id)
+        waiting[task_id] += 1
+    levels = dict.fromkeys(waiting, 0)
+    ready = [task_id for task_id, count in waiting.items() if not count]
+    while ready:
+        dependency_id = ready.pop()
+        for task_id in dependents[dependency_id]:
+            levels[task_id] = max(levels[task_id], levels[dependency_id] + 1)
+            waiting[task_id] -= 1
+            if not waiting[task_id]:
+                ready.append(task_id)
+
+    by_level = defaultdict(list)
+    for task_id, level in levels.items():
+        if level:
+            by_level[level].append(task_id)
+    for level, task_ids in by_level.items():
+        Task.objects.filter(pk__in=task_ids).update(dependency_level=level)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0010_project_videos'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='dependency_level',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(compute_dependency_levels, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,44 @@
 from django.db import models
+from django.db.models import BooleanField, Case, Count, ExpressionWrapper, F, IntegerField, Q, Value, When
 from django.conf import settings
 from django.utils.text import slugify
+import datetime
+import mimetypes
 import uuid
 
+from blobs.storage import blob_storage
+
+
+class ProjectQuerySet(models.QuerySet):
+    def with_progress(self):
+        """
+        Annotate task progress and delay status so that list endpoints get
+        them in the same query instead of two COUNTs per project.
+        """
+        return self.annotate(
+            annotated_task_count=Count('tasks', distinct=True),
+            annotated_completed_task_count=Count(
+                'tasks', filter=Q(tasks__status='completed'), distinct=True
+            ),
+        ).annotate(
+            annotated_completion_percentage=Case(
+                When(
+                    annotated_task_count__gt=0,
+                    then=ExpressionWrapper(
+                        F('annotated_completed_task_count') * 100 / F('annotated_task_count'),
+                        output_field=IntegerField(),
+                    ),
+                ),
+                default=Value(0),
+                output_field=IntegerField(),
+            ),
+            annotated_is_delayed=ExpressionWrapper(
+                Q(status='in_progress', expected_end_date__lt=datetime.date.today()),
+                output_field=BooleanField(),
+            ),
+        )
+
+
 class Project(models.Model):
     """
     Main project model for construction projects
@@ -41,6 +77,8 @@ class Project(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = ProjectQuerySet.as_manager()
+    
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
@@ -52,8 +90,16 @@ class Project(models.Model):
     def __str__(self):
         return self.name
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id']),
+        ]
+    
     @property
     def completion_percentage(self):
+        # Use the value from ProjectQuerySet.with_progress() when present
+        if hasattr(self, 'annotated_completion_percentage'):
+            return self.annotated_completion_percentage
         completed_tasks = self.tasks.filter(status='completed').count()
         total_tasks = self.tasks.count()
         if total_tasks > 0:
@@ -62,7 +108,8 @@ class Project(models.Model):
     
     @property
     def is_delayed(self):
-        import datetime
+        if hasattr(self, 'annotated_is_delayed'):
+            return bool(self.annotated_is_delayed)
         return self.status == 'in_progress' and self.expected_end_date < datetime.date.today()
 
 
@@ -93,6 +140,9 @@ class Task(models.Model):
     due_date = models.DateField()
     assignees = models.ManyToManyField(settings.AUTH_USER_MODEL, related_name='assigned_tasks')
     dependencies = models.ManyToManyField('self', symmetrical=False, blank=True, related_name='dependent_tasks')
+    # Higher than the level of every task it depends on, so a task can only
+    # depend on tasks of lower level (see projects.dependency_graph)
+    dependency_level = models.PositiveIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -101,6 +151,43 @@ class Task(models.Model):
     
     class Meta:
         ordering = ['due_date', 'priority']
+        indexes = [
+            models.Index(fields=['due_date', 'id']),
+        ]
+
+
+class ProjectSchedule(models.Model):
+    """
+    Marks a project whose task schedule has been computed and stored
+    """
+    project = models.OneToOneField(Project, on_delete=models.CASCADE, primary_key=True, related_name='schedule')
+    project_start = models.DateField(null=True, blank=True)
+    project_finish = models.DateField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Schedule - {self.project.name}"
+
+
+class TaskSchedule(models.Model):
+    """
+    Critical path dates of a task, kept up to date incrementally
+    """
+    task = models.OneToOneField(Task, on_delete=models.CASCADE, primary_key=True, related_name='schedule')
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='task_schedules')
+    early_start = models.DateField()
+    early_finish = models.DateField()
+    late_start = models.DateField()
+    late_finish = models.DateField()
+    total_float = models.IntegerField()
+
+    def __str__(self):
+        return f"Schedule - {self.task.name}"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['project', 'early_start', 'task']),
+        ]
 
 
 class Material(models.Model):
@@ -183,21 +270,57 @@ class Safety(models.Model):
     
     def __str__(self):
         return f"{self.title} - {self.project.name}"
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['date_occurred', 'id']),
+        ]
 
 
 class ProjectImage(models.Model):
     """
-    Images related to projects, tasks, or incidents
+    Images related to projects, tasks, or incidents. Inspection videos are
+    kept here too, in ``video`` instead of ``image``; each row has one of the two
     """
     project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='images')
     title = models.CharField(max_length=255)
     description = models.TextField(blank=True, null=True)
-    image = models.ImageField(upload_to='project_images/')
+    image = models.ImageField(upload_to='project_images/', storage=blob_storage, blank=True, db_index=True)
+    video = models.FileField(upload_to='project_videos/', storage=blob_storage, blank=True, db_index=True)
     uploaded_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     upload_date = models.DateTimeField(auto_now_add=True)
+    # Filled in by the process_project_image job after upload: the size as
+    # displayed and the re-encodes from projects.images.VARIANTS
+    width = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    height = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    thumbnail = models.ImageField(upload_to='project_images/variants/', storage=blob_storage, blank=True, editable=False,
+                                  db_index=True)
+    medium = models.ImageField(upload_to='project_images/variants/', storage=blob_storage, blank=True, editable=False,
+                               db_index=True)
+    web = models.ImageField(upload_to='project_images/variants/', storage=blob_storage, blank=True, editable=False,
+                            db_index=True)
+    # Read once from the original's EXIF block by the extract_photo_metadata
+    # job, so photos can be found by when and where they were taken
+    taken_at = models.DateTimeField(null=True, blank=True, editable=False)
+    latitude = models.FloatField(null=True, blank=True, editable=False)
+    longitude = models.FloatField(null=True, blank=True, editable=False)
+    device = models.CharField(max_length=100, blank=True, editable=False)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['project', 'taken_at']),
+            models.Index(fields=['taken_at']),
+            models.Index(fields=['latitude', 'longitude']),
+        ]
     
     def __str__(self):
         return self.title
+    
+    @staticmethod
+    def file_field_for(filename):
+        """The field a file of this name is kept in: ``video`` for videos, ``image`` otherwise."""
+        content_type, _ = mimetypes.guess_type(filename)
+        return 'video' if content_type and content_type.startswith('video/') else 'image'
 
 
 class ProgressReport(models.Model):
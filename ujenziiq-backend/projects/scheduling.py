@@ -0,0 +1,431 @@
+"""
+Critical path scheduling over ``Task.dependencies``.
+
+A project's task graph is loaded with one query per table into flat,
+index-based adjacency lists. Dates are handled as ordinals so that the
+forward and backward passes are plain integer arithmetic, which keeps
+projects with tens of thousands of tasks and hundreds of thousands of
+dependencies well under a second.
+
+A task's duration is ``due_date - start_date`` in days and its
+``start_date`` acts as a "start no earlier than" constraint. Dependencies
+are finish-to-start: a task can start on the day its predecessors finish.
+
+Computed schedules are stored in ``TaskSchedule`` rows. When a task's dates
+or dependencies change, ``reschedule_task`` only revisits the tasks whose
+dates actually move instead of recomputing the whole project.
+"""
+
+import datetime
+
+from django.db import transaction
+from django.db.models import Min
+
+from .models import ProjectSchedule, Task, TaskSchedule
+
+BATCH_SIZE = 1000
+
+
+def _duration(start_date, due_date):
+    return max(due_date.toordinal() - start_date.toordinal(), 0)
+
+
+def _ordinal(value):
+    return None if value is None else value.toordinal()
+
+
+class ScheduleCycleError(Exception):
+    """The dependency graph contains a cycle, so it cannot be scheduled."""
+
+    def __init__(self, task_ids):
+        self.task_ids = task_ids
+        super().__init__(f"Task dependencies contain a cycle involving {len(task_ids)} task(s)")
+
+
+class TaskGraph:
+    """
+    Tasks of one project as parallel lists indexed by position, with
+    predecessor / successor adjacency lists of positions.
+    """
+
+    def __init__(self, task_ids, starts, durations, edges=()):
+        self.task_ids = list(task_ids)
+        self.starts = list(starts)
+        self.durations = list(durations)
+        self.index = {task_id: position for position, task_id in enumerate(self.task_ids)}
+        self.predecessors = [[] for _ in self.task_ids]
+        self.successors = [[] for _ in self.task_ids]
+        for task_id, dependency_id in edges:
+            self.add_edge(task_id, dependency_id)
+
+    def add_edge(self, task_id, dependency_id):
+        """``task_id`` depends on ``dependency_id``; edges leaving the project are ignored."""
+        task = self.index.get(task_id)
+        dependency = self.index.get(dependency_id)
+        if task is None or dependency is None:
+            return
+        self.predecessors[task].append(dependency)
+        self.successors[dependency].append(task)
+
+    def __len__(self):
+        return len(self.task_ids)
+
+    @classmethod
+    def for_project(cls, project_id):
+        """
+        Load the graph with one query for the tasks and one for the edges.
+        A single joined query would repeat every task's dates once per
+        dependency, which is much slower on large graphs.
+        """
+        tasks = Task.objects.filter(project_id=project_id).values_list('pk', 'start_date', 'due_date')
+        task_ids, starts, durations = [], [], []
+        for task_id, start_date, due_date in tasks.iterator(chunk_size=10000):
+            task_ids.append(task_id)
+            starts.append(start_date.toordinal())
+            durations.append(_duration(start_date, due_date))
+
+        edges = Task.dependencies.through.objects.filter(
+            from_task__project_id=project_id
+        ).values_list('from_task_id', 'to_task_id')
+        return cls(task_ids, starts, durations, edges.iterator(chunk_size=10000))
+
+    def topological_order(self):
+        """Kahn's algorithm; raises ScheduleCycleError if the graph has a cycle."""
+        in_degree = [len(predecessors) for predecessors in self.predecessors]
+        order = [position for position, degree in enumerate(in_degree) if degree == 0]
+        successors = self.successors
+        for position in order:
+            for successor in successors[position]:
+                in_degree[successor] -= 1
+                if in_degree[successor] == 0:
+                    order.append(successor)
+        if len(order) != len(self.task_ids):
+            raise ScheduleCycleError(
+                [self.task_ids[position] for position, degree in enumerate(in_degree) if degree > 0]
+            )
+        return order
+
+
+class Schedule:
+    """Early/late start and finish (as ordinals) and total float per task."""
+
+    def __init__(self, graph, order, early_start, early_finish, late_start, late_finish):
+        self.graph = graph
+        self.order = order
+        self.early_start = early_start
+        self.early_finish = early_finish
+        self.late_start = late_start
+        self.late_finish = late_finish
+
+    def total_float(self, position):
+        return self.late_start[position] - self.early_start[position]
+
+    @property
+    def project_start(self):
+        return min(self.early_start, default=None)
+
+    @property
+    def project_finish(self):
+        return max(self.early_finish, default=None)
+
+    def critical_path(self):
+        return [self.graph.task_ids[p] for p in self.order if self.late_start[p] == self.early_start[p]]
+
+    def as_rows(self, critical_only=False):
+        from_ordinal = datetime.date.fromordinal
+        rows = []
+        for position in self.order:
+            total_float = self.late_start[position] - self.early_start[position]
+            if critical_only and total_float:
+                continue
+            rows.append({
+                'task': self.graph.task_ids[position],
+                'duration': self.graph.durations[position],
+                'early_start': from_ordinal(self.early_start[position]),
+                'early_finish': from_ordinal(self.early_finish[position]),
+                'late_start': from_ordinal(self.late_start[position]),
+                'late_finish': from_ordinal(self.late_finish[position]),
+                'total_float': total_float,
+                'is_critical': total_float == 0,
+            })
+        return rows
+
+
+def compute_schedule(graph):
+    """Forward and backward pass of the critical path method."""
+    order = graph.topological_order()
+    durations, predecessors, successors = graph.durations, graph.predecessors, graph.successors
+
+    early_start = list(graph.starts)
+    early_finish = [0] * len(graph)
+    for position in order:
+        start = early_start[position]
+        for predecessor in predecessors[position]:
+            if early_finish[predecessor] > start:
+                start = early_finish[predecessor]
+        early_start[position] = start
+        early_finish[position] = start + durations[position]
+
+    project_finish = max(early_finish, default=0)
+    late_finish = [project_finish] * len(graph)
+    late_start = [0] * len(graph)
+    for position in reversed(order):
+        finish = late_finish[position]
+        for successor in successors[position]:
+            if late_start[successor] < finish:
+                finish = late_start[successor]
+        late_finish[position] = finish
+        late_start[position] = finish - durations[position]
+
+    return Schedule(graph, order, early_start, early_finish, late_start, late_finish)
+
+
+def schedule_project(project_id):
+    return compute_schedule(TaskGraph.for_project(project_id))
+
+
+class _Recompute(Exception):
+    """The incremental update cannot be applied, or would cost more than recomputing."""
+
+
+def refresh_project_schedule(project_id):
+    """Recompute the whole schedule of a project and store it."""
+    try:
+        schedule = schedule_project(project_id)
+    except ScheduleCycleError:
+        invalidate_project_schedule(project_id)
+        raise
+
+    graph = schedule.graph
+    from_ordinal = datetime.date.fromordinal
+    rows = (
+        TaskSchedule(
+            task_id=graph.task_ids[position],
+            project_id=project_id,
+            early_start=from_ordinal(schedule.early_start[position]),
+            early_finish=from_ordinal(schedule.early_finish[position]),
+            late_start=from_ordinal(schedule.late_start[position]),
+            late_finish=from_ordinal(schedule.late_finish[position]),
+            total_float=schedule.total_float(position),
+        )
+        for position in schedule.order
+    )
+    project_start, project_finish = schedule.project_start, schedule.project_finish
+    with transaction.atomic():
+        TaskSchedule.objects.filter(project_id=project_id).delete()
+        TaskSchedule.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+        ProjectSchedule.objects.update_or_create(project_id=project_id, defaults={
+            'project_start': from_ordinal(project_start) if project_start else None,
+            'project_finish': from_ordinal(project_finish) if project_finish else None,
+        })
+    return schedule
+
+
+def invalidate_project_schedule(project_id):
+    """Drop the stored schedule; it is recomputed on the next read."""
+    ProjectSchedule.objects.filter(project_id=project_id).delete()
+
+
+def get_project_schedule(project_id, refresh=False):
+    """The stored ProjectSchedule, computing it first if there is none."""
+    project_schedule = None if refresh else ProjectSchedule.objects.filter(project_id=project_id).first()
+    if project_schedule is None:
+        refresh_project_schedule(project_id)
+        project_schedule = ProjectSchedule.objects.get(project_id=project_id)
+    return project_schedule
+
+
+class _Propagation:
+    """
+    Stored schedule rows of the tasks an incremental update visits, with the
+    recomputed dates applied on top. Dates are only pushed on to the
+    neighbours of tasks whose dates actually changed, one round of queries
+    per step, so an update touches the affected tasks rather than everything
+    reachable from the edited one.
+    """
+
+    def __init__(self, project_id):
+        self.project_id = project_id
+        self.tasks = {}
+        self.original = {}
+        self.rows = {}
+        self.task_count = None
+        self.visits = 0
+
+    def load(self, task_ids):
+        """Load the tasks not seen yet; tasks of other projects are dropped."""
+        missing = [task_id for task_id in task_ids if task_id not in self.tasks]
+        if missing:
+            tasks = Task.objects.filter(pk__in=missing, project_id=self.project_id).values_list(
+                'pk', 'start_date', 'due_date', 'schedule__early_start', 'schedule__early_finish',
+                'schedule__late_start', 'schedule__late_finish',
+            )
+            for task_id, start_date, due_date, *dates in tasks:
+                self.tasks[task_id] = (start_date.toordinal(), _duration(start_date, due_date))
+                stored = None if dates[0] is None else [_ordinal(date) for date in dates]
+                self.original[task_id] = stored
+                self.rows[task_id] = list(stored) if stored else [None] * 4
+        return [task_id for task_id in task_ids if task_id in self.tasks]
+
+    def visit(self, frontier):
+        # Past this point recomputing the whole project is cheaper. It also
+        # stops values from chasing each other around a dependency cycle.
+        self.visits += len(frontier)
+        if self.visits <= 64:
+            return
+        if self.task_count is None:
+            self.task_count = Task.objects.filter(project_id=self.project_id).count()
+        if self.visits > self.task_count:
+            raise _Recompute()
+
+    def _date(self, task_id, index, stored):
+        if task_id in self.rows:
+            # None: not computed yet this round, it is revisited once it is
+            return self.rows[task_id][index]
+        if stored is None:
+            raise _Recompute()
+        return stored.toordinal()
+
+    def forward(self, task_id):
+        """Early dates of the task and the downstream tasks they move."""
+        through = Task.dependencies.through.objects
+        frontier = [task_id]
+        while frontier:
+            self.visit(frontier)
+            frontier = self.load(frontier)
+            starts = {task: self.tasks[task][0] for task in frontier}
+            edges = through.filter(from_task_id__in=frontier).values_list(
+                'from_task_id', 'to_task_id', 'to_task__project_id', 'to_task__schedule__early_finish',
+            )
+            for task, dependency, dependency_project_id, stored in edges:
+                if dependency_project_id != self.project_id:
+                    continue
+                finish = self._date(dependency, 1, stored)
+                if finish is not None and finish > starts[task]:
+                    starts[task] = finish
+
+            changed = []
+            for task in frontier:
+                row = self.rows[task]
+                start = starts[task]
+                if row[0] != start or row[1] != start + self.tasks[task][1]:
+                    row[0], row[1] = start, start + self.tasks[task][1]
+                    changed.append(task)
+            frontier = list(set(through.filter(to_task_id__in=changed).values_list('from_task_id', flat=True)))
+
+    def backward(self, task_ids, project_finish):
+        """Late dates of the tasks and the upstream tasks they move."""
+        through = Task.dependencies.through.objects
+        frontier = list(task_ids)
+        while frontier:
+            self.visit(frontier)
+            frontier = self.load(frontier)
+            finishes = {task: project_finish for task in frontier}
+            edges = through.filter(to_task_id__in=frontier).values_list(
+                'to_task_id', 'from_task_id', 'from_task__project_id', 'from_task__schedule__late_start',
+            )
+            for task, successor, successor_project_id, stored in edges:
+                if successor_project_id != self.project_id:
+                    continue
+                start = self._date(successor, 2, stored)
+                if start is not None and start < finishes[task]:
+                    finishes[task] = start
+
+            changed = []
+            for task in frontier:
+                row = self.rows[task]
+                finish = finishes[task]
+                if row[3] != finish or row[2] != finish - self.tasks[task][1]:
+                    row[2], row[3] = finish - self.tasks[task][1], finish
+                    changed.append(task)
+            frontier = list(set(through.filter(from_task_id__in=changed).values_list('to_task_id', flat=True)))
+
+    def changed(self):
+        return [task for task, row in self.rows.items() if row != self.original[task]]
+
+
+def _moves_project_finish(propagation, project_schedule):
+    """
+    Whether the early dates computed so far move the project finish. Late
+    dates are measured back from it, so if it moves all of them shift.
+    """
+    finish = _ordinal(project_schedule.project_finish)
+    changed = propagation.changed()
+    finishes = [propagation.rows[task][1] for task in changed]
+    if any(value > finish for value in finishes):
+        return True
+    if finish in finishes:
+        return False
+    was_last = [task for task in changed if (propagation.original[task] or [None] * 4)[1] == finish]
+    return bool(was_last) and not TaskSchedule.objects.filter(
+        project_id=project_schedule.project_id, early_finish=project_schedule.project_finish,
+    ).exclude(task_id__in=changed).exists()
+
+
+def _apply_incremental(project_schedule, task_id, changed_dependencies):
+    project_id = project_schedule.project_id
+    if project_schedule.project_finish is None:
+        raise _Recompute()
+
+    propagation = _Propagation(project_id)
+    propagation.forward(task_id)
+    if _moves_project_finish(propagation, project_schedule):
+        refresh_project_schedule(project_id)
+        return None
+    # A task's late dates only depend on its successors, so besides the
+    # edited task only the dependencies that were added or removed can move
+    propagation.backward({task_id, *changed_dependencies}, _ordinal(project_schedule.project_finish))
+
+    from_ordinal = datetime.date.fromordinal
+    created, updated = [], []
+    for task in propagation.changed():
+        row = propagation.rows[task]
+        if None in row:
+            raise _Recompute()
+        schedule = TaskSchedule(
+            task_id=task, project_id=project_id,
+            early_start=from_ordinal(row[0]), early_finish=from_ordinal(row[1]),
+            late_start=from_ordinal(row[2]), late_finish=from_ordinal(row[3]),
+            total_float=row[2] - row[0],
+        )
+        (updated if propagation.original[task] else created).append(schedule)
+
+    TaskSchedule.objects.bulk_create(created, batch_size=BATCH_SIZE)
+    TaskSchedule.objects.bulk_update(
+        updated, ['early_start', 'early_finish', 'late_start', 'late_finish', 'total_float'],
+        batch_size=BATCH_SIZE,
+    )
+    project_start = TaskSchedule.objects.filter(project_id=project_id).aggregate(start=Min('early_start'))['start']
+    if project_start != project_schedule.project_start:
+        project_schedule.project_start = project_start
+        project_schedule.save(update_fields=['project_start', 'updated_at'])
+    return len(created) + len(updated)
+
+
+def reschedule_task(task, changed_dependencies=()):
+    """
+    Bring the stored schedule up to date after ``task`` was created or its
+    dates or dependencies changed. ``changed_dependencies`` are the ids of
+    dependencies that were added or removed.
+
+    Only tasks whose dates can actually move are revisited. Returns the
+    number of rows written, or None when the whole schedule had to be
+    recomputed or was dropped because of a cycle.
+    """
+    with transaction.atomic():
+        project_schedule = ProjectSchedule.objects.select_for_update().filter(project_id=task.project_id).first()
+        if project_schedule is None:
+            # Nothing stored yet, the first read computes it
+            return None
+        try:
+            return _apply_incremental(project_schedule, task.pk, changed_dependencies)
+        except _Recompute:
+            pass
+        except ScheduleCycleError:
+            invalidate_project_schedule(task.project_id)
+            return None
+        try:
+            refresh_project_schedule(task.project_id)
+        except ScheduleCycleError:
+            pass
+    return None
@@ -1,72 +1,123 @@
 from rest_framework import serializers
+from ujenziiq.serializers import BulkPrimaryKeyRelatedField, DynamicFieldsModelSerializer
 from django.contrib.auth import get_user_model
+from django.db.models import F
+from blobs import possession
+from blobs.models import Blob
 from .models import (
     Project, Task, Material, ResourceAllocation, 
     Safety, ProjectImage, ProgressReport
 )
+from .dependency_graph import creates_cycle
 
 User = get_user_model()
 
-class UserMiniSerializer(serializers.ModelSerializer):
+class UserMiniSerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = User
         fields = ('id', 'username', 'first_name', 'last_name', 'user_type')
 
-class ProjectImageSerializer(serializers.ModelSerializer):
+class ProjectImageSerializer(DynamicFieldsModelSerializer):
     uploaded_by = UserMiniSerializer(read_only=True)
+    # Instead of the file, an answered challenge for a file that is already
+    # stored attaches it without uploading it again (see blobs.possession)
+    challenge = serializers.CharField(write_only=True, required=False)
+    proof = serializers.RegexField(r'^[0-9a-f]{64}$', write_only=True, required=False)
     
     class Meta:
         model = ProjectImage
         fields = '__all__'
+    
+    def validate(self, attrs):
+        challenge, proof = attrs.pop('challenge', None), attrs.pop('proof', '')
+        if challenge and not attrs.get('image') and not attrs.get('video'):
+            blob = possession.verify(self.context['request'].user, challenge, proof)
+            attrs[ProjectImage.file_field_for(blob.name)] = blob.name
+            self.linked_blob = blob
+        image = attrs.get('image', self.instance.image if self.instance else None)
+        video = attrs.get('video', self.instance.video if self.instance else None)
+        if not image and not video:
+            raise serializers.ValidationError({'image': 'Provide an image or a video'})
+        if image and video:
+            raise serializers.ValidationError({'video': 'Provide an image or a video, not both'})
+        return attrs
+    
+    def save(self, **kwargs):
+        instance = super().save(**kwargs)
+        if getattr(self, 'linked_blob', None) is not None:
+            Blob.objects.filter(pk=self.linked_blob.pk).update(links=F('links') + 1)
+        return instance
+
+class ProjectImageListSerializer(DynamicFieldsModelSerializer):
+    # Lists link the thumbnail only; the other variants and the original
+    # are on the image's detail (thumbnail is null until it is processed)
+    class Meta:
+        model = ProjectImage
+        fields = (
+            'id', 'project', 'title', 'thumbnail', 'video', 'width', 'height', 'uploaded_by', 'upload_date',
+            'taken_at', 'latitude', 'longitude',
+        )
 
-class TaskListSerializer(serializers.ModelSerializer):
+class TaskListSerializer(DynamicFieldsModelSerializer):
     assignees = UserMiniSerializer(many=True, read_only=True)
     
     class Meta:
         model = Task
         fields = ('id', 'name', 'status', 'priority', 'start_date', 'due_date', 'assignees')
 
-class TaskDetailSerializer(serializers.ModelSerializer):
+class TaskDetailSerializer(DynamicFieldsModelSerializer):
     assignees = UserMiniSerializer(many=True, read_only=True)
-    dependencies = serializers.PrimaryKeyRelatedField(many=True, queryset=Task.objects.all())
+    dependencies = BulkPrimaryKeyRelatedField(many=True, queryset=Task.objects.only('pk', 'project'))
     
     class Meta:
         model = Task
         fields = '__all__'
+    
+    def validate(self, attrs):
+        dependencies = attrs.get('dependencies')
+        if dependencies is None:
+            return attrs
+        
+        project_id = attrs['project'].pk if 'project' in attrs else self.instance.project_id
+        if any(dependency.project_id != project_id for dependency in dependencies):
+            raise serializers.ValidationError({"dependencies": "Tasks can only depend on tasks in the same project."})
+        if creates_cycle(self.instance, [dependency.pk for dependency in dependencies]):
+            raise serializers.ValidationError({"dependencies": "These dependencies would create a cycle."})
+        return attrs
 
-class MaterialSerializer(serializers.ModelSerializer):
+class MaterialSerializer(DynamicFieldsModelSerializer):
     supplier = UserMiniSerializer(read_only=True)
     
     class Meta:
         model = Material
         fields = '__all__'
 
-class ResourceAllocationSerializer(serializers.ModelSerializer):
+class ResourceAllocationSerializer(DynamicFieldsModelSerializer):
     material = MaterialSerializer(read_only=True)
     
     class Meta:
         model = ResourceAllocation
         fields = '__all__'
 
-class SafetySerializer(serializers.ModelSerializer):
+class SafetySerializer(DynamicFieldsModelSerializer):
     reported_by = UserMiniSerializer(read_only=True)
     assigned_to = UserMiniSerializer(read_only=True)
-    images = ProjectImageSerializer(many=True, read_only=True)
+    images = ProjectImageListSerializer(many=True, read_only=True)
     
     class Meta:
         model = Safety
         fields = '__all__'
 
-class ProgressReportSerializer(serializers.ModelSerializer):
+class ProgressReportSerializer(DynamicFieldsModelSerializer):
     submitted_by = UserMiniSerializer(read_only=True)
     tasks_completed = TaskListSerializer(many=True, read_only=True)
-    images = ProjectImageSerializer(many=True, read_only=True)
+    images = ProjectImageListSerializer(many=True, read_only=True)
     
     class Meta:
         model = ProgressReport
         fields = '__all__'
 
-class ProjectListSerializer(serializers.ModelSerializer):
+class ProjectListSerializer(DynamicFieldsModelSerializer):
     project_manager = UserMiniSerializer(read_only=True)
     client = UserMiniSerializer(read_only=True)
     
@@ -76,14 +127,14 @@ class ProjectListSerializer(serializers.ModelSerializer):
                  'expected_end_date', 'status', 'budget', 'client', 'project_manager',
                  'completion_percentage', 'is_delayed')
 
-class ProjectDetailSerializer(serializers.ModelSerializer):
+class ProjectDetailSerializer(DynamicFieldsModelSerializer):
     project_manager = UserMiniSerializer(read_only=True)
     client = UserMiniSerializer(read_only=True)
     team_members = UserMiniSerializer(many=True, read_only=True)
     tasks = TaskListSerializer(many=True, read_only=True)
     resource_allocations = ResourceAllocationSerializer(many=True, read_only=True)
     safety_incidents = SafetySerializer(many=True, read_only=True)
-    images = ProjectImageSerializer(many=True, read_only=True)
+    images = ProjectImageListSerializer(many=True, read_only=True)
     progress_reports = ProgressReportSerializer(many=True, read_only=True)
     
     class Meta:
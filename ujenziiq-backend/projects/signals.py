@@ -0,0 +1,81 @@
+"""
+Keep stored schedules and dependency levels in step with tasks, however
+they are changed: the API, the admin, management commands or plain ORM
+calls. Changes that bypass signals (``QuerySet.update()``,
+``bulk_create()``, or saving rows of the dependencies' through model,
+which never sends signals) must call ``reschedule_task`` or
+``invalidate_project_schedule`` and ``rebuild_dependency_levels``
+themselves.
+"""
+
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .dependency_graph import raise_levels
+from .models import Task
+from .scheduling import invalidate_project_schedule, reschedule_task
+
+SCHEDULE_FIELDS = ('project', 'start_date', 'due_date')
+
+
+@receiver(pre_save, sender=Task)
+def remember_schedule_fields(sender, instance, update_fields=None, raw=False, **kwargs):
+    instance._previous_schedule_fields = None
+    if raw or instance.pk is None:
+        return
+    if update_fields is not None and not set(update_fields) & set(SCHEDULE_FIELDS):
+        return
+    instance._previous_schedule_fields = sender.objects.filter(pk=instance.pk).values_list(
+        'project_id', 'start_date', 'due_date',
+    ).first()
+
+
+@receiver(post_save, sender=Task)
+def reschedule_saved_task(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        reschedule_task(instance)
+        return
+    previous = getattr(instance, '_previous_schedule_fields', None)
+    if previous is None:
+        return
+    project_id, start_date, due_date = previous
+    if project_id != instance.project_id:
+        invalidate_project_schedule(project_id)
+        invalidate_project_schedule(instance.project_id)
+    elif (start_date, due_date) != (instance.start_date, instance.due_date):
+        reschedule_task(instance)
+
+
+@receiver(post_delete, sender=Task)
+def invalidate_deleted_task(sender, instance, **kwargs):
+    invalidate_project_schedule(instance.project_id)
+
+
+@receiver(m2m_changed, sender=Task.dependencies.through)
+def reschedule_dependencies(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear':
+        instance._cleared_dependencies = set(
+            (instance.dependent_tasks if reverse else instance.dependencies).values_list('pk', flat=True)
+        )
+        return
+    if action == 'post_clear':
+        pk_set = instance._cleared_dependencies
+    elif action not in ('post_add', 'post_remove') or not pk_set:
+        return
+
+    if reverse:
+        # dependency.dependent_tasks.add(...): each task in pk_set gained or lost it
+        for task in Task.objects.filter(pk__in=pk_set):
+            reschedule_task(task, [instance.pk])
+    else:
+        reschedule_task(instance, pk_set)
+
+
+@receiver(m2m_changed, sender=Task.dependencies.through)
+def raise_dependency_levels(sender, instance, action, reverse, pk_set, **kwargs):
+    if action != 'post_add' or not pk_set:
+        return
+    # dependency.dependent_tasks.add(...): each task in pk_set gained it
+    raise_levels(pk_set if reverse else [instance.pk])
@@ -1,3 +1,820 @@
-from django.test import TestCase
+import datetime
+import io
+import os
+import shutil
+import tempfile
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import ExifTags, Image
+from rest_framework.test import APIClient
+
+from blobs.models import Blob
+from jobs.worker import Worker
+from ujenziiq.snapshot import migration_fingerprint
+from .images import read_metadata, render_variants
+from .models import (
+    Material, ProgressReport, Project, ProjectImage, ResourceAllocation, Safety, Task,
+    TaskSchedule,
+)
+from .dependency_graph import creates_cycle, rebuild_dependency_levels
+from .scheduling import refresh_project_schedule, reschedule_task
+
+User = get_user_model()
+
+
+def create_user(username, **kwargs):
+    return User.objects.create(username=username, email=f'{username}@example.com', **kwargs)
+
+
+def create_project(user, name='Site', **kwargs):
+    today = datetime.date.today()
+    defaults = {
+        'description': name,
+        'project_type': 'residential',
+        'location': 'Nairobi',
+        'start_date': today - datetime.timedelta(days=30),
+        'expected_end_date': today + datetime.timedelta(days=30),
+        'status': 'in_progress',
+        'budget': 1000,
+        'client': user,
+        'project_manager': user,
+    }
+    defaults.update(kwargs)
+    return Project.objects.create(name=name, **defaults)
+
+
+def create_task(project, name='Task', **kwargs):
+    today = datetime.date.today()
+    defaults = {'description': name, 'start_date': today, 'due_date': today}
+    defaults.update(kwargs)
+    return Task.objects.create(project=project, name=name, **defaults)
+
+
+def populate_project(project, user, count=1):
+    """Create ``count`` of every kind of child object the serializers nest."""
+    today = datetime.date.today()
+    for i in range(count):
+        worker = create_user(f'{project.pk}-worker-{user.pk}-{Task.objects.count()}')
+        project.team_members.add(worker)
+        task = create_task(project, f'Task {i}')
+        task.assignees.add(user, worker)
+        task.dependencies.add(*project.tasks.exclude(pk=task.pk)[:2])
+        material = Material.objects.create(name=f'Material {i}', unit='bag', unit_price=10, supplier=worker)
+        ResourceAllocation.objects.create(project=project, material=material, quantity=5, allocated_date=today)
+        image = ProjectImage.objects.create(
+            project=project, title=f'Image {i}', image='project_images/site.jpg', uploaded_by=worker
+        )
+        incident = Safety.objects.create(
+            project=project, title=f'Incident {i}', description='-', date_occurred=timezone.now(),
+            location_in_site='Gate', severity='low', reported_by=user, assigned_to=worker,
+        )
+        incident.images.add(image)
+        report = ProgressReport.objects.create(
+            project=project, report_type='daily', title=f'Report {i}', summary='-',
+            period_start=today, period_end=today, submitted_by=worker,
+        )
+        report.tasks_completed.add(task)
+        report.images.add(image)
+
+
+class ConstantQueriesMixin:
+    def assertConstantQueries(self, url, grow):
+        """The number of queries for ``url`` must not change when ``grow()`` adds rows."""
+        with CaptureQueriesContext(connection) as before:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        grow()
+        with CaptureQueriesContext(connection) as after:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            len(after), len(before),
+            '\n'.join(query['sql'] for query in after.captured_queries),
+        )
+        return response
+
+
+class ProjectProgressTests(TestCase):
+    def setUp(self):
+        self.user = create_user('manager')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        yesterday = datetime.date.today() - datetime.timedelta(days=1)
+        self.late = create_project(self.user, 'Late', expected_end_date=yesterday)
+        self.on_time = create_project(self.user, 'On time')
+        self.empty = create_project(self.user, 'Empty')
+        for status in ('completed', 'completed', 'pending'):
+            create_task(self.late, status=status)
+        create_task(self.on_time, status='completed')
+
+    def test_annotations_match_properties(self):
+        for project in Project.objects.with_progress():
+            plain = Project.objects.get(pk=project.pk)
+            self.assertEqual(project.completion_percentage, plain.completion_percentage)
+            self.assertEqual(project.is_delayed, plain.is_delayed)
+
+    def test_list_runs_a_single_query(self):
+        for i in range(5):
+            create_task(create_project(self.user, f'Extra {i}'), status='completed')
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/projects/')
+        self.assertEqual(response.status_code, 200)
+        progress = {p['name']: p['completion_percentage'] for p in response.data['results']}
+        self.assertEqual(progress['Late'], 66)
+        self.assertEqual(progress['On time'], 100)
+        self.assertEqual(progress['Empty'], 0)
+
+    def test_my_projects_counts_are_not_multiplied_by_team_joins(self):
+        self.late.team_members.add(self.user, create_user('worker'))
+        response = self.client.get('/api/projects/my_projects/')
+        progress = {p['name']: p['completion_percentage'] for p in response.data['results']}
+        self.assertEqual(progress['Late'], 66)
+
+    def test_delayed_filter(self):
+        response = self.client.get('/api/projects/', {'delayed': 'true'})
+        self.assertEqual([p['name'] for p in response.data['results']], ['Late'])
+
+    def test_completion_range_filter(self):
+        response = self.client.get('/api/projects/', {'completion_min': 50, 'completion_max': 99})
+        self.assertEqual([p['name'] for p in response.data['results']], ['Late'])
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.user = create_user('manager')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.project = create_project(self.user)
+        start = datetime.date.today()
+        # Several tasks share a due date so the id tie-breaker is exercised
+        self.tasks = [
+            create_task(self.project, f'Task {i}', due_date=start + datetime.timedelta(days=i // 3))
+            for i in range(10)
+        ]
+
+    def walk(self, url, params):
+        names = []
+        response = self.client.get(url, params)
+        while True:
+            names.extend(t['name'] for t in response.data['results'])
+            if not response.data['next']:
+                return names, response
+            response = self.client.get(response.data['next'])
+
+    def test_pages_cover_every_row_once_in_order(self):
+        names, _ = self.walk('/api/tasks/', {'page_size': 3})
+        expected = [t.name for t in sorted(self.tasks, key=lambda t: (t.due_date, t.id))]
+        self.assertEqual(names, expected)
+
+    def test_descending_ordering_through_ordering_filter(self):
+        names, _ = self.walk('/api/tasks/', {'page_size': 4, 'ordering': '-due_date'})
+        expected = [t.name for t in sorted(self.tasks, key=lambda t: (t.due_date, t.id), reverse=True)]
+        self.assertEqual(names, expected)
+
+    def test_previous_link_returns_the_previous_page(self):
+        first = self.client.get('/api/tasks/', {'page_size': 4})
+        second = self.client.get(first.data['next'])
+        back = self.client.get(second.data['previous'])
+        self.assertEqual(back.data['results'], first.data['results'])
+
+    def test_nullable_ordering_field(self):
+        material = Material.objects.create(name='Cement', unit='bag', unit_price=10)
+        today = datetime.date.today()
+        for i in range(5):
+            ResourceAllocation.objects.create(
+                project=self.project, material=material, quantity=i, allocated_date=today,
+                received_date=today if i % 2 else None,
+            )
+        response = self.client.get('/api/resource-allocations/', {'page_size': 2, 'ordering': 'received_date'})
+        seen = []
+        while True:
+            seen.extend(a['id'] for a in response.data['results'])
+            if not response.data['next']:
+                break
+            response = self.client.get(response.data['next'])
+        self.assertEqual(sorted(seen), sorted(ResourceAllocation.objects.values_list('id', flat=True)))
+        self.assertEqual(len(seen), len(set(seen)))
+
+    def test_count_is_optional(self):
+        response = self.client.get('/api/tasks/')
+        self.assertNotIn('count', response.data)
+        response = self.client.get('/api/tasks/', {'count': 'true'})
+        self.assertEqual(response.data['count'], 10)
+        self.assertTrue(response.data['count_is_exact'])
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/tasks/', {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, 404)
+
+
+class PrefetchPlanTests(ConstantQueriesMixin, TestCase):
+    def setUp(self):
+        self.user = create_user('manager')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.project = create_project(self.user)
+        populate_project(self.project, self.user)
+
+    def grow_project(self):
+        populate_project(self.project, self.user, count=4)
+
+    def grow_projects(self):
+        for i in range(4):
+            project = create_project(self.user, f'Project {i}')
+            project.team_members.add(self.user)
+            populate_project(project, self.user)
+
+    def test_project_list(self):
+        self.assertConstantQueries('/api/projects/', self.grow_projects)
+
+    def test_my_projects(self):
+        self.assertConstantQueries('/api/projects/my_projects/', self.grow_projects)
+
+    def test_project_detail(self):
+        self.assertConstantQueries(f'/api/projects/{self.project.pk}/', self.grow_project)
+
+    def test_project_dashboard(self):
+        self.assertConstantQueries(f'/api/projects/{self.project.pk}/dashboard/', self.grow_project)
+
+    def test_task_list(self):
+        self.assertConstantQueries('/api/tasks/', self.grow_project)
+
+    def test_my_tasks(self):
+        self.assertConstantQueries('/api/tasks/my_tasks/', self.grow_project)
+
+    def test_task_detail(self):
+        task = self.project.tasks.first()
+
+        def add_dependencies():
+            other = create_project(self.user, 'Other')
+            task.dependencies.add(*[create_task(other, f'Upstream {i}') for i in range(3)])
+
+        self.assertConstantQueries(f'/api/tasks/{task.pk}/', add_dependencies)
+
+    def test_material_list(self):
+        self.assertConstantQueries('/api/materials/', self.grow_project)
+
+    def test_resource_allocation_list(self):
+        self.assertConstantQueries('/api/resource-allocations/', self.grow_project)
+
+    def test_safety_list(self):
+        self.assertConstantQueries('/api/safety/', self.grow_project)
+
+    def test_image_list(self):
+        self.assertConstantQueries('/api/images/', self.grow_project)
+
+    def test_progress_report_list(self):
+        self.assertConstantQueries('/api/progress-reports/', self.grow_project)
+
+
+class SparseFieldsetTests(TestCase):
+    def setUp(self):
+        self.user = create_user('manager')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.project = create_project(self.user)
+        populate_project(self.project, self.user, count=2)
+
+    def test_default_representation_is_unchanged(self):
+        response = self.client.get(f'/api/projects/{self.project.pk}/')
+        self.assertEqual(response.data['client']['username'], 'manager')
+        self.assertIn('assignees', response.data['tasks'][0])
+
+    def test_fields_selects_columns(self):
+        response = self.client.get('/api/tasks/', {'fields': 'id,name'})
+        self.assertEqual(set(response.data['results'][0]), {'id', 'name'})
+
+    def test_nested_objects_collapse_to_primary_keys(self):
+        response = self.client.get(f'/api/projects/{self.project.pk}/', {'fields': 'id,client,tasks'})
+        self.assertEqual(response.data['client'], self.user.pk)
+        self.assertEqual(sorted(response.data['tasks']), sorted(self.project.tasks.values_list('pk', flat=True)))
+
+    def test_expand_and_dotted_fields(self):
+        response = self.client.get(
+            f'/api/projects/{self.project.pk}/',
+            {'fields': 'name,tasks.name,client', 'expand': 'client'},
+        )
+        self.assertEqual(set(response.data), {'name', 'tasks', 'client'})
+        self.assertEqual(set(response.data['tasks'][0]), {'name'})
+        self.assertEqual(response.data['client']['username'], 'manager')
+
+    def test_only_requested_columns_are_loaded(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/api/tasks/', {'fields': 'name'})
+        self.assertNotIn('"description"', queries.captured_queries[0]['sql'])
+        self.assertEqual(len(queries), 1)
+
+    def test_custom_list_actions(self):
+        Task.objects.get(pk=self.project.tasks.first().pk).assignees.add(self.user)
+        for url, fields in [
+            ('/api/projects/', 'id,name'), ('/api/projects/my_projects/', 'id,name'),
+            ('/api/tasks/my_tasks/', 'id'), ('/api/users/by_user_type/', 'id,username'),
+        ]:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url, {'fields': fields, 'type': self.user.user_type})
+            self.assertEqual(set(response.data['results'][0]), set(fields.split(',')), url)
+            self.assertEqual(len(queries), 1, url)
+
+
+class AsyncDashboardTests(TestCase):
+    def setUp(self):
+        from rest_framework_simplejwt.tokens import AccessToken
+
+        self.user = create_user('manager')
+        self.project = create_project(self.user)
+        populate_project(self.project, self.user, count=2)
+        create_task(self.project, 'Done', status='completed')
+        self.auth = {'HTTP_AUTHORIZATION': f'JWT {AccessToken.for_user(self.user)}'}
+
+    def test_matches_sync_dashboard(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        expected = client.get(f'/api/projects/{self.project.pk}/dashboard/').json()
+        response = self.client.get(f'/api/projects/{self.project.pk}/dashboard/async/', **self.auth)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), expected)
+
+    def test_summary_skips_nested_payload(self):
+        response = self.client.get(
+            f'/api/projects/{self.project.pk}/dashboard/async/', {'summary': 'true'}, **self.auth
+        )
+        data = response.json()
+        self.assertNotIn('tasks', data['project'])
+        self.assertEqual(data['task_summary'], {'pending': 2, 'completed': 1, 'completion_percentage': 33})
+
+    def test_requires_authentication(self):
+        response = self.client.get(f'/api/projects/{self.project.pk}/dashboard/async/')
+        self.assertEqual(response.status_code, 401)
+
+    def test_unknown_project(self):
+        response = self.client.get('/api/projects/999/dashboard/async/', **self.auth)
+        self.assertEqual(response.status_code, 404)
+
+
+class SchedulingTests(TestCase):
+    def setUp(self):
+        self.user = create_user('manager')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.project = create_project(self.user)
+        self.day0 = datetime.date(2026, 1, 1)
+
+    def task(self, name, start, duration, depends_on=()):
+        task = create_task(
+            self.project, name,
+            start_date=self.day0 + datetime.timedelta(days=start),
+            due_date=self.day0 + datetime.timedelta(days=start + duration),
+        )
+        task.dependencies.add(*depends_on)
+        return task
+
+    def test_critical_path(self):
+        # a(3) -> b(2) -> d(4)
+        #      -> c(1) ---^
+        a = self.task('a', 0, 3)
+        b = self.task('b', 0, 2, [a])
+        c = self.task('c', 0, 1, [a])
+        d = self.task('d', 0, 4, [b, c])
+
+        response = self.client.get(f'/api/projects/{self.project.pk}/schedule/')
+        self.assertEqual(response.status_code, 200)
+        rows = {row['task']: row for row in response.data['tasks']}
+        self.assertEqual(response.data['critical_path'], [a.pk, b.pk, d.pk])
+        self.assertEqual(response.data['project_finish'], self.day0 + datetime.timedelta(days=9))
+        self.assertEqual(rows[c.pk]['early_start'], self.day0 + datetime.timedelta(days=3))
+        self.assertEqual(rows[c.pk]['late_start'], self.day0 + datetime.timedelta(days=4))
+        self.assertEqual(rows[c.pk]['total_float'], 1)
+        self.assertEqual(rows[d.pk]['early_start'], self.day0 + datetime.timedelta(days=5))
+        self.assertTrue(rows[d.pk]['is_critical'])
+
+    def test_start_date_is_a_constraint(self):
+        a = self.task('a', 0, 1)
+        b = self.task('b', 5, 1, [a])
+        rows = {row['task']: row for row in self.client.get(f'/api/projects/{self.project.pk}/schedule/').data['tasks']}
+        self.assertEqual(rows[b.pk]['early_start'], self.day0 + datetime.timedelta(days=5))
+        self.assertEqual(rows[a.pk]['total_float'], 4)
+
+    def test_graph_loads_in_constant_queries(self):
+        from .scheduling import TaskGraph
+
+        a = self.task('a', 0, 1)
+        self.task('b', 0, 1, [a])
+        self.task('c', 0, 1, [a])
+        with self.assertNumQueries(2):
+            graph = TaskGraph.for_project(self.project.pk)
+        self.assertEqual(len(graph), 3)
+
+    def test_cycle_is_rejected(self):
+        a = self.task('a', 0, 1)
+        b = self.task('b', 0, 1, [a])
+        a.dependencies.add(b)
+        response = self.client.get(f'/api/projects/{self.project.pk}/schedule/')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(sorted(response.data['tasks']), sorted([a.pk, b.pk]))
+
+    def stored_rows(self):
+        return sorted(TaskSchedule.objects.filter(project=self.project).values_list(
+            'task_id', 'early_start', 'early_finish', 'late_start', 'late_finish', 'total_float'
+        ))
+
+    def assertMatchesFullRecompute(self):
+        incremental = self.stored_rows()
+        refresh_project_schedule(self.project.pk)
+        self.assertEqual(incremental, self.stored_rows())
+
+    def test_schedule_is_stored(self):
+        a = self.task('a', 0, 3)
+        self.task('b', 0, 2, [a])
+        url = f'/api/projects/{self.project.pk}/schedule/'
+        first = self.client.get(url)
+        self.assertEqual(len(self.stored_rows()), 2)
+        with self.assertNumQueries(3):
+            second = self.client.get(url)
+        self.assertEqual(first.data, second.data)
+
+    def test_date_change_is_applied_incrementally(self):
+        # a -> b -> c,  d -> c,  e independent and on the critical path
+        a = self.task('a', 0, 2)
+        b = self.task('b', 0, 2, [a])
+        d = self.task('d', 0, 1)
+        c = self.task('c', 0, 1, [b, d])
+        self.task('e', 0, 10)
+        self.client.get(f'/api/projects/{self.project.pk}/schedule/')
+
+        response = self.client.patch(f'/api/tasks/{a.pk}/', {'due_date': self.day0 + datetime.timedelta(days=4)})
+        self.assertEqual(response.status_code, 200)
+        self.assertMatchesFullRecompute()
+        rows = {row['task']: row for row in self.client.get(f'/api/projects/{self.project.pk}/schedule/').data['tasks']}
+        self.assertEqual(rows[c.pk]['early_start'], self.day0 + datetime.timedelta(days=6))
+        self.assertEqual(rows[d.pk]['total_float'], 8)
+
+    def test_dependency_change_is_applied_incrementally(self):
+        a = self.task('a', 0, 2)
+        b = self.task('b', 0, 3)
+        c = self.task('c', 0, 1, [a])
+        self.task('e', 0, 10)
+        self.client.get(f'/api/projects/{self.project.pk}/schedule/')
+
+        response = self.client.patch(f'/api/tasks/{c.pk}/', {'dependencies': [b.pk]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertMatchesFullRecompute()
+        rows = {row['task']: row for row in self.client.get(f'/api/projects/{self.project.pk}/schedule/').data['tasks']}
+        self.assertEqual(rows[a.pk]['total_float'], 8)
+        self.assertEqual(rows[b.pk]['total_float'], 6)
+
+    def test_only_affected_tasks_are_rewritten(self):
+        a = self.task('a', 0, 2)
+        b = self.task('b', 0, 2, [a])
+        for i in range(5):
+            self.task(f'x{i}', 0, 1)
+        self.task('e', 0, 10)
+        refresh_project_schedule(self.project.pk)
+
+        Task.objects.filter(pk=b.pk).update(due_date=self.day0 + datetime.timedelta(days=3))
+        b.refresh_from_db()
+        self.assertEqual(reschedule_task(b), 2)
+        self.assertMatchesFullRecompute()
+
+    def test_moving_the_project_finish_recomputes(self):
+        a = self.task('a', 0, 2)
+        b = self.task('b', 0, 1)
+        self.client.get(f'/api/projects/{self.project.pk}/schedule/')
+        self.client.patch(f'/api/tasks/{a.pk}/', {'due_date': self.day0 + datetime.timedelta(days=5)})
+        self.assertMatchesFullRecompute()
+        response = self.client.get(f'/api/projects/{self.project.pk}/schedule/')
+        self.assertEqual(response.data['project_finish'], self.day0 + datetime.timedelta(days=5))
+        self.assertEqual({row['task']: row for row in response.data['tasks']}[b.pk]['total_float'], 4)
+
+    def test_changes_outside_the_api_update_the_schedule(self):
+        a = self.task('a', 0, 2)
+        b = self.task('b', 0, 1)
+        self.task('e', 0, 10)
+        url = f'/api/projects/{self.project.pk}/schedule/'
+        self.client.get(url)
+
+        b.dependencies.add(a)
+        self.assertMatchesFullRecompute()
+        a.due_date = self.day0 + datetime.timedelta(days=4)
+        a.save()
+        self.assertMatchesFullRecompute()
+        a.dependent_tasks.clear()
+        self.assertMatchesFullRecompute()
+        c = self.task('c', 0, 1, [a])
+        rows = {row['task']: row for row in self.client.get(url).data['tasks']}
+        self.assertEqual(rows[c.pk]['early_start'], self.day0 + datetime.timedelta(days=4))
+        a.delete()
+        rows = {row['task']: row for row in self.client.get(url).data['tasks']}
+        self.assertNotIn(a.pk, rows)
+        self.assertEqual(rows[c.pk]['early_start'], self.day0)
+
+    def test_cycle_from_an_update_is_rejected(self):
+        a = self.task('a', 0, 1)
+        b = self.task('b', 0, 1, [a])
+        c = self.task('c', 0, 1, [b])
+        for stored in (False, True):
+            if stored:
+                self.client.get(f'/api/projects/{self.project.pk}/schedule/')
+            response = self.client.patch(f'/api/tasks/{a.pk}/', {'dependencies': [c.pk]}, format='json')
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('dependencies', response.data)
+        response = self.client.patch(f'/api/tasks/{a.pk}/', {'dependencies': [a.pk]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(a.dependencies.exists())
+
+    def test_cycle_check_ignores_a_stale_schedule(self):
+        a = self.task('a', 0, 5)
+        b = self.task('b', 0, 1)
+        self.client.get(f'/api/projects/{self.project.pk}/schedule/')
+        # Written without signals, so the stored schedule still has b finishing
+        # first; the dependency levels are rebuilt, as such writes must do
+        Task.dependencies.through.objects.create(from_task=b, to_task=a)
+        rebuild_dependency_levels(self.project.pk)
+        response = self.client.patch(f'/api/tasks/{a.pk}/', {'dependencies': [b.pk]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('dependencies', response.data)
+
+    def test_dependencies_must_be_in_the_same_project(self):
+        a = self.task('a', 0, 1)
+        other = create_task(create_project(self.user, 'Other'))
+        response = self.client.patch(f'/api/tasks/{a.pk}/', {'dependencies': [other.pk]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('dependencies', response.data)
+
+    def test_dependencies_are_resolved_in_one_query(self):
+        from .serializers import TaskDetailSerializer
+
+        task = self.task('task', 10, 1)
+        others = [self.task(f'd{i}', 0, 1) for i in range(5)]
+
+        def queries(dependencies):
+            serializer = TaskDetailSerializer(task, data={'dependencies': [t.pk for t in dependencies]}, partial=True)
+            with CaptureQueriesContext(connection) as context:
+                self.assertTrue(serializer.is_valid(), serializer.errors)
+            return len(context)
+
+        self.assertEqual(queries(others[:1]), queries(others))
+        serializer = TaskDetailSerializer(task, data={'dependencies': [others[0].pk, 0]}, partial=True)
+        self.assertFalse(serializer.is_valid())
+
+
+class DependencyClosureTests(TestCase):
+    def setUp(self):
+        self.user = create_user('manager')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.project = create_project(self.user)
+        # a <- b <- d <- e,  a <- c <- d  (d depends on b and c)
+        self.a = create_task(self.project, 'a')
+        self.b = create_task(self.project, 'b')
+        self.c = create_task(self.project, 'c')
+        self.d = create_task(self.project, 'd')
+        self.e = create_task(self.project, 'e')
+        self.b.dependencies.add(self.a)
+        self.c.dependencies.add(self.a)
+        self.d.dependencies.add(self.b, self.c)
+        self.e.dependencies.add(self.d)
+
+    def depths(self, response):
+        return {row['id']: row['depth'] for row in response.data['tasks']}
+
+    def test_upstream(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(f'/api/tasks/{self.e.pk}/upstream/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.depths(response), {self.d.pk: 1, self.b.pk: 2, self.c.pk: 2, self.a.pk: 3})
+        self.assertEqual(response.data['tasks'][0]['name'], 'd')
+        self.assertEqual(response.data['tasks'][0]['due_date'], self.d.due_date)
+
+    def test_downstream_with_depth_limit(self):
+        response = self.client.get(f'/api/tasks/{self.a.pk}/downstream/?max_depth=2')
+        self.assertEqual(self.depths(response), {self.b.pk: 1, self.c.pk: 1, self.d.pk: 2})
+        self.assertEqual(response.data['count'], 3)
+
+    def test_count_only(self):
+        response = self.client.get(f'/api/tasks/{self.a.pk}/downstream/?count=true')
+        self.assertEqual(response.data['count'], 4)
+        self.assertEqual(response.data['by_depth'], {1: 2, 2: 1, 3: 1})
+        self.assertNotIn('tasks', response.data)
+
+    def test_cyclic_data_terminates(self):
+        self.a.dependencies.add(self.e)
+        response = self.client.get(f'/api/tasks/{self.a.pk}/upstream/')
+        self.assertEqual(response.data['count'], 4)
+        # The task is not its own dependency, even though the cycle reaches it
+        self.assertNotIn(self.a.pk, self.depths(response))
+        response = self.client.get(f'/api/tasks/{self.a.pk}/upstream/?count=true')
+        self.assertEqual(response.data['by_depth'], {1: 1, 2: 1, 3: 2})
+
+    def test_invalid_depth(self):
+        response = self.client.get(f'/api/tasks/{self.a.pk}/upstream/?max_depth=x')
+        self.assertEqual(response.status_code, 400)
+
+    def levels(self):
+        return dict(Task.objects.values_list('name', 'dependency_level'))
+
+    def test_dependency_levels(self):
+        self.assertEqual(self.levels(), {'a': 0, 'b': 1, 'c': 1, 'd': 2, 'e': 3})
+        f = create_task(self.project, 'f')
+        f.dependent_tasks.add(self.a)
+        self.assertEqual(self.levels(), {'f': 0, 'a': 1, 'b': 2, 'c': 2, 'd': 3, 'e': 4})
+
+        # Dependencies of no higher level cannot depend on the task: no walk
+        with self.assertNumQueries(1):
+            self.assertFalse(creates_cycle(self.b, [self.c.pk, f.pk]))
+        self.assertTrue(creates_cycle(self.a, [self.e.pk]))
+        self.assertTrue(creates_cycle(self.b, [self.d.pk, f.pk]))
+        self.assertFalse(creates_cycle(self.c, [self.b.pk]))
+
+        # Removing dependencies leaves levels that still order every task
+        self.d.dependencies.clear()
+        self.assertEqual(self.levels()['e'], 4)
+        self.assertFalse(creates_cycle(self.b, [self.e.pk]))
+        self.assertEqual(rebuild_dependency_levels(self.project.pk), 2)
+        self.assertEqual(self.levels(), {'f': 0, 'a': 1, 'b': 2, 'c': 2, 'd': 0, 'e': 1})
+
+
+def jpeg_bytes(size, **save_kwargs):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, (200, 120, 40)).save(buffer, 'JPEG', **save_kwargs)
+    return buffer.getvalue()
+
+
+class ImageVariantTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = create_user('manager')
+        self.project = create_project(self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_render_variants(self):
+        exif = Image.Exif()
+        exif[0x0112] = 6  # rotated a quarter turn
+        exif[0x010F] = 'PhoneMaker'
+        (width, height), variants = render_variants(io.BytesIO(jpeg_bytes((4000, 3000), exif=exif)))
+        self.assertEqual((width, height), (3000, 4000))
+        sizes = {}
+        for name, data in variants.items():
+            with Image.open(io.BytesIO(data)) as picture:
+                sizes[name] = picture.size
+                self.assertEqual(dict(picture.getexif()), {})
+        self.assertEqual(sizes, {'web': (1200, 1600), 'medium': (600, 800), 'thumbnail': (240, 320)})
+
+    def test_small_images_are_not_enlarged(self):
+        buffer = io.BytesIO()
+        Image.new('RGBA', (100, 50), (0, 0, 0, 0)).save(buffer, 'PNG')
+        _, variants = render_variants(buffer)
+        with Image.open(io.BytesIO(variants['web'])) as picture:
+            self.assertEqual((picture.size, picture.getpixel((0, 0))), ((100, 50), (255, 255, 255)))
+
+    def test_lists_link_thumbnails(self):
+        response = self.client.post('/api/images/', {
+            'project': self.project.pk, 'title': 'Slab',
+            'image': SimpleUploadedFile('slab.jpg', jpeg_bytes((1200, 900)), content_type='image/jpeg'),
+        })
+        self.assertEqual(response.status_code, 201)
+        Worker(threads=0).run(stop_when_idle=True)
+
+        image = ProjectImage.objects.get()
+        self.assertEqual((image.width, image.height), (1200, 900))
+        self.assertTrue(image.thumbnail.name.startswith('blobs/'))
+        [listed] = self.client.get('/api/images/').data['results']
+        self.assertTrue(listed['thumbnail'].endswith(image.thumbnail.url))
+        self.assertNotIn('image', listed)
+        detail = self.client.get(f'/api/images/{image.pk}/').data
+        self.assertTrue(detail['web'].endswith(image.web.url))
+        self.assertIn('image', detail)
+
+        # A replaced upload is processed again and the old variants released
+        old_thumbnail = image.thumbnail.name
+        self.client.patch(f'/api/images/{image.pk}/', {
+            'image': SimpleUploadedFile('slab2.jpg', jpeg_bytes((300, 600)), content_type='image/jpeg'),
+        })
+        Worker(threads=0).run(stop_when_idle=True)
+        image.refresh_from_db()
+        self.assertEqual((image.width, image.height), (300, 600))
+        self.assertEqual(Blob.objects.get(name=old_thumbnail).refcount, 0)
+
+
+def photo_exif(taken='2024:05:01 14:03:22', offset=None, position=None, make='PhoneMaker', model='Phone 12'):
+    exif = Image.Exif()
+    exif[ExifTags.Base.Make] = make
+    exif[ExifTags.Base.Model] = model
+    exif[ExifTags.IFD.Exif] = {ExifTags.Base.DateTimeOriginal: taken}
+    if offset:
+        exif[ExifTags.IFD.Exif][ExifTags.Base.OffsetTimeOriginal] = offset
+    if position:
+        (lat, lat_ref), (lon, lon_ref) = position
+        exif[ExifTags.IFD.GPSInfo] = {
+            ExifTags.GPS.GPSLatitudeRef: lat_ref, ExifTags.GPS.GPSLatitude: lat,
+            ExifTags.GPS.GPSLongitudeRef: lon_ref, ExifTags.GPS.GPSLongitude: lon,
+        }
+    return exif
+
+
+class PhotoMetadataTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = create_user('manager')
+        self.project = create_project(self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def upload(self, title, exif):
+        response = self.client.post('/api/images/', {
+            'project': self.project.pk, 'title': title,
+            'image': SimpleUploadedFile(f'{title}.jpg', jpeg_bytes((64, 48), exif=exif), content_type='image/jpeg'),
+        })
+        self.assertEqual(response.status_code, 201)
+        return response.data['id']
+
+    def titles(self, query):
+        response = self.client.get(f'/api/images/?{query}')
+        self.assertEqual(response.status_code, 200, response.data)
+        return sorted(image['title'] for image in response.data['results'])
+
+    def test_read_metadata(self):
+        exif = photo_exif(offset='+03:00', position=(((1.0, 17.0, 34.56), 'S'), ((36.0, 49.0, 12.5), 'E')),
+                          make='Canon', model='Canon EOS R5')
+        metadata = read_metadata(io.BytesIO(jpeg_bytes((64, 48), exif=exif)))
+        self.assertEqual(metadata['taken_at'], datetime.datetime(2024, 5, 1, 11, 3, 22, tzinfo=datetime.timezone.utc))
+        self.assertAlmostEqual(metadata['latitude'], -1.292933, places=5)
+        self.assertAlmostEqual(metadata['longitude'], 36.820139, places=5)
+        self.assertEqual(metadata['device'], 'Canon EOS R5')
+
+        # Placeholder positions and dates are dropped
+        exif = photo_exif(taken='0000:00:00 00:00:00', position=(((0.0, 0.0, 0.0), 'N'), ((0.0, 0.0, 0.0), 'E')))
+        metadata = read_metadata(io.BytesIO(jpeg_bytes((64, 48), exif=exif)))
+        self.assertEqual((metadata['taken_at'], metadata['latitude'], metadata['device']),
+                         (None, None, 'PhoneMaker Phone 12'))
+
+    def test_filter_by_time_and_place(self):
+        site = ((1.0, 17.0, 0.0), 'S'), ((36.0, 49.0, 0.0), 'E')
+        nearby = ((1.0, 18.0, 0.0), 'S'), ((36.0, 50.0, 0.0), 'E')
+        self.upload('slab', photo_exif('2024:05:01 09:00:00', position=site))
+        self.upload('roof', photo_exif('2024:05:08 09:00:00', position=nearby))
+        self.upload('scan', photo_exif('not a date'))
+        Worker(threads=0).run(stop_when_idle=True)
+        slab = ProjectImage.objects.get(title='slab')
+        self.assertEqual(slab.taken_at, datetime.datetime(2024, 5, 1, 9, tzinfo=datetime.timezone.utc))
+        self.assertEqual(slab.device, 'PhoneMaker Phone 12')
+        listed = {image['title']: image for image in self.client.get('/api/images/').data['results']}
+        self.assertEqual((listed['scan']['taken_at'], listed['slab']['latitude']), (None, slab.latitude))
+
+        # Queries only use the recorded columns: the files can be gone
+        shutil.rmtree(self.media_root)
+        self.assertEqual(self.titles('taken_after=2024-05-01T00:00:00Z&taken_before=2024-05-02T00:00:00Z'), ['slab'])
+        self.assertEqual(self.titles('taken_after=2024-04-01T00:00:00Z'), ['roof', 'slab'])
+        self.assertEqual(self.titles('bbox=36.8,-1.29,36.82,-1.28'), ['slab'])
+        self.assertEqual(self.titles('bbox=36.8,-1.31,36.84,-1.28'), ['roof', 'slab'])
+        self.assertEqual(self.titles(f'bbox=36.8,-1.31,36.84,-1.28&project={self.project.pk}&taken_after=2024-05-05'),
+                         ['roof'])
+        # Across the 180th meridian
+        self.assertEqual(self.titles('bbox=170,-90,40,90'), ['roof', 'slab'])
+        self.assertEqual(self.client.get('/api/images/?bbox=1,2,3').status_code, 400)
+        self.assertEqual(self.client.get('/api/images/?bbox=0,10,1,5').status_code, 400)
+
+    def test_backfill_command(self):
+        image_id = self.upload('slab', photo_exif())
+        Worker(threads=0).run(stop_when_idle=True)
+        ProjectImage.objects.filter(pk=image_id).update(taken_at=None, device='')
+        out = io.StringIO()
+        call_command('extract_photo_metadata', stdout=out)
+        self.assertIn('Queued 1 images', out.getvalue())
+        Worker(threads=0).run(stop_when_idle=True)
+        self.assertEqual(ProjectImage.objects.get(pk=image_id).device, 'PhoneMaker Phone 12')
+
+
+class MigrationFingerprintTests(SimpleTestCase):
+    def test_edited_migrations_change_the_fingerprint(self):
+        app_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, app_dir)
+        os.mkdir(os.path.join(app_dir, 'migrations'))
+        migration = os.path.join(app_dir, 'migrations', '0001_initial.py')
+        app_config = SimpleNamespace(label='site', path=app_dir)
+
+        with mock.patch('ujenziiq.snapshot.apps.get_app_configs', return_value=[app_config]):
+            with open(migration, 'w') as file:
+                file.write('operations = []\n')
+            before = migration_fingerprint()
+            with open(migration, 'w') as file:
+                file.write('operations = [1]\n')
+            self.assertNotEqual(migration_fingerprint(), before)
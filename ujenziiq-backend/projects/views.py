@@ -4,39 +4,53 @@ from rest_framework.decorators import action
 from django.db.models import Q
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
+from blobs.possession import PossessionChallengeMixin
+from blobs.tus import TusUploadMixin
+from jobs.queue import enqueue
+from ujenziiq.prefetch import PrefetchPlanMixin, plan_queryset
 from .models import (
     Project, Task, Material, ResourceAllocation,
-    Safety, ProjectImage, ProgressReport
+    Safety, ProjectImage, ProgressReport, TaskSchedule
 )
 from .serializers import (
     ProjectListSerializer, ProjectDetailSerializer, TaskListSerializer,
     TaskDetailSerializer, MaterialSerializer, ResourceAllocationSerializer,
-    SafetySerializer, ProjectImageSerializer, ProgressReportSerializer
+    SafetySerializer, ProjectImageSerializer, ProjectImageListSerializer,
+    ProgressReportSerializer
 )
+from .dependency_graph import DOWNSTREAM, MAX_DEPTH, UPSTREAM, closure, closure_counts
+from .filters import ProjectFilter, ProjectImageFilter
+from .jobs import extract_photo_metadata, process_project_image
+from .scheduling import ScheduleCycleError, get_project_schedule
 
-class ProjectViewSet(viewsets.ModelViewSet):
+class ProjectViewSet(PrefetchPlanMixin, viewsets.ModelViewSet):
     queryset = Project.objects.all()
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
-    filterset_fields = ['status', 'project_type']
+    filterset_class = ProjectFilter
     search_fields = ['name', 'description', 'location']
     ordering_fields = ['start_date', 'expected_end_date', 'created_at', 'name']
+    ordering = ['-created_at']
+    
+    def get_queryset(self):
+        return Project.objects.with_progress()
     
     def get_serializer_class(self):
-        if self.action in ['retrieve', 'create', 'update', 'partial_update']:
+        if self.action in ['retrieve', 'create', 'update', 'partial_update', 'dashboard']:
             return ProjectDetailSerializer
         return ProjectListSerializer
     
     @action(detail=False, methods=['get'])
     def my_projects(self, request):
         user = request.user
-        projects = Project.objects.filter(
+        projects = self.filter_queryset(self.get_queryset()).filter(
             Q(project_manager=user) | 
             Q(client=user) | 
             Q(team_members=user)
         ).distinct()
         
-        serializer = ProjectListSerializer(projects, many=True)
-        return Response(serializer.data)
+        page = self.paginate_queryset(projects)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
     
     @action(detail=True, methods=['get'])
     def dashboard(self, request, pk=None):
@@ -45,8 +59,12 @@ class ProjectViewSet(viewsets.ModelViewSet):
         # Aggregate dashboard data
         pending_tasks = Task.objects.filter(project=project, status='pending').count()
         completed_tasks = Task.objects.filter(project=project, status='completed').count()
-        recent_safety = Safety.objects.filter(project=project).order_by('-date_occurred')[:5]
-        recent_materials = ResourceAllocation.objects.filter(project=project).order_by('-allocated_date')[:5]
+        recent_safety = plan_queryset(
+            Safety.objects.filter(project=project), SafetySerializer()
+        ).order_by('-date_occurred')[:5]
+        recent_materials = plan_queryset(
+            ResourceAllocation.objects.filter(project=project), ResourceAllocationSerializer()
+        ).order_by('-allocated_date')[:5]
         
         # Project completion percentage is already a property on the model
         completion = project.completion_percentage
@@ -63,13 +81,49 @@ class ProjectViewSet(viewsets.ModelViewSet):
         }
         
         return Response(data)
+    
+    @action(detail=True, methods=['get'])
+    def schedule(self, request, pk=None):
+        project = get_object_or_404(Project, pk=pk)
+        refresh = request.query_params.get('refresh', '').lower() in ('1', 'true')
+        try:
+            project_schedule = get_project_schedule(project.pk, refresh=refresh)
+        except ScheduleCycleError as exc:
+            return Response({'error': str(exc), 'tasks': exc.task_ids}, status=status.HTTP_400_BAD_REQUEST)
+        
+        critical_only = request.query_params.get('critical_only', '').lower() in ('1', 'true')
+        rows = TaskSchedule.objects.filter(project=project).order_by('early_start', 'task_id').values_list(
+            'task_id', 'early_start', 'early_finish', 'late_start', 'late_finish', 'total_float'
+        )
+        tasks = [
+            {
+                'task': task_id,
+                'duration': (early_finish - early_start).days,
+                'early_start': early_start,
+                'early_finish': early_finish,
+                'late_start': late_start,
+                'late_finish': late_finish,
+                'total_float': total_float,
+                'is_critical': total_float == 0,
+            }
+            for task_id, early_start, early_finish, late_start, late_finish, total_float in rows
+        ]
+        critical_path = [row['task'] for row in tasks if row['is_critical']]
+        return Response({
+            'project': project.pk,
+            'project_start': project_schedule.project_start,
+            'project_finish': project_schedule.project_finish,
+            'critical_path': critical_path,
+            'tasks': [row for row in tasks if row['is_critical']] if critical_only else tasks,
+        })
 
-class TaskViewSet(viewsets.ModelViewSet):
+class TaskViewSet(PrefetchPlanMixin, viewsets.ModelViewSet):
     queryset = Task.objects.all()
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['status', 'priority', 'project']
     search_fields = ['name', 'description']
     ordering_fields = ['due_date', 'start_date', 'priority']
+    ordering = ['due_date']
     
     def get_serializer_class(self):
         if self.action in ['retrieve', 'create', 'update', 'partial_update']:
@@ -79,46 +133,97 @@ class TaskViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def my_tasks(self, request):
         user = request.user
-        tasks = Task.objects.filter(assignees=user)
-        serializer = TaskListSerializer(tasks, many=True)
-        return Response(serializer.data)
+        tasks = self.filter_queryset(self.get_queryset()).filter(assignees=user)
+        page = self.paginate_queryset(tasks)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+    
+    @action(detail=True, methods=['get'])
+    def upstream(self, request, pk=None):
+        return self._closure_response(request, pk, UPSTREAM)
+    
+    @action(detail=True, methods=['get'])
+    def downstream(self, request, pk=None):
+        return self._closure_response(request, pk, DOWNSTREAM)
+    
+    def _closure_response(self, request, pk, direction):
+        task = get_object_or_404(Task.objects.only('pk'), pk=pk)
+        try:
+            max_depth = int(request.query_params.get('max_depth', MAX_DEPTH))
+        except ValueError:
+            return Response({'error': 'max_depth must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        max_depth = min(max(max_depth, 1), MAX_DEPTH)
+        
+        data = {'task': task.pk, 'direction': direction, 'max_depth': max_depth}
+        if request.query_params.get('count', '').lower() in ('1', 'true'):
+            by_depth = closure_counts(task.pk, direction, max_depth)
+            data['count'] = sum(by_depth.values())
+            data['by_depth'] = by_depth
+        else:
+            data['tasks'] = closure(task.pk, direction, max_depth)
+            data['count'] = len(data['tasks'])
+        return Response(data)
 
-class MaterialViewSet(viewsets.ModelViewSet):
+class MaterialViewSet(PrefetchPlanMixin, viewsets.ModelViewSet):
     queryset = Material.objects.all()
     serializer_class = MaterialSerializer
     filter_backends = [filters.SearchFilter]
     search_fields = ['name', 'description']
+    ordering = ['name']
 
-class ResourceAllocationViewSet(viewsets.ModelViewSet):
+class ResourceAllocationViewSet(PrefetchPlanMixin, viewsets.ModelViewSet):
     queryset = ResourceAllocation.objects.all()
     serializer_class = ResourceAllocationSerializer
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ['project']
     ordering_fields = ['allocated_date', 'received_date']
+    ordering = ['-allocated_date']
 
-class SafetyViewSet(viewsets.ModelViewSet):
+class SafetyViewSet(PrefetchPlanMixin, viewsets.ModelViewSet):
     queryset = Safety.objects.all()
     serializer_class = SafetySerializer
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['project', 'severity', 'status']
     search_fields = ['title', 'description']
     ordering_fields = ['date_occurred']
+    ordering = ['-date_occurred']
 
-class ProjectImageViewSet(viewsets.ModelViewSet):
+class ProjectImageViewSet(TusUploadMixin, PossessionChallengeMixin, PrefetchPlanMixin, viewsets.ModelViewSet):
     queryset = ProjectImage.objects.all()
     serializer_class = ProjectImageSerializer
     filter_backends = [DjangoFilterBackend]
-    filterset_fields = ['project']
+    filterset_class = ProjectImageFilter
+    ordering = ['-upload_date']
+    upload_field = 'image'
+    
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return ProjectImageListSerializer
+        return ProjectImageSerializer
+    
+    def get_upload_field(self, upload):
+        return ProjectImage.file_field_for(upload.filename)
     
     def perform_create(self, serializer):
-        serializer.save(uploaded_by=self.request.user)
+        image = serializer.save(uploaded_by=self.request.user)
+        # Videos are stored as uploaded, without variants or EXIF
+        if image.image:
+            enqueue(process_project_image, image.pk)
+            enqueue(extract_photo_metadata, image.pk)
+    
+    def perform_update(self, serializer):
+        image = serializer.save()
+        if serializer.validated_data.get('image'):
+            enqueue(process_project_image, image.pk)
+            enqueue(extract_photo_metadata, image.pk)
 
-class ProgressReportViewSet(viewsets.ModelViewSet):
+class ProgressReportViewSet(PrefetchPlanMixin, viewsets.ModelViewSet):
     queryset = ProgressReport.objects.all()
     serializer_class = ProgressReportSerializer
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ['project', 'report_type']
     ordering_fields = ['period_start', 'period_end', 'submission_date']
+    ordering = ['-submission_date']
     
     def perform_create(self, serializer):
         serializer.save(submitted_by=self.request.user)
@@ -13,4 +13,16 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "ujenziiq.settings")
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported once Django is set up
+from communication.push import EVENTS_PATH, EventStreamApp  # noqa: E402
+
+event_stream = EventStreamApp()
+
+
+async def application(scope, receive, send):
+    # Server-Sent Events bypass Django's request handling (see communication/push.py)
+    if scope['type'] == 'http' and scope['path'] == EVENTS_PATH:
+        return await event_stream(scope, receive, send)
+    return await django_application(scope, receive, send)
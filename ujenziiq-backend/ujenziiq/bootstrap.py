@@ -0,0 +1,107 @@
+"""
+One-time Django bootstrap for the serverless entry point.
+
+Loading the app registry, preparing the database and building the WSGI
+handler are expensive, so they are done once per process and the resulting
+application is reused for every request served by that process.
+"""
+
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_application = None
+_cold_start = None
+_cold_start_pending = False
+
+
+def _prepare_database():
+    """
+    Make sure the schema exists. The default database is in-memory, so a
+    fresh process starts empty: it is loaded from the pre-migrated snapshot
+    when one is available and migrated from scratch otherwise.
+    Returns how the database was prepared.
+    """
+    from django.conf import settings
+    from django.core.management import call_command
+    from django.db import connection
+
+    from ujenziiq.snapshot import restore_snapshot
+
+    try:
+        if restore_snapshot(settings.DB_SNAPSHOT_PATH, connection):
+            return 'snapshot'
+    except Exception:
+        logger.exception("Could not restore database snapshot, migrating instead")
+
+    try:
+        call_command('migrate', run_syncdb=True, interactive=False, verbosity=0)
+    except Exception:
+        logger.exception("Database migration failed during bootstrap")
+    return 'migrate'
+
+
+def get_application():
+    """
+    Return the process-wide Django WSGI application, initializing it on the
+    first call.
+    """
+    global _application, _cold_start, _cold_start_pending
+
+    if _application is not None:
+        return _application
+
+    with _lock:
+        if _application is not None:
+            return _application
+
+        started = time.perf_counter()
+        os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ujenziiq.settings')
+
+        from django.core.wsgi import get_wsgi_application
+        application = get_wsgi_application()
+        setup_done = time.perf_counter()
+
+        database_mode = _prepare_database()
+        finished = time.perf_counter()
+
+        _cold_start = {
+            'setup_ms': round((setup_done - started) * 1000, 2),
+            'database_ms': round((finished - setup_done) * 1000, 2),
+            'total_ms': round((finished - started) * 1000, 2),
+            'database': database_mode,
+        }
+        _cold_start_pending = True
+        _application = application
+        logger.info("Django cold start took %.2f ms (database: %s)", _cold_start['total_ms'], database_mode)
+
+    return _application
+
+
+def cold_start_stats():
+    """
+    Timings of this process' cold start, or None if Django is not loaded yet.
+    """
+    return dict(_cold_start) if _cold_start else None
+
+
+def consume_cold_start():
+    """
+    Return the cold start timings exactly once, so that only the request
+    which paid for the bootstrap reports it.
+    """
+    global _cold_start_pending
+
+    with _lock:
+        if not _cold_start_pending:
+            return None
+        _cold_start_pending = False
+    return cold_start_stats()
+
+
+def is_ready():
+    return _application is not None
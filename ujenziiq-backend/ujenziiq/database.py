@@ -0,0 +1,45 @@
+"""
+Database configuration for ``settings.DATABASES``.
+
+``DATABASE_URL`` selects the database; without it the serverless in-memory
+SQLite database is used. Persistent databases keep their connections open
+between requests (``DB_CONN_MAX_AGE``) and check them before reuse, and
+file-backed SQLite goes through the tuned backend in ``ujenziiq.backends``.
+"""
+
+import os
+
+import dj_database_url
+
+SQLITE_ENGINE = 'django.db.backends.sqlite3'
+TUNED_SQLITE_ENGINE = 'ujenziiq.backends.sqlite3'
+
+
+def _env_flag(name, default):
+    return os.getenv(name, default).lower() == 'true'
+
+
+def database_config():
+    url = os.getenv('DATABASE_URL')
+    if not url:
+        return {
+            'ENGINE': SQLITE_ENGINE,
+            'NAME': ':memory:',  # Use in-memory database for serverless
+        }
+
+    config = dj_database_url.parse(
+        url,
+        conn_max_age=int(os.getenv('DB_CONN_MAX_AGE', '600')),
+        conn_health_checks=_env_flag('DB_CONN_HEALTH_CHECKS', 'true'),
+    )
+
+    if config['ENGINE'] == SQLITE_ENGINE and config['NAME'] != ':memory:':
+        # Waiting for a lock is always better than failing the request
+        config.setdefault('OPTIONS', {})['timeout'] = int(os.getenv('SQLITE_BUSY_TIMEOUT', '20'))
+        if _env_flag('SQLITE_TUNING', 'true'):
+            config['ENGINE'] = TUNED_SQLITE_ENGINE
+            config['OPTIONS']['pragmas'] = {
+                'busy_timeout': config['OPTIONS']['timeout'] * 1000,
+            }
+
+    return config
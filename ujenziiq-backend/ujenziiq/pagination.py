@@ -0,0 +1,238 @@
+"""
+Keyset (cursor) pagination shared by every list endpoint.
+
+Pages are selected with a ``WHERE (a, b, id) > (...)`` style condition on
+the current ordering instead of an OFFSET, so fetching page 10,000 costs the
+same as fetching page 1 as long as the ordering is backed by an index. The
+primary key is always appended to the ordering to make it unique.
+"""
+
+import base64
+import binascii
+import datetime
+import decimal
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db import connections
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def _encode_value(value):
+    if isinstance(value, (datetime.date, datetime.datetime, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    return value
+
+
+class KeysetPagination(BasePagination):
+    cursor_query_param = 'cursor'
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    count_query_param = 'count'
+    # Above this many rows the total is estimated instead of counted
+    count_limit = 10000
+    default_ordering = ('-pk',)
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.fields = self.get_fields(queryset.model, self.ordering)
+        values, reverse = self.decode_cursor(request)
+
+        self.count = None
+        if request.query_params.get(self.count_query_param, '').lower() in ('1', 'true'):
+            self.count, self.count_is_exact = self.get_count(queryset)
+
+        fields = [(name, not descending if reverse else descending, null)
+                  for name, descending, null in self.fields]
+        queryset = self.load_ordering_fields(queryset)
+        queryset = queryset.order_by(*self.get_order_by(fields))
+        if values is not None:
+            queryset = queryset.filter(self.get_keyset_filter(fields, values))
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+
+        if reverse:
+            results.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, values is not None
+
+        self.page = results
+        return results
+
+    def get_paginated_response(self, data):
+        response = OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+        ])
+        if self.count is not None:
+            response['count'] = self.count
+            response['count_is_exact'] = self.count_is_exact
+        response['results'] = data
+        return Response(response)
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def get_ordering(self, request, queryset, view):
+        """
+        Use the ordering chosen through the view's OrderingFilter (which
+        validates it against ``ordering_fields``), then the view's default.
+        """
+        for backend in getattr(view, 'filter_backends', []):
+            if hasattr(backend, 'get_ordering'):
+                ordering = backend().get_ordering(request, queryset, view)
+                if ordering:
+                    return list(ordering)
+        ordering = getattr(view, 'ordering', None) or self.default_ordering
+        return [ordering] if isinstance(ordering, str) else list(ordering)
+
+    def get_fields(self, model, ordering):
+        """
+        Turn the ordering into ``(field, descending, nullable)`` triples with
+        the primary key as the final tie-breaker.
+        """
+        fields = []
+        for item in ordering:
+            descending = item.startswith('-')
+            name = item.lstrip('-')
+            try:
+                null = model._meta.get_field(name).null
+            except FieldDoesNotExist:
+                null = False
+            fields.append((name, descending, null))
+            if name in ('pk', model._meta.pk.name):
+                return fields
+        fields.append(('pk', fields[-1][1] if fields else True, False))
+        return fields
+
+    def load_ordering_fields(self, queryset):
+        """
+        The cursor is built from the ordering columns, so they must not be
+        deferred by a sparse fieldset.
+        """
+        names, defer = queryset.query.deferred_loading
+        if defer:
+            return queryset
+        return queryset.only(*names, *(name for name, _, _ in self.fields))
+
+    def get_order_by(self, fields):
+        # NULLs always sort as the largest value so that cursors compare
+        # the same way on every database
+        order_by = []
+        for name, descending, null in fields:
+            if descending:
+                order_by.append(F(name).desc(nulls_first=True) if null else F(name).desc())
+            else:
+                order_by.append(F(name).asc(nulls_last=True) if null else F(name).asc())
+        return order_by
+
+    def get_keyset_filter(self, fields, values):
+        """
+        Rows strictly after ``values``: ``(a > x) OR (a = x AND b > y) ...``
+        """
+        condition = None
+        equal = Q()
+        for (name, descending, null), value in zip(fields, values):
+            after = self._after(name, descending, null, value)
+            if after is not None:
+                branch = equal & after
+                condition = branch if condition is None else condition | branch
+            equal &= Q(**{f'{name}__isnull': True}) if value is None else Q(**{name: value})
+        if condition is None:
+            return Q(pk__in=[])
+        # A redundant inclusive bound on the leading column lets the
+        # database turn the OR chain into an index range scan
+        name, descending, null = fields[0]
+        if values[0] is not None:
+            if descending:
+                condition &= Q(**{f'{name}__lte': values[0]})
+            elif not null:
+                condition &= Q(**{f'{name}__gte': values[0]})
+        return condition
+
+    def _after(self, name, descending, null, value):
+        if descending:
+            if value is None:
+                return Q(**{f'{name}__isnull': False})
+            return Q(**{f'{name}__lt': value})
+        if value is None:
+            return None
+        after = Q(**{f'{name}__gt': value})
+        return after | Q(**{f'{name}__isnull': True}) if null else after
+
+    def get_count(self, queryset):
+        """
+        Count up to ``count_limit`` rows exactly; beyond that, ask the
+        database for an estimate instead of scanning the whole table.
+        """
+        queryset = queryset.order_by()
+        count = queryset[:self.count_limit + 1].count()
+        if count <= self.count_limit:
+            return count, True
+        return max(self.estimate_count(queryset), self.count_limit), False
+
+    def estimate_count(self, queryset):
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql':
+            return self.count_limit
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+            values, reverse, ordering = cursor['v'], bool(cursor['r']), cursor['o']
+        except (TypeError, ValueError, KeyError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+        if ordering != self.ordering or len(values) != len(self.fields):
+            raise NotFound(self.invalid_cursor_message)
+        return values, reverse
+
+    def encode_cursor(self, instance, reverse):
+        cursor = {
+            'v': [_encode_value(instance.serializable_value(name)) for name, _, _ in self.fields],
+            'r': reverse,
+            'o': self.ordering,
+        }
+        encoded = base64.urlsafe_b64encode(json.dumps(cursor).encode('utf-8')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
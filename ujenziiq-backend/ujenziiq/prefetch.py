@@ -0,0 +1,119 @@
+"""
+Automatic select_related / prefetch_related planning from serializers.
+
+The plan is derived by walking the serializer's fields: nested serializers
+over forward foreign keys become ``select_related`` joins, nested ``many``
+serializers and many-to-many / reverse relations become ``Prefetch``
+objects whose querysets are planned recursively from the child serializer.
+Serializers can name extra lookups their method fields need with
+``Meta.prefetch_related``.
+
+When the serializer renders a sparse fieldset (see
+``ujenziiq.serializers``) the plan also restricts the loaded columns with
+``only()``.
+"""
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import serializers
+from rest_framework.relations import ManyRelatedField, RelatedField
+
+
+def _model_field(model, source):
+    if not source or source == '*' or '.' in source:
+        return None
+    try:
+        return model._meta.get_field(source)
+    except FieldDoesNotExist:
+        return None
+
+
+def _serializer_fields(serializer):
+    return [field for field in serializer.fields.values() if not field.write_only]
+
+
+def _reverse_fk_name(model_field):
+    """The column a prefetched reverse foreign key needs on the related model."""
+    return model_field.field.name if model_field.one_to_many else None
+
+
+def build_plan(serializer, model, prefix=''):
+    """
+    Return ``(select_related, prefetch_related, only)`` lookups needed to
+    render ``serializer`` for instances of ``model`` without extra queries.
+    ``only`` is None unless the serializer renders a sparse fieldset.
+    """
+    select_related, prefetch_related = [], []
+    sparse = getattr(serializer, 'is_sparse', False)
+    only = [prefix + model._meta.pk.name] if sparse else None
+
+    for field in _serializer_fields(serializer):
+        model_field = _model_field(model, field.source)
+        if model_field is None:
+            continue
+        path = prefix + field.source
+
+        if not model_field.is_relation:
+            if sparse and model_field.concrete:
+                only.append(path)
+            continue
+
+        related_model = model_field.related_model
+        single = model_field.many_to_one or model_field.one_to_one
+        if sparse and single and model_field.concrete:
+            only.append(path)
+
+        if isinstance(field, serializers.ListSerializer):
+            queryset = plan_queryset(
+                related_model._default_manager.all(), field.child,
+                required=[_reverse_fk_name(model_field)],
+            )
+            prefetch_related.append(Prefetch(path, queryset=queryset))
+        elif isinstance(field, ManyRelatedField):
+            # Only the primary keys are rendered
+            required = [related_model._meta.pk.name, _reverse_fk_name(model_field)]
+            queryset = related_model._default_manager.only(*filter(None, required))
+            prefetch_related.append(Prefetch(path, queryset=queryset))
+        elif isinstance(field, serializers.BaseSerializer) and single:
+            select_related.append(path)
+            nested_select, nested_prefetch, nested_only = build_plan(field, related_model, f'{path}__')
+            select_related.extend(nested_select)
+            prefetch_related.extend(nested_prefetch)
+            if sparse and nested_only:
+                only.extend(nested_only)
+        elif isinstance(field, RelatedField) and single and not field.use_pk_only_optimization():
+            select_related.append(path)
+
+    meta = getattr(serializer, 'Meta', None)
+    for lookup in getattr(meta, 'prefetch_related', ()):
+        prefetch_related.append(prefix + lookup)
+
+    return select_related, prefetch_related, only
+
+
+def plan_queryset(queryset, serializer, required=()):
+    """
+    Apply the plan for ``serializer`` to ``queryset``. ``required`` names
+    columns that must be loaded even in a sparse fieldset.
+    """
+    if isinstance(serializer, serializers.ListSerializer):
+        serializer = serializer.child
+    select_related, prefetch_related, only = build_plan(serializer, queryset.model)
+    if select_related:
+        queryset = queryset.select_related(*select_related)
+    if prefetch_related:
+        queryset = queryset.prefetch_related(*prefetch_related)
+    if only is not None:
+        queryset = queryset.only(*only, *filter(None, required))
+    return queryset
+
+
+class PrefetchPlanMixin:
+    """
+    ViewSet mixin that loads everything the action's serializer renders in a
+    fixed number of queries. The plan is applied in ``filter_queryset`` so
+    that it also covers views which override ``get_queryset``.
+    """
+
+    def filter_queryset(self, queryset):
+        return plan_queryset(super().filter_queryset(queryset), self.get_serializer())
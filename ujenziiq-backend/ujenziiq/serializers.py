@@ -0,0 +1,129 @@
+"""
+Sparse fieldsets and on-demand expansion for model serializers.
+
+``?fields=id,name,tasks.name`` limits the rendered columns (dotted paths
+select columns of nested objects) and ``?expand=client,tasks.assignees``
+opts into nested objects. As soon as either parameter is present, nested
+objects that were not expanded are rendered as primary keys. Without them
+the serializers keep their full nested output.
+
+``BulkPrimaryKeyRelatedField(many=True)`` resolves a submitted list of
+primary keys with one query instead of one query per key.
+"""
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.relations import MANY_RELATION_KWARGS
+
+FIELDS_QUERY_PARAM = 'fields'
+EXPAND_QUERY_PARAM = 'expand'
+
+
+def parse_field_paths(value):
+    """Turn ``'a,b.c,b.d'`` into ``{'a': {}, 'b': {'c': {}, 'd': {}}}``."""
+    tree = {}
+    for path in value.split(','):
+        node = tree
+        for part in path.strip().split('.'):
+            if part:
+                node = node.setdefault(part, {})
+    return tree
+
+
+class DynamicFieldsModelSerializer(serializers.ModelSerializer):
+    def _field_path(self):
+        path, node = [], self
+        while node.parent is not None:
+            if node.field_name:
+                path.insert(0, node.field_name)
+            node = node.parent
+        return path, node
+
+    def get_sparse_spec(self):
+        """
+        ``(only, expand)`` for this serializer's position in the tree, or
+        None when the request did not ask for a sparse representation.
+        ``only`` is None when every column should be rendered.
+        """
+        path, root = self._field_path()
+        request = self.context.get('request')
+        if request is None or request.method not in SAFE_METHODS:
+            return None
+        params = request.query_params
+        if FIELDS_QUERY_PARAM not in params and EXPAND_QUERY_PARAM not in params:
+            return None
+
+        cache = root.__dict__.setdefault('_sparse_trees', {})
+        if not cache:
+            cache['fields'] = parse_field_paths(params.get(FIELDS_QUERY_PARAM, ''))
+            cache['expand'] = parse_field_paths(params.get(EXPAND_QUERY_PARAM, ''))
+        only, expand = cache['fields'] or None, cache['expand']
+        for name in path:
+            only = (only.get(name) or None) if only is not None else None
+            expand = expand.get(name, {})
+        return only, expand
+
+    @property
+    def is_sparse(self):
+        return self.get_sparse_spec() is not None
+
+    def get_fields(self):
+        fields = super().get_fields()
+        spec = self.get_sparse_spec()
+        if spec is None:
+            return fields
+
+        only, expand = spec
+        if only is not None:
+            fields = {name: field for name, field in fields.items() if name in only or name in expand}
+
+        for name, field in list(fields.items()):
+            nested = field.child if isinstance(field, serializers.ListSerializer) else field
+            if not isinstance(nested, serializers.BaseSerializer):
+                continue
+            if name in expand or (only is not None and only.get(name)):
+                continue
+            kwargs = {'read_only': True, 'many': isinstance(field, serializers.ListSerializer)}
+            if field.source not in (None, name):
+                kwargs['source'] = field.source
+            fields[name] = serializers.PrimaryKeyRelatedField(**kwargs)
+        return fields
+
+
+class BulkManyRelatedField(serializers.ManyRelatedField):
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, '__iter__'):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail('empty')
+
+        relation = self.child_relation
+        queryset = relation.get_queryset()
+        pk_field = queryset.model._meta.pk
+        pks = []
+        for item in data:
+            if relation.pk_field is not None:
+                item = relation.pk_field.to_internal_value(item)
+            try:
+                if isinstance(item, bool):
+                    raise TypeError
+                pks.append(pk_field.to_python(item))
+            except (TypeError, ValueError, DjangoValidationError):
+                relation.fail('incorrect_type', data_type=type(item).__name__)
+
+        objects = queryset.in_bulk(pks)
+        for pk in pks:
+            if pk not in objects:
+                relation.fail('does_not_exist', pk_value=pk)
+        return [objects[pk] for pk in pks]
+
+
+class BulkPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return BulkManyRelatedField(**list_kwargs)
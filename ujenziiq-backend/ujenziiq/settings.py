@@ -14,6 +14,8 @@ from pathlib import Path
 import os
 from dotenv import load_dotenv
 
+from ujenziiq.database import database_config
+
 # Load environment variables
 load_dotenv()
 
@@ -52,6 +54,8 @@ INSTALLED_APPS = [
     "projects.apps.ProjectsConfig",
     "users.apps.UsersConfig",
     "communication.apps.CommunicationConfig",
+    "jobs.apps.JobsConfig",
+    "blobs.apps.BlobsConfig",
 ]
 
 MIDDLEWARE = [
@@ -89,14 +93,16 @@ WSGI_APPLICATION = "ujenziiq.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-# Development database (SQLite) - always use SQLite for now
+# Configured from DATABASE_URL, falling back to the in-memory SQLite
+# database used for serverless deployments (see ujenziiq/database.py)
 DATABASES = {
-    "default": {
-        "ENGINE": "django.db.backends.sqlite3", 
-        "NAME": ":memory:",  # Use in-memory database for serverless
-    }
+    "default": database_config(),
 }
 
+# Pre-migrated image loaded into the in-memory database on startup
+# (see the build_db_snapshot management command)
+DB_SNAPSHOT_PATH = os.getenv('DB_SNAPSHOT_PATH', str(BASE_DIR / 'db_snapshot.sqlite3'))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -150,6 +156,8 @@ REST_FRAMEWORK = {
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
     ],
+    'DEFAULT_PAGINATION_CLASS': 'ujenziiq.pagination.KeysetPagination',
+    'PAGE_SIZE': 50,
 }
 
 # JWT Settings
@@ -189,6 +197,21 @@ CORS_ALLOW_HEADERS = [
     'user-agent',
     'x-csrftoken',
     'x-requested-with',
+    # Resumable uploads
+    'tus-resumable',
+    'upload-length',
+    'upload-metadata',
+    'upload-offset',
+]
+CORS_EXPOSE_HEADERS = [
+    'location',
+    'tus-resumable',
+    'tus-version',
+    'tus-extension',
+    'tus-max-size',
+    'upload-expires',
+    'upload-length',
+    'upload-offset',
 ]
 CORS_ALLOW_METHODS = [
     'DELETE',
@@ -217,6 +240,21 @@ CSRF_USE_SESSIONS = False
 # Media Files
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+# Uploads are hashed as they stream in, for the content-addressed storage
+# in blobs/storage.py
+FILE_UPLOAD_HANDLERS = [
+    'blobs.uploadhandler.HashingMemoryFileUploadHandler',
+    'blobs.uploadhandler.HashingTemporaryFileUploadHandler',
+]
+# Resumable uploads to /api/images/uploads/ (see blobs/tus.py)
+RESUMABLE_UPLOAD_MAX_SIZE = int(os.getenv('RESUMABLE_UPLOAD_MAX_SIZE', str(1024 ** 3)))
+# Seconds without progress before a partial upload is removed
+RESUMABLE_UPLOAD_EXPIRY = int(os.getenv('RESUMABLE_UPLOAD_EXPIRY', str(24 * 3600)))
+# Who sends media files once /media/ has checked access (see blobs/serve.py):
+# 'django', 'x-accel-redirect' (nginx) or 'x-sendfile' (Apache, lighttpd)
+MEDIA_SERVE_MODE = os.getenv('MEDIA_SERVE_MODE', 'django')
+# The nginx internal location aliased to MEDIA_ROOT, for 'x-accel-redirect'
+MEDIA_ACCEL_PREFIX = os.getenv('MEDIA_ACCEL_PREFIX', '/protected-media/')
 
 # Static Files
 STATIC_URL = 'static/'
@@ -224,3 +262,24 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 
 # Custom User Model
 AUTH_USER_MODEL = 'users.User'
+
+# SMS dispatch (see communication/sms.py and the dispatch_sms command)
+SMS_GATEWAY = os.getenv('SMS_GATEWAY', 'communication.sms.StubGateway')
+# Messages per second per worker; 0 uses the gateway's own limit
+SMS_RATE_LIMIT = float(os.getenv('SMS_RATE_LIMIT', '0'))
+SMS_MAX_ATTEMPTS = int(os.getenv('SMS_MAX_ATTEMPTS', '5'))
+
+# Background jobs (see jobs/queue.py), run by the run_jobs worker. With
+# JOBS_EAGER they run in the process that queued them once its transaction
+# commits instead; only for deployments without a worker (api/index.py
+# turns it on for the serverless one)
+JOBS_EAGER = os.getenv('JOBS_EAGER', 'False').lower() == 'true'
+
+# Real-time push over /api/events/ (see communication/push.py). Jobs run by
+# a separate worker publish through this broker, so with JOBS_EAGER off it
+# must be shared between processes, i.e. communication.push.PostgresBroker
+# (check communication.W001)
+PUSH_BROKER = os.getenv('PUSH_BROKER', 'communication.push.LocalBroker')
+PUSH_HEARTBEAT = float(os.getenv('PUSH_HEARTBEAT', '25'))
+# Undelivered events kept per connection before it is closed as too slow
+PUSH_QUEUE_SIZE = int(os.getenv('PUSH_QUEUE_SIZE', '100'))
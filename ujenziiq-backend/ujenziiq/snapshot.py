@@ -0,0 +1,83 @@
+"""
+Pre-migrated SQLite images for the in-memory serverless database.
+
+Replaying every migration on each cold start is slow, so a migrated (and
+optionally seeded) database is built ahead of time with the
+``build_db_snapshot`` management command and copied into memory on startup
+with the SQLite backup API.
+"""
+
+import os
+import sqlite3
+import zlib
+
+from django.apps import apps
+
+
+def migration_fingerprint():
+    """
+    A 31-bit hash of the migration files on disk, names and contents. It is
+    stored in the snapshot's ``user_version`` so that a stale image is never
+    restored, including after a migration is edited in place.
+    """
+    paths = []
+    for app_config in apps.get_app_configs():
+        migrations_dir = os.path.join(app_config.path, 'migrations')
+        if not os.path.isdir(migrations_dir):
+            continue
+        for filename in os.listdir(migrations_dir):
+            if filename.endswith('.py') and filename != '__init__.py':
+                paths.append((f'{app_config.label}.{filename[:-3]}', os.path.join(migrations_dir, filename)))
+    checksum = 0
+    for name, path in sorted(paths):
+        checksum = zlib.crc32(f'{name}\n'.encode('utf-8'), checksum)
+        with open(path, 'rb') as file:
+            checksum = zlib.crc32(file.read(), checksum)
+    return checksum & 0x7fffffff
+
+
+def supports_snapshot(connection):
+    return connection.vendor == 'sqlite' and connection.is_in_memory_db()
+
+
+def build_snapshot(path, connection):
+    """
+    Copy the (already migrated) database behind ``connection`` to ``path``.
+    The file is written next to its destination and moved into place, so a
+    concurrently starting process never sees a half-written image.
+    """
+    tmp_path = f'{path}.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    connection.ensure_connection()
+    target = sqlite3.connect(tmp_path)
+    try:
+        connection.connection.backup(target)
+        target.execute(f'PRAGMA user_version = {migration_fingerprint()}')
+        target.commit()
+        target.execute('VACUUM')
+    finally:
+        target.close()
+    os.replace(tmp_path, path)
+
+
+def restore_snapshot(path, connection):
+    """
+    Load the image at ``path`` into the in-memory database behind
+    ``connection``. Returns False when there is no usable snapshot, in which
+    case the caller should fall back to running migrations.
+    """
+    if not path or not supports_snapshot(connection) or not os.path.exists(path):
+        return False
+
+    source = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    try:
+        version = source.execute('PRAGMA user_version').fetchone()[0]
+        if version != migration_fingerprint():
+            return False
+        connection.ensure_connection()
+        source.backup(connection.connection)
+    finally:
+        source.close()
+    return True
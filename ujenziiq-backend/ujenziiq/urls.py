@@ -18,7 +18,6 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
-from django.conf.urls.static import static
 from django.http import JsonResponse
 from rest_framework.routers import DefaultRouter
 
@@ -27,8 +26,11 @@ from projects.views import (
     ProjectViewSet, TaskViewSet, MaterialViewSet, ResourceAllocationViewSet,
     SafetyViewSet, ProjectImageViewSet, ProgressReportViewSet
 )
+from projects.async_views import project_dashboard
+from projects.media_views import serve_media
+from jobs.views import job_metrics
 from communication.views import (
-    NotificationViewSet, MessageViewSet, CommentViewSet, SMSLogViewSet
+    NotificationViewSet, MessageViewSet, ConversationViewSet, CommentViewSet, SMSLogViewSet
 )
 
 # Simple health check view
@@ -53,18 +55,19 @@ router.register(r'progress-reports', ProgressReportViewSet)
 # Communication
 router.register(r'notifications', NotificationViewSet, basename='notification')
 router.register(r'messages', MessageViewSet, basename='message')
+router.register(r'conversations', ConversationViewSet, basename='conversation')
 router.register(r'comments', CommentViewSet)
 router.register(r'sms-logs', SMSLogViewSet)
 
 urlpatterns = [
     path('', health_check, name='health_check'),
     path("admin/", admin.site.urls),
+    path('api/projects/<int:pk>/dashboard/async/', project_dashboard, name='project-dashboard-async'),
+    path('api/jobs/metrics/', job_metrics, name='job-metrics'),
     path('api/', include(router.urls)),
     path('api/auth/', include('djoser.urls')),
     path('api/auth/', include('djoser.urls.jwt')),
     path('api-auth/', include('rest_framework.urls')),
+    # Media files, for signed-in users with access to them
+    path(f"{settings.MEDIA_URL.strip('/')}/<path:name>", serve_media, name='media'),
 ]
-
-# Serve media files in development
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
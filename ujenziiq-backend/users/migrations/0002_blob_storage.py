@@ -0,0 +1,19 @@
+# Generated by Django 4.2.4 on 2026-10-18 08:05
+
+import blobs.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='user',
+            name='profile_image',
+            field=models.ImageField(blank=True, null=True, storage=blobs.storage.ContentAddressedStorage(), upload_to='profile_images/'),
+        ),
+    ]
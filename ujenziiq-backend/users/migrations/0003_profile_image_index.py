@@ -0,0 +1,19 @@
+# Generated by Django 4.2.4 on 2026-10-18 08:13
+
+import blobs.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_blob_storage'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='user',
+            name='profile_image',
+            field=models.ImageField(blank=True, db_index=True, null=True, storage=blobs.storage.ContentAddressedStorage(), upload_to='profile_images/'),
+        ),
+    ]
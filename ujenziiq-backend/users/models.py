@@ -2,6 +2,8 @@ from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.utils.translation import gettext_lazy as _
 
+from blobs.storage import blob_storage
+
 class User(AbstractUser):
     """
     Custom User model for UjenziIQ platform
@@ -25,7 +27,8 @@ class User(AbstractUser):
     user_type = models.CharField(max_length=20, choices=USER_TYPE_CHOICES, default='worker')
     organization = models.CharField(max_length=100, blank=True, null=True)
     position = models.CharField(max_length=100, blank=True, null=True)
-    profile_image = models.ImageField(upload_to='profile_images/', blank=True, null=True)
+    profile_image = models.ImageField(upload_to='profile_images/', storage=blob_storage, blank=True, null=True,
+                                      db_index=True)
     
     # SMS notifications for users without smartphones
     receive_sms_notifications = models.BooleanField(default=False)
@@ -1,10 +1,11 @@
 from rest_framework import serializers
+from ujenziiq.serializers import DynamicFieldsModelSerializer
 from django.contrib.auth import get_user_model
 from django.contrib.auth.password_validation import validate_password
 
 User = get_user_model()
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = User
         fields = ('id', 'username', 'email', 'first_name', 'last_name', 
@@ -12,7 +13,7 @@ class UserSerializer(serializers.ModelSerializer):
                  'profile_image', 'receive_sms_notifications')
         read_only_fields = ('id',)
 
-class UserCreateSerializer(serializers.ModelSerializer):
+class UserCreateSerializer(DynamicFieldsModelSerializer):
     password = serializers.CharField(write_only=True, required=True, validators=[validate_password])
     password2 = serializers.CharField(write_only=True, required=True)
 
@@ -32,7 +33,7 @@ class UserCreateSerializer(serializers.ModelSerializer):
         user = User.objects.create_user(**validated_data)
         return user
 
-class UserDetailSerializer(serializers.ModelSerializer):
+class UserDetailSerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = User
         fields = ('id', 'username', 'email', 'first_name', 'last_name', 
@@ -1,3 +1,25 @@
 from django.test import TestCase
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from projects.tests import ConstantQueriesMixin, create_user
+
+
+class PrefetchPlanTests(ConstantQueriesMixin, TestCase):
+    def setUp(self):
+        self.user = create_user('manager', user_type='project_manager')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def grow(self):
+        for i in range(4):
+            create_user(f'worker-{i}')
+
+    def test_user_list(self):
+        self.assertConstantQueries('/api/users/', self.grow)
+
+    def test_by_user_type(self):
+        self.assertConstantQueries('/api/users/by_user_type/?type=worker', self.grow)
+
+    def test_me(self):
+        response = self.client.get('/api/users/me/')
+        self.assertEqual(response.data['username'], 'manager')
@@ -2,12 +2,14 @@ from rest_framework import viewsets, permissions, status
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from django.contrib.auth import get_user_model
+from ujenziiq.prefetch import PrefetchPlanMixin
 from .serializers import UserSerializer, UserCreateSerializer, UserDetailSerializer
 
 User = get_user_model()
 
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(PrefetchPlanMixin, viewsets.ModelViewSet):
     queryset = User.objects.all()
+    ordering = ['id']
     
     def get_serializer_class(self):
         if self.action == 'create':
@@ -32,6 +34,7 @@ class UserViewSet(viewsets.ModelViewSet):
         if not user_type:
             return Response({'error': 'User type parameter is required'}, status=status.HTTP_400_BAD_REQUEST)
             
-        users = User.objects.filter(user_type=user_type)
-        serializer = UserSerializer(users, many=True)
-        return Response(serializer.data)
+        users = self.filter_queryset(self.get_queryset()).filter(user_type=user_type)
+        page = self.paginate_queryset(users)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)